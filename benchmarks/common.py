@@ -0,0 +1,75 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import argparse
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import yaml
+
+
+__all__ = [ 'REPOSITORY', 'benchmark_parser', 'kolejka_environment', 'run_judge', 'result_step', 'result_commands', 'parse_seconds', 'summary', ]
+def __dir__():
+    return __all__
+
+
+REPOSITORY = pathlib.Path(__file__).resolve().parent.parent
+
+
+class Loader(yaml.SafeLoader):
+    pass
+Loader.add_multi_constructor('!', lambda loader, suffix, node: loader.construct_scalar(node) if isinstance(node, yaml.ScalarNode) else None)
+
+
+def benchmark_parser(description, judge=True):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--kolejka', type=pathlib.Path, default=REPOSITORY, help='Checkout of kolejka-judge to benchmark (e.g. a git worktree of an older commit)')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of repetitions')
+    if judge:
+        parser.add_argument('--judge-arg', dest='judge_args', action='append', default=[], help='Extra argument for judge.py execute')
+    return parser
+
+def kolejka_environment(kolejka):
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join([ str(pathlib.Path(kolejka).resolve()) ] + [ path for path in environment.get('PYTHONPATH', '').split(os.pathsep) if path ])
+    return environment
+
+def run_judge(kolejka, tests, solution, judge_args=(), judge='generic'):
+    judge_path = pathlib.Path(kolejka) / 'judges' / judge / 'judge.py'
+    if not judge_path.is_file():
+        judge_path = REPOSITORY / 'judges' / judge / 'judge.py'
+    with tempfile.TemporaryDirectory(prefix='kolejka_benchmark_') as temp_path:
+        os.chmod(temp_path, 0o755)
+        result_path = pathlib.Path(temp_path) / 'result'
+        start_time = time.perf_counter()
+        subprocess.run([ sys.executable, str(judge_path), 'execute' ] + list(judge_args) + [ str(tests), str(solution), str(result_path) ], env=kolejka_environment(kolejka), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wall_time = time.perf_counter() - start_time
+        results_path = result_path / 'results.yaml'
+        if not results_path.is_file():
+            raise RuntimeError('Judge produced no results for {}'.format(solution))
+        with open(results_path) as results_file:
+            return wall_time, yaml.load(results_file, Loader=Loader)
+
+def result_step(results, path):
+    for name in path.strip('/').split('/'):
+        results = results[name]
+    return results
+
+def result_commands(results):
+    if isinstance(results, dict):
+        if 'returncode' in results:
+            yield results
+        else:
+            for value in results.values():
+                yield from result_commands(value)
+
+def parse_seconds(value):
+    return float(str(value).strip().rstrip('s'))
+
+def summary(values, unit='s', scale=1):
+    values = [ value * scale for value in values ]
+    return 'min {:.4f}{unit}  median {:.4f}{unit}  max {:.4f}{unit}'.format(min(values), statistics.median(values), max(values), unit=unit)
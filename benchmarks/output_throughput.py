@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# vim:ts=4:sts=4:sw=4:expandtab
+"""Measure how fast the judge captures large solution outputs.
+
+Builds a generic judge test whose solution writes --size bytes (1 GiB by
+default) to stdout and reports the real time of the execution step and the
+resulting throughput.
+
+Compare two trees with e.g.:
+    git worktree add /tmp/kolejka-old <commit>
+    benchmarks/output_throughput.py --kolejka /tmp/kolejka-old
+    benchmarks/output_throughput.py
+"""
+
+import os
+import pathlib
+import tempfile
+
+from common import *
+
+
+RUN_STEP = '/io/executor/run'
+SOLUTION = r'''
+#include <cstdio>
+#include <cstring>
+int main() {
+    static char buffer[1 << 20];
+    unsigned long long size;
+    if (scanf("%llu", &size) != 1)
+        return 1;
+    memset(buffer, 'x', sizeof(buffer));
+    while (size > 0) {
+        size_t chunk = size < sizeof(buffer) ? size : sizeof(buffer);
+        if (fwrite(buffer, 1, chunk, stdout) != chunk)
+            return 1;
+        size -= chunk;
+    }
+    return 0;
+}
+'''
+TESTS = '''
+1:
+  input:       !file 1.in
+  hint:        !file 1.out
+  time:        60s
+  output_size: {output_size}b
+'''
+
+
+def measure(args, tests_path):
+    times = list()
+    for repeat in range(args.repeat):
+        wall_time, results = run_judge(args.kolejka, tests_path / 'tests.yaml', tests_path / 'solution.cpp', args.judge_args)
+        run = result_step(results['1'], RUN_STEP)
+        if run.get('status') not in [ None, 'OK' ]:
+            raise RuntimeError('Execution finished with status {}'.format(run.get('status')))
+        times.append(parse_seconds(run['real_time']))
+    print('output {} bytes: real time {}'.format(args.size, summary(times)))
+    print('output {} bytes: throughput {}'.format(args.size, summary([ args.size / time for time in times ], 'MiB/s', 1 / 1024**2)))
+
+
+if __name__ == '__main__':
+    parser = benchmark_parser('Output throughput benchmark')
+    parser.add_argument('--size', type=int, default=1024**3, help='Output size in bytes')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix='kolejka_benchmark_') as temp_path:
+        tests_path = pathlib.Path(temp_path)
+        (tests_path / 'solution.cpp').write_text(SOLUTION)
+        (tests_path / '1.in').write_text('{}\n'.format(args.size))
+        (tests_path / '1.out').write_text('\n')
+        (tests_path / 'tests.yaml').write_text(TESTS.format(output_size=2 * args.size))
+        measure(args, tests_path)
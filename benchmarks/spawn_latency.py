@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# vim:ts=4:sts=4:sw=4:expandtab
+"""Measure command spawn latency for growing judge heaps.
+
+For every heap size the benchmark allocates and touches that much memory in
+its own process, then starts /bin/true repeatedly and reports the time from
+the start call until the process is reaped. The starter path
+(kolejka.common.subprocess.start, a fork plus a Python preexec script) is
+compared with posix_spawn through the exec helpers
+(kolejka.judge.systems.spawn.spawn_process) when the tree has it, both without
+any setup and with an rlimit, and with an identity change when run as root.
+"""
+
+import os
+import resource
+import sys
+import time
+
+from common import *
+
+
+def starter_start(args, stdin, stdout, stderr, env, cwd, user=None, group=None, groups=None, resources=None):
+    import kolejka.common.subprocess
+    return kolejka.common.subprocess.start(args, user=user, group=group, groups=groups, resources=resources, stdin=stdin, stdout=stdout, stderr=stderr, env=env, cwd=cwd)
+
+def spawn_start(*args, **kwargs):
+    from kolejka.judge.systems.spawn import spawn_process
+    process = spawn_process(*args, **kwargs)
+    if process is None:
+        raise RuntimeError('posix_spawn path refused the command')
+    return process
+
+def measure(start, repeat, **kwargs):
+    times = list()
+    with open(os.devnull, 'r+b') as devnull:
+        for index in range(repeat):
+            start_time = time.perf_counter()
+            process = start([ '/bin/true' ], devnull, devnull, devnull, dict(PATH='/usr/bin:/bin'), '/', **kwargs)
+            process.wait()
+            times.append(time.perf_counter() - start_time)
+    return times
+
+
+if __name__ == '__main__':
+    parser = benchmark_parser('Spawn latency benchmark', judge=False)
+    parser.add_argument('--heap', type=int, action='append', help='Heap size in MiB (repeatable, default 0, 256 and 1024)')
+    parser.set_defaults(repeat=50)
+    args = parser.parse_args()
+    sys.path.insert(0, str(args.kolejka.resolve()))
+    methods = [ ('starter', starter_start), ]
+    try:
+        import kolejka.judge.systems.spawn
+        methods.append(('spawn', spawn_start))
+    except ImportError:
+        pass
+    variants = [ ('plain', dict()), ('rlimit', dict(resources={ resource.RLIMIT_NOFILE : (256, 256) })), ]
+    if os.getuid() == 0:
+        variants.append(('identity', dict(user=65534, group=65534, groups=[])))
+    for size in args.heap or [ 0, 256, 1024, ]:
+        heap = None
+        heap = b'\x01' * (size * 1024**2)
+        for method, start in methods:
+            for variant, kwargs in variants:
+                print('heap {:>5}MiB {:>7} {:>8}: {}'.format(size, method, variant, summary(measure(start, args.repeat, **kwargs), 'ms', 1000)))
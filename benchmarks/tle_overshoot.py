@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# vim:ts=4:sts=4:sw=4:expandtab
+"""Measure how far TLE solutions run past their limits.
+
+Runs the busy and sleep solutions of judges/generic/tests/TLE and reports, for
+the execution step, the wall-clock time spent past the limit that stopped it
+(the CPU limit for busy loops, the real-time limit for sleepers) and the
+judge's per-command overhead: judge wall-clock time not spent inside commands,
+divided by the number of commands it ran.
+
+Compare two trees with e.g.:
+    git worktree add /tmp/kolejka-old <commit>
+    benchmarks/tle_overshoot.py --kolejka /tmp/kolejka-old
+    benchmarks/tle_overshoot.py
+"""
+
+from common import *
+
+
+TLE_PATH = REPOSITORY / 'judges' / 'generic' / 'tests' / 'TLE'
+RUN_STEP = '/io/executor/run'
+
+
+def measure(args, solution):
+    overshoots = list()
+    overheads = list()
+    for repeat in range(args.repeat):
+        wall_time, results = run_judge(args.kolejka, TLE_PATH / 'tests' / 'tests.yaml', solution, args.judge_args)
+        for test, result in results.items():
+            run = result_step(result, RUN_STEP)
+            cpu_time, real_time = parse_seconds(run['cpu_time']), parse_seconds(run['real_time'])
+            cpu_limit, real_limit = parse_seconds(run['limits']['cpu_time']), parse_seconds(run['limits']['real_time'])
+            limit = cpu_limit if cpu_time >= cpu_limit else real_limit
+            overshoots.append(real_time - limit)
+            commands = list(result_commands(result))
+            overheads.append((wall_time - sum([ parse_seconds(command.get('real_time', 0)) for command in commands ])) / len(commands))
+    print('{}: overshoot {}'.format(solution.name, summary(overshoots, 'ms', 1000)))
+    print('{}: per-command overhead {}'.format(solution.name, summary(overheads, 'ms', 1000)))
+
+
+if __name__ == '__main__':
+    parser = benchmark_parser('TLE overshoot benchmark')
+    parser.add_argument('solutions', nargs='*', default=[ 'busy.cpp', 'sleep.cpp', ], help='Solutions from judges/generic/tests/TLE/solutions')
+    args = parser.parse_args()
+    for solution in args.solutions:
+        measure(args, TLE_PATH / 'solutions' / solution)
@@ -5,9 +5,12 @@ if __name__ == '__main__':
     sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kolejka-judge'))
     from kolejka.judge import main
     main(__file__)
-from kolejka.judge.commands import *
-from kolejka.judge.parse import *
-from kolejka.judge.tasks import *
+from kolejka.judge.parse import parse_bool, parse_memory, parse_time
+from kolejka.judge.tasks import (
+        SystemPrepareTask, SolutionPrepareTask, SolutionSourceRulesTask, SolutionBuildRulesTask,
+        SolutionBuildAutoTask, SolutionBuildCMakeTask, SolutionBuildMakeTask, SolutionBuildGXXTask, SolutionBuildGCCTask, SolutionBuildPython3ScriptTask,
+        SingleIOTask, InteractiveIOTask, CollectDebugTask, CollectLogsTask,
+        )
 
 def judge(args):
     tool_time = parse_time('60s')
@@ -39,7 +42,10 @@ def judge(args):
         ], limit_real_time=compile_time, limit_memory=compile_memory),
         build_rules=SolutionBuildRulesTask(max_size=binary_size_limit),
     )
-    args.add_steps(io=SingleIOTask(
+    io_task, io_kwargs = SingleIOTask, dict()
+    if args.test.get('interactor', None):
+        io_task, io_kwargs = InteractiveIOTask, dict(interactor_source=args.test['interactor'], transcript=parse_bool(args.test.get('transcript', 'no')))
+    args.add_steps(io=io_task(
         input_path=args.test.get('input', None),
         tool_override=args.test.get('tools', None),
         tool_time=tool_time,
@@ -58,6 +64,7 @@ def judge(args):
         limit_output_size=output_size_limit,
         limit_error_size=error_size_limit,
         executable_arguments=exec_args,
+        **io_kwargs,
         )
     )
     if parse_bool(args.test.get('debug', 'no')):
@@ -0,0 +1,19 @@
+#include <iostream>
+#include <string>
+
+int main() {
+    int low = 1, high;
+    std::cin >> high;
+    while (true) {
+        int guess = (low + high) / 2;
+        std::cout << guess << std::endl;
+        std::string answer;
+        std::cin >> answer;
+        if (answer == "=")
+            return 0;
+        if (answer == "<")
+            high = guess - 1;
+        else
+            low = guess + 1;
+    }
+}
@@ -0,0 +1,13 @@
+import sys
+
+low, high = 1, int(sys.stdin.readline())
+while True:
+    guess = (low + high) // 2
+    print(guess, flush=True)
+    answer = sys.stdin.readline().strip()
+    if answer == '=':
+        break
+    if answer == '<':
+        high = guess - 1
+    else:
+        low = guess + 1
@@ -0,0 +1,18 @@
+import sys
+
+secret = int(open(sys.argv[1]).read())
+sys.stdout.write('1000000\n')
+sys.stdout.flush()
+
+for query in range(25):
+    line = sys.stdin.readline()
+    if not line:
+        sys.exit(1)
+    guess = int(line)
+    if guess == secret:
+        sys.stdout.write('=\n')
+        sys.stdout.flush()
+        sys.exit(0)
+    sys.stdout.write('<\n' if secret < guess else '>\n')
+    sys.stdout.flush()
+sys.exit(1)
@@ -53,6 +53,8 @@ def judge(args):
         limit_memory=memory_limit,
         limit_output_size=output_size_limit,
         limit_error_size=error_size_limit,
+        policy=args.policy,
+        history=args.history and args.history.scope(args.id),
         )
     )
     if parse_bool(args.test.get('debug', 'no')):
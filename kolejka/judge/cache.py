@@ -0,0 +1,187 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import contextlib
+import fcntl
+import hashlib
+import os
+import pathlib
+import pickle
+import shutil
+import tempfile
+
+
+from kolejka.judge import config
+from kolejka.judge.result import *
+
+
+__all__ = [ 'Cache', 'hash_tree', 'relocate', 'result_cacheable', 'result_files', ]
+def __dir__():
+    return __all__
+
+
+def hash_tree(path, digest=None):
+    digest = digest or hashlib.sha256()
+    path = pathlib.Path(path)
+    if not path.exists() and not path.is_symlink():
+        return digest.hexdigest()
+    stack = [ path ]
+    while stack:
+        cpath = stack.pop()
+        name = str(cpath.relative_to(path))
+        if cpath.is_symlink():
+            digest.update(b'L' + bytes(name, 'utf8') + b'\0' + bytes(os.readlink(cpath), 'utf8') + b'\0')
+        elif cpath.is_dir():
+            digest.update(b'D' + bytes(name, 'utf8') + b'\0')
+            stack += sorted(cpath.iterdir(), reverse=True)
+        elif cpath.is_file():
+            executable = b'X' if cpath.stat().st_mode & 0o111 else b'F'
+            digest.update(executable + bytes(name, 'utf8') + b'\0')
+            with cpath.open('rb') as cfile:
+                while True:
+                    data = cfile.read(65536)
+                    if not data:
+                        break
+                    digest.update(data)
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def relocate(value, source, target):
+    source = str(source)
+    target = str(target)
+    if isinstance(value, str):
+        if value == source or value.startswith(source + os.sep):
+            return target + value[len(source):]
+        return value
+    if isinstance(value, pathlib.PurePath):
+        return type(value)(relocate(str(value), source, target))
+    if isinstance(value, list):
+        return [ relocate(e, source, target) for e in value ]
+    if isinstance(value, tuple):
+        return tuple([ relocate(e, source, target) for e in value ])
+    if isinstance(value, dict):
+        return type(value)([ (relocate(k, source, target), relocate(v, source, target)) for k,v in value.items() ])
+    if isinstance(value, (Result, ResultDict)):
+        for k,v in list(value.__dict__.items()):
+            value.__dict__[k] = relocate(v, source, target)
+        return value
+    return value
+
+
+def result_cacheable(results):
+    for name, result in results:
+        if isinstance(result, ResultDict) and not result_cacheable(result.items()):
+            return False
+        if isinstance(result, Result) and result.limits:
+            if result.limits.real_time and result.real_time >= result.limits.real_time:
+                return False
+            if result.limits.cpu_time and result.cpu_time >= result.limits.cpu_time:
+                return False
+    return True
+
+
+def result_files(results, directory):
+    directory = pathlib.Path(directory)
+    files = list()
+    for name, result in results:
+        if isinstance(result, ResultDict):
+            files += result_files(result.items(), directory)
+        if isinstance(result, Result):
+            files += [ path for path in [ result.stdout, result.stderr ] if path and directory in pathlib.Path(path).parents ]
+    return files
+
+
+class Cache:
+    def __init__(self, directory):
+        self._directory = pathlib.Path(directory).resolve()
+
+    @property
+    def directory(self):
+        return self.get_directory()
+    def get_directory(self):
+        return self._directory
+
+    def key(self, *parts):
+        return hashlib.sha256(bytes(repr(parts), 'utf8')).hexdigest()
+
+    def entry_path(self, kind, key):
+        return self.directory / str(kind) / key[:2] / key
+
+    def contains(self, kind, key):
+        return (self.entry_path(kind, key) / 'entry.pickle').is_file()
+
+    @contextlib.contextmanager
+    def lock(self, kind, key):
+        entry = self.entry_path(kind, key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(entry) + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def store(self, kind, key, directory, paths, value, relocated=None):
+        entry = self.entry_path(kind, key)
+        if self.contains(kind, key):
+            return
+        directory = pathlib.Path(directory)
+        relocated = [ str(pathlib.Path(path).relative_to(directory)) for path in (relocated or []) ]
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        temp = pathlib.Path(tempfile.mkdtemp(prefix='.'+key+'.', dir=entry.parent))
+        try:
+            files = list()
+            for path in paths:
+                path = pathlib.Path(path)
+                if not path.exists() and not path.is_symlink():
+                    continue
+                name = str(path.relative_to(directory))
+                target = temp / 'files' / name
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if path.is_dir() and not path.is_symlink():
+                    shutil.copytree(path, target, symlinks=True)
+                else:
+                    shutil.copy2(path, target, follow_symlinks=False)
+                files.append(name)
+            with (temp / 'entry.pickle').open('wb') as entry_file:
+                pickle.dump({
+                    'directory' : str(directory),
+                    'files' : files,
+                    'relocated' : relocated,
+                    'value' : value,
+                }, entry_file)
+            try:
+                os.rename(temp, entry)
+            except OSError:
+                if not self.contains(kind, key):
+                    raise
+        finally:
+            if temp.exists():
+                shutil.rmtree(temp, ignore_errors=True)
+
+    def restore(self, kind, key, directory):
+        entry = self.entry_path(kind, key)
+        try:
+            with (entry / 'entry.pickle').open('rb') as entry_file:
+                data = pickle.load(entry_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        directory = pathlib.Path(directory)
+        source = data['directory']
+        for name in data['files']:
+            path = entry / 'files' / name
+            target = directory / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if path.is_dir() and not path.is_symlink():
+                shutil.copytree(path, target, symlinks=True, dirs_exist_ok=True)
+            else:
+                shutil.copy2(path, target, follow_symlinks=False)
+        for name in data['relocated']:
+            target = directory / name
+            if target.is_file():
+                mode = target.stat().st_mode
+                content = target.read_bytes().replace(bytes(source, 'utf8'), bytes(str(directory), 'utf8'))
+                target.write_bytes(content)
+                target.chmod(mode)
+        return relocate(data['value'], source, directory)
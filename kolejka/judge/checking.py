@@ -13,12 +13,14 @@ def __dir__():
 
 
 class Checking:
-    def __init__(self, system, id, test, solution):
+    def __init__(self, system, id, test, solution, policy=config.POLICY_ALL, history=None):
         self.steps: Dict[str, CommandBase or TaskBase] = {}
         self.system = system
         self.id = id
         self.test = test
         self.solution = solution
+        self.policy = policy
+        self.history = history
         self.result = None
 
     def __getattr__(self, key):
@@ -0,0 +1,147 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import base64
+import json
+import os
+import pathlib
+import shutil
+import threading
+
+
+from kolejka.judge import config
+
+
+__all__ = [ 'CommandLog', 'command_log_text', 'convert_command_log', 'read_command_log', 'read_command_output', ]
+def __dir__():
+    return __all__
+
+
+def command_log_text(sections):
+    return ''.join([ ('\n\n' if index else '') + title + ':\n' + text for index, (title, text) in enumerate(sections) ])
+
+
+class CommandLog:
+    def __init__(self, directory, inline_bytes=config.COMMAND_LOG_INLINE_BYTES):
+        self._directory = pathlib.Path(directory)
+        self._inline_bytes = int(inline_bytes)
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        return self.get_directory()
+    def get_directory(self):
+        return self._directory
+
+    @property
+    def records_path(self):
+        return self.directory / config.COMMAND_LOG
+
+    @property
+    def segments_path(self):
+        return self.directory / config.COMMAND_LOG_SEGMENTS
+
+    def relative(self, path):
+        try:
+            return str(pathlib.Path(path).relative_to(self.directory))
+        except ValueError:
+            return str(path)
+
+    def store_output(self, path, segments):
+        path = pathlib.Path(path)
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return None
+        output = None
+        if size > self._inline_bytes:
+            with path.open('rb') as source:
+                output = { 'file' : self.relative(path), 'offset' : segments.seek(0, os.SEEK_END), 'length' : size, }
+                shutil.copyfileobj(source, segments)
+        else:
+            data = path.read_bytes()
+            output = { 'file' : self.relative(path), }
+            try:
+                output['text'] = data.decode('utf-8')
+            except UnicodeDecodeError:
+                output['base64'] = str(base64.b64encode(data), 'ascii')
+        path.unlink()
+        return output
+
+    def record(self, record, outputs=None):
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            record = dict(record)
+            if outputs:
+                stored = dict()
+                with self.segments_path.open('ab') as segments:
+                    for kind, path in outputs.items():
+                        output = self.store_output(path, segments)
+                        if output is not None:
+                            stored[kind] = output
+                if stored:
+                    record['outputs'] = stored
+            with self.records_path.open('a') as records:
+                records.write(json.dumps(record, default=str) + '\n')
+
+
+def read_command_log(directory):
+    path = pathlib.Path(directory) / config.COMMAND_LOG
+    if not path.is_file():
+        return
+    with path.open() as records:
+        for line in records:
+            if line.strip():
+                yield json.loads(line)
+
+def read_output(output, segments_path, length=None):
+    if 'text' in output:
+        data = output['text'].encode('utf-8')
+    elif 'base64' in output:
+        data = base64.b64decode(output['base64'])
+    else:
+        with segments_path.open('rb') as segments:
+            segments.seek(output['offset'])
+            return segments.read(output['length'] if length is None else min(length, output['length']))
+    return data if length is None else data[:length]
+
+def read_command_output(path, length=None):
+    path = pathlib.Path(path)
+    if not (path.parent / config.COMMAND_LOG).is_file():
+        raise FileNotFoundError('No such file or command log output: \'{}\''.format(path))
+    for record in read_command_log(path.parent):
+        for output in record.get('outputs', {}).values():
+            if output['file'] == path.name:
+                return read_output(output, path.parent / config.COMMAND_LOG_SEGMENTS, length)
+    return bytes()
+
+def convert_command_log(directory, target=None):
+    directory = pathlib.Path(directory)
+    target = pathlib.Path(target or directory)
+    target.mkdir(parents=True, exist_ok=True)
+    segments_path = directory / config.COMMAND_LOG_SEGMENTS
+    segments = segments_path.open('rb') if segments_path.is_file() else None
+    try:
+        for record in read_command_log(directory):
+            if record.get('cmd') and record.get('sections'):
+                path = target / record['cmd']
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(command_log_text(record['sections']))
+            for output in record.get('outputs', {}).values():
+                path = target / output['file']
+                path.parent.mkdir(parents=True, exist_ok=True)
+                if 'offset' not in output:
+                    path.write_bytes(read_output(output, segments_path))
+                elif segments is not None:
+                    segments.seek(output['offset'])
+                    with path.open('wb') as output_file:
+                        remaining = output['length']
+                        while remaining > 0:
+                            data = segments.read(min(remaining, config.PIPE_SIZE))
+                            if not data:
+                                break
+                            output_file.write(data)
+                            remaining -= len(data)
+    finally:
+        if segments is not None:
+            segments.close()
@@ -2,12 +2,31 @@
 
 
 from kolejka.judge import config
-from kolejka.judge.commands.base import *
-from kolejka.judge.commands.compress import *
-from kolejka.judge.commands.check import *
-from kolejka.judge.commands.compile import *
-from kolejka.judge.commands.extract import *
-from kolejka.judge.commands.make import *
-from kolejka.judge.commands.postgres import *
-from kolejka.judge.commands.system import *
-from kolejka.judge.commands.prepare_venv import *
+from kolejka.judge.lazy import lazy_getattr
+
+
+_submodules = {
+    'base' : [ 'CommandBase', 'ExecutableCommand', 'ProgramCommand', ],
+    'compress' : [ 'ZipCommand', ],
+    'check' : [ 'DiffCommand', 'CheckerCommand', ],
+    'compile' : [
+        'CompileCommand', 'GCCCommand', 'LDCommand', 'GXXCommand', 'GCCGoCommand', 'GHCCommand',
+        'MCSCommand', 'NasmCommand', 'NVCCCommand', 'CargoNewCommand', 'CopySourceCommand',
+        'CargoBuildCommand', 'MoveCommand', 'AddOfflineDependency',
+        ],
+    'extract' : [ 'Un7zCommand', 'UnzipCommand', 'UnrarCommand', 'UntarCommand', ],
+    'make' : [ 'MakeCommand', 'CMakeCommand', ],
+    'postgres' : [
+        'PInitDBCommand', 'PostgresCommand', 'PCreateUserCommand', 'PDropUserCommand',
+        'PCreateDBCommand', 'PDropDBCommand', 'PSQLCommand', 'PSQLAdminCommand',
+        ],
+    'system' : [
+        'GroupAddCommand', 'GroupDelCommand', 'UserAddCommand', 'UserDelCommand', 'UserModCommand', 'BatchCommand',
+        'DirectoryAddCommand', 'InstallCommand', 'ChownDirCommand', 'ChownFileCommand', 'ChmodTreeCommand',
+        ],
+    'prepare_venv' : [ 'CreateVenvCommand', 'InstallPackageIntoVenv', ],
+}
+__all__ = [ 'config', ] + [ name for names in _submodules.values() for name in names ]
+__getattr__ = lazy_getattr(__name__, _submodules, globals())
+def __dir__():
+    return __all__
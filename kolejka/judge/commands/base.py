@@ -212,12 +212,16 @@ class CommandBase(AbstractCommand):
     def get_command(self):
         raise NotImplementedError
 
-    _sequence_id_generator = 0
+    @property
+    def native(self):
+        return self.get_native()
+    def get_native(self):
+        return None
+
     @property
     def sequence_id(self):
         if self._sequence_id is None:
-            CommandBase._sequence_id_generator += 1
-            self._sequence_id = CommandBase._sequence_id_generator
+            self._sequence_id = self.system.next_sequence_id()
         return self._sequence_id
 
     def get_log_path(self, suffix):
@@ -244,6 +248,17 @@ class CommandBase(AbstractCommand):
             stderr = self.get_log_path('stderr')
         return self.resolve_path(stderr)
 
+    @property
+    def log_outputs(self):
+        return self.get_log_outputs()
+    def get_log_outputs(self):
+        outputs = dict()
+        if isinstance(self.stdout, CommandDefaultOutput) and self.default_logs:
+            outputs['stdout'] = self.stdout_path
+        if isinstance(self.stderr, CommandDefaultOutput) and self.default_logs:
+            outputs['stderr'] = self.stderr_path
+        return outputs
+
     @property
     def prerequirements(self):
         return self.get_prerequirements()
@@ -2,10 +2,19 @@
 
 
 from kolejka.judge import config
-from kolejka.judge.commands.compile.base import *
-from kolejka.judge.commands.compile.gcc import *
-from kolejka.judge.commands.compile.ghc import *
-from kolejka.judge.commands.compile.mono import *
-from kolejka.judge.commands.compile.nasm import *
-from kolejka.judge.commands.compile.nvcc import *
-from kolejka.judge.commands.compile.rust import *
+from kolejka.judge.lazy import lazy_getattr
+
+
+_submodules = {
+    'base' : [ 'CompileCommand', ],
+    'gcc' : [ 'GCCCommand', 'LDCommand', 'GXXCommand', 'GCCGoCommand', ],
+    'ghc' : [ 'GHCCommand', ],
+    'mono' : [ 'MCSCommand', ],
+    'nasm' : [ 'NasmCommand', ],
+    'nvcc' : [ 'NVCCCommand', ],
+    'rust' : [ 'CargoNewCommand', 'CopySourceCommand', 'CargoBuildCommand', 'MoveCommand', 'AddOfflineDependency', ],
+}
+__all__ = [ 'config', ] + [ name for names in _submodules.values() for name in names ]
+__getattr__ = lazy_getattr(__name__, _submodules, globals())
+def __dir__():
+    return __all__
@@ -1,6 +1,10 @@
 # vim:ts=4:sts=4:sw=4:expandtab
 
 
+import functools
+import shlex
+
+
 from kolejka.judge import config
 from kolejka.judge.commands.base import *
 from kolejka.judge.paths import *
@@ -8,7 +12,7 @@ from kolejka.judge.typing import *
 from kolejka.judge.validators import *
 
 
-__all__ = [ 'GroupAddCommand', 'GroupDelCommand', 'UserAddCommand', 'UserDelCommand', 'DirectoryAddCommand', 'InstallCommand', 'ChownDirCommand', 'ChownFileCommand', ]
+__all__ = [ 'GroupAddCommand', 'GroupDelCommand', 'UserAddCommand', 'UserDelCommand', 'UserModCommand', 'BatchCommand', 'DirectoryAddCommand', 'InstallCommand', 'ChownDirCommand', 'ChownFileCommand', 'ChmodTreeCommand', ]
 def __dir__():
     return __all__
 
@@ -95,6 +99,51 @@ class UserDelCommand(ProgramCommand):
         return [ self.user_name, ]
 
 
+class UserModCommand(ProgramCommand):
+    DEFAULT_PROGRAM='usermod'
+    DEFAULT_SAFE=True
+    @default_kwargs
+    def __init__(self, user_name, home=None, **kwargs):
+        super().__init__(**kwargs)
+        self.user_name = str(user_name)
+        self.home = home and get_output_path(home)
+    def get_command(self):
+        if self.system.superuser:
+            return super().get_command()
+    def get_program_arguments(self):
+        args = []
+        if self.home:
+            args += [ '--home', self.home ]
+        args += [ self.user_name, ]
+        return args
+
+
+class BatchCommand(CommandBase):
+    DEFAULT_SAFE=True
+    @default_kwargs
+    def __init__(self, commands, **kwargs):
+        super().__init__(**kwargs)
+        self.commands = list(commands)
+    def get_command(self):
+        lines = []
+        for command in self.commands:
+            command.set_system(self.system)
+            command_line = command.resolved_command
+            if command_line:
+                failure = shlex.quote('{} failed with status '.format(command.name))
+                lines.append(' '.join([ shlex.quote(str(part)) for part in command_line ]) + ' || {{ status=$?; echo {}$status >&2; exit $status; }}'.format(failure))
+        if lines:
+            return [ 'sh', '-c', '\n'.join([ 'set -e', ] + lines), ]
+    def get_prerequirements(self):
+        prerequirements = super().get_prerequirements() + [
+            SystemProgramExistsPrerequirement('sh'),
+        ]
+        for command in self.commands:
+            command.set_system(self.system)
+            prerequirements += command.prerequirements
+        return prerequirements
+
+
 class DirectoryAddCommand(CommandBase):
     DEFAULT_SAFE=True
     @default_kwargs
@@ -123,6 +172,8 @@ class DirectoryAddCommand(CommandBase):
             command += [ '-D' ]
         command += [ '--directory', str(self.path) ]
         return command
+    def get_native(self):
+        return functools.partial(self.system.make_directory, self.resolve_path(self.path), self.user_name, self.group_name, self.mode)
     def get_prerequirements(self):
         return super().get_prerequirements() + [
             SystemProgramExistsPrerequirement('install'),
@@ -159,6 +210,8 @@ class InstallCommand(CommandBase):
             command += [ '-D' ]
         command += [ '--no-target-directory', self.source, self.target ]
         return command
+    def get_native(self):
+        return functools.partial(self.system.install_file, self.resolve_path(self.source), self.resolve_path(self.target), self.user_name, self.group_name, self.mode, self.parents)
     def get_prerequirements(self):
         prerequirements = super().get_prerequirements() + [
             SystemProgramExistsPrerequirement('install'),
@@ -198,6 +251,8 @@ class ChownDirCommand(CommandBase):
             command += [ '--recursive', ]
         command += [ self.target, ]
         return command
+    def get_native(self):
+        return functools.partial(self.system.change_owner, self.resolve_path(self.target), self.user_name, self.group_name, self.recursive)
     def get_prerequirements(self):
         return super().get_prerequirements() + [
             SystemProgramExistsPrerequirement('chown'),
@@ -230,6 +285,8 @@ class ChownFileCommand(CommandBase):
             return None
         command += [ self.target, ]
         return command
+    def get_native(self):
+        return functools.partial(self.system.change_owner, self.resolve_path(self.target), self.user_name, self.group_name)
     def get_prerequirements(self):
         return super().get_prerequirements() + [
             SystemProgramExistsPrerequirement('chown'),
@@ -238,3 +295,26 @@ class ChownFileCommand(CommandBase):
             SystemUserExistsPrerequirement(self.user_name),
             SystemGroupExistsPrerequirement(self.group_name),
         ]
+
+
+class ChmodTreeCommand(CommandBase):
+    DEFAULT_SAFE=True
+    @default_kwargs
+    def __init__(self, target, mode, file_type=None, **kwargs):
+        super().__init__(**kwargs)
+        self.target = get_output_path(target)
+        self.mode = mode
+        self.file_type = file_type
+    def get_command(self):
+        command = [ 'find', self.target, ]
+        if self.file_type:
+            command += [ '-type', self.file_type, ]
+        command += [ '-exec', 'chmod', str(self.mode), '{}', '+', ]
+        return command
+    def get_native(self):
+        return functools.partial(self.system.change_mode, self.resolve_path(self.target), self.mode, self.file_type)
+    def get_prerequirements(self):
+        return super().get_prerequirements() + [
+            SystemProgramExistsPrerequirement('find'),
+            SystemProgramExistsPrerequirement('chmod'),
+        ]
@@ -15,6 +15,12 @@ SATORI_RESULT = 'satori'
 
 LOG = 'log'
 COLLECTED_LOG = 'log.zip'
+LOG_FORMAT_FILES = 'files'
+LOG_FORMAT_JSONL = 'jsonl'
+LOG_FORMATS = [ LOG_FORMAT_FILES, LOG_FORMAT_JSONL, ]
+COMMAND_LOG = 'commands.jsonl'
+COMMAND_LOG_SEGMENTS = 'commands.segments'
+COMMAND_LOG_INLINE_BYTES = 4096
 COLLECTED_DEBUG = 'debug.tar.lzma'
 
 SOLUTION = 'solution'
@@ -29,12 +35,50 @@ TOOL_EXEC = TOOL + '/{tool_name}'
 TOOL_BUILD_CPP_STANDARD = 'c++17' 
 TOOL_BUILD_CUDA_ARCHITECTURE = 'sm_52'
 
+POLICY_ALL = 'all'
+POLICY_FIRST_FAILURE = 'first-failure'
+POLICY_SAMPLE_THEN_ALL = 'sample-then-all'
+POLICIES = [ POLICY_ALL, POLICY_FIRST_FAILURE, POLICY_SAMPLE_THEN_ALL, ]
+STATUS_SKIPPED = 'SKP'
+
+ORDER_ORIGINAL = 'original'
+ORDER_HISTORY = 'history'
+ORDERS = [ ORDER_ORIGINAL, ORDER_HISTORY, ]
+HISTORY = 'history'
+
+OVERHEAD = 'overhead'
+
+CGROUP_CONTROLLERS = [ 'memory', 'pids', ]
+CGROUP_POOL_SIZE = 4
+CGROUP_LEAF = 'judge'
+CGROUP_DELEGATED = False
+
+MONITOR_MIN_INTERVAL = 0.01
+MONITOR_MAX_INTERVAL = 0.25
+MONITOR_BACKOFF = 1.25
+MONITOR_WARMUP = 0.25
+MONITOR_MARGIN = 0.8
+GPU_MONITOR_INTERVAL = 0.1
+
+MEMORY_ENFORCEMENT_MONITOR = 'monitor'
+MEMORY_ENFORCEMENT_KERNEL = 'kernel'
+MEMORY_ENFORCEMENTS = [ MEMORY_ENFORCEMENT_MONITOR, MEMORY_ENFORCEMENT_KERNEL, ]
+MEMORY_ADDRESS_SPACE_HEADROOM = '64M'
+
+FAST_SPAWN = True
+FORK_SERVER = False
+FORK_SERVER_TIMEOUT = 10
+PIPE_SIZE = 1048576
+
 TEST = 'test'
 TEST_INPUT = TEST + '/input'
 TEST_HINT = TEST + '/hint'
 TEST_ANSWER = TEST + '/answer'
 TEST_FINAL_HINT = TEST + '/final_hint'
 TEST_FINAL_ANSWER = TEST + '/final_answer'
+TEST_INTERACTION = TEST + '/interaction'
+TEST_SOLUTION_PIPE = TEST + '/solution_pipe'
+TEST_INTERACTOR_PIPE = TEST + '/interactor_pipe'
 
 CUDA_PROFILER = TEST + '/profiler.ncu-rep'
 CUDA_METRICS = TEST + '/metrics.csv'
@@ -56,6 +100,7 @@ MULTITEST_INPUT_STACK = (r'^(.*)[.]in$', r'\1.stack')
 MULTITEST_INPUT_SCORE = (r'^(.*)[.]in$', r'\1.score')
 MULTITEST_OUTPUT_SIZE = (r'^(.*)[.]in$', r'\1.out_size')
 MULTITEST_ERROR_SIZE = (r'^(.*)[.]in$', r'\1.err_size')
+MULTITEST_SAMPLE_NAME = r'^(0+[a-z]*|sample.*|example.*)$'
 
 MULTITEST_SINGLE = TEST + '/multi/{test_name}'
 MULTITEST_INPUT = MULTITEST_SINGLE + '/input'
@@ -0,0 +1,99 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import fcntl
+import json
+import os
+import pathlib
+import tempfile
+
+
+from kolejka.judge import config
+
+
+__all__ = [ 'History', ]
+def __dir__():
+    return __all__
+
+
+class History:
+    def __init__(self, path, prefix=None, stats=None, records=None):
+        self._path = pathlib.Path(path)
+        self._prefix = prefix
+        self._stats = stats if stats is not None else self.load()
+        self._records = records if records is not None else list()
+
+    @property
+    def path(self):
+        return self.get_path()
+    def get_path(self):
+        return self._path
+
+    @property
+    def prefix(self):
+        return self.get_prefix()
+    def get_prefix(self):
+        return self._prefix
+
+    def scope(self, prefix):
+        return History(self.path, prefix=self.full_name(prefix), stats=self._stats, records=self._records)
+
+    def full_name(self, name):
+        if self.prefix is None:
+            return str(name)
+        return '{}/{}'.format(self.prefix, name)
+
+    def load(self):
+        try:
+            with self.path.open('r') as stats_file:
+                stats = json.load(stats_file)
+            if isinstance(stats, dict):
+                return stats
+        except (OSError, ValueError):
+            pass
+        return dict()
+
+    def stats(self, name):
+        return self._stats.get(self.full_name(name), dict())
+
+    def failure_rate(self, name):
+        stats = self.stats(name)
+        runs = stats.get('runs', 0)
+        return runs and stats.get('failures', 0) / runs
+
+    def mean_time(self, name):
+        return self.stats(name).get('time', 0.0)
+
+    def order(self, names):
+        return sorted(names, key=lambda name: (-self.failure_rate(name), self.mean_time(name)))
+
+    @staticmethod
+    def update(stats, name, failed, time):
+        entry = stats.setdefault(name, dict())
+        runs = entry.get('runs', 0)
+        entry['time'] = (entry.get('time', 0.0) * runs + time) / (runs + 1)
+        entry['runs'] = runs + 1
+        entry['failures'] = entry.get('failures', 0) + int(bool(failed))
+
+    def record(self, name, failed, time):
+        name = self.full_name(name)
+        self.update(self._stats, name, failed, time)
+        self._records.append((name, bool(failed), float(time)))
+
+    def save(self):
+        if not self._records:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self.path) + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                stats = self.load()
+                for name, failed, time in self._records:
+                    self.update(stats, name, failed, time)
+                descriptor, temp = tempfile.mkstemp(prefix='.'+self.path.name+'.', dir=self.path.parent)
+                with os.fdopen(descriptor, 'w') as stats_file:
+                    json.dump(stats, stats_file, indent=1, sort_keys=True)
+                os.rename(temp, self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._records.clear()
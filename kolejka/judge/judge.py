@@ -1,8 +1,10 @@
 # vim:ts=4:sts=4:sw=4:expandtab
 
 
+from copy import deepcopy
 import argparse
 import logging
+import os
 import pathlib
 import shutil
 import subprocess
@@ -17,11 +19,16 @@ from kolejka.judge.paths import get_input_path
 from kolejka.judge.task import kolejka_task
 
 
-__all__ = [ 'config_parser', 'config_parser_update', 'config_parser_task', 'config_parser_client', 'config_parser_execute', ]
+__all__ = [ 'config_parser', 'config_parser_update', 'config_parser_task', 'config_parser_client', 'config_parser_execute', 'config_parser_execute_batch', 'config_parser_serve', 'config_parser_request', ]
 def __dir__():
     return __all__
 
 
+class RequestArgumentParser(argparse.ArgumentParser):
+    def error(self, message):
+        raise ValueError(message)
+
+
 class RelativePathAction(argparse.Action):
     def __init__(self, option_strings, dest, nargs=None, **kwargs):
         self.type = pathlib.Path
@@ -71,6 +78,7 @@ class TestsFileAction(argparse.Action):
         try:
             tests = dict([ (str(k),v) for k,v in ctxyaml_load(path).items() ])
             setattr(namespace, self.dest, tests)
+            setattr(namespace, self.dest + '_path', path.resolve())
         except:
             #TODO: give some hints on error in the tests file
             parser.error('{} \'{}\' is not a valid tests specification.'.format(self.dest.title(), path))
@@ -110,12 +118,206 @@ def collect_solution_path(parser, args):
         args.input_paths[k].add(str(solution))
     args.solution = get_input_path(solution)
 
+def create_cache(parser, args):
+    from kolejka.judge.cache import Cache
+    cache_directory = args.cache_directory
+    if cache_directory is None:
+        cache_directory = tempfile.mkdtemp(prefix='kolejka-judge-cache-')
+    setattr(args, 'cache', Cache(cache_directory))
+
+def create_history(parser, args):
+    history = None
+    if args.order == config.ORDER_HISTORY:
+        if args.cache_directory is None:
+            parser.error('--order history needs a persistent --cache directory to keep the history in')
+        import hashlib
+        from kolejka.judge.history import History
+        key = hashlib.sha256(args.tests_path.read_bytes()).hexdigest()
+        history = History(args.cache.directory / config.HISTORY / (key + '.json'))
+    setattr(args, 'history', history)
+
 def create_checkings(parser, args):
     checkings = dict()
     for id in args.tests.keys():
-        checkings[id] = Checking(system=args.system(output_directory = args.result / id, paths=args.input_paths[id]), id=id, test=args.tests[id], solution=args.solution)
+        checkings[id] = Checking(system=args.system(output_directory = args.result / id, paths=args.input_paths[id], cache=args.cache, profile=args.profile, memory_enforcement=args.memory_enforcement, native=not args.subprocess_commands, log_format=args.log_format, fork_server=args.fork_server, cgroup_delegated=args.cgroup_delegated), id=id, test=args.tests[id], solution=args.solution, policy=args.policy, history=args.history)
     setattr(args, 'checkings', checkings)
 
+def parse_jobs(value):
+    if str(value).strip().lower() == 'auto':
+        return len(os.sched_getaffinity(0))
+    try:
+        jobs = int(value)
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        raise argparse.ArgumentTypeError('\'{}\' is neither a positive number nor \'auto\'.'.format(value))
+    return jobs
+
+def load_judge(path):
+    from importlib.util import module_from_spec
+    from importlib.machinery import SourceFileLoader, ModuleSpec
+    spec = ModuleSpec('judge', SourceFileLoader('judge', str(path.resolve())))
+    judge = module_from_spec(spec)
+    spec.loader.exec_module(judge)
+    return judge
+
+_worker_judge = None
+_worker_jobs = None
+def _worker_initialize(judge, jobs, counter, cpus):
+    global _worker_judge, _worker_jobs
+    _worker_judge = judge
+    _worker_jobs = jobs
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    if cpus:
+        os.sched_setaffinity(0, cpus[index % len(cpus)])
+
+def _worker_execute(id):
+    checking = _worker_jobs[id]
+    judge_checking(_worker_judge, checking)
+    return checking.result
+
+def _worker_execute_batch(id):
+    batch_args = _worker_jobs[id]
+    execute_checkings(_worker_judge, batch_args.checkings, policy=batch_args.policy, history=batch_args.history)
+    finalize_checkings(batch_args)
+
+def worker_pool(judge, jobs, workers):
+    import concurrent.futures
+    import multiprocessing
+    available = sorted(os.sched_getaffinity(0))
+    share = max(1, len(available) // workers)
+    cpus = [ available[i*share:(i+1)*share] for i in range(min(workers, len(available))) ]
+    context = multiprocessing.get_context('fork')
+    counter = context.Value('i', 0)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_worker_initialize, initargs=(judge, jobs, counter, cpus))
+
+def checking_failed(checking):
+    return checking.result is None or checking.result.status not in [ None, 'OK' ]
+
+def skip_checking(checking, policy):
+    from kolejka.judge.result import ResultDict
+    result = ResultDict()
+    result.set_status(config.STATUS_SKIPPED)
+    result.set('message', 'Checking skipped by policy \'{}\'.'.format(policy))
+    checking.result = result
+
+def judge_checking(judge, checking):
+    import time
+    start = time.monotonic()
+    judge.judge(checking)
+    if checking.history is not None:
+        checking.history.record(checking.id, checking_failed(checking), time.monotonic() - start)
+        checking.history.save()
+
+def run_checkings(judge, checkings, ids, jobs=1, fail_fast=False):
+    ids = list(ids)
+    jobs = min(jobs, len(ids))
+    if jobs <= 1:
+        for index, id in enumerate(ids):
+            judge_checking(judge, checkings[id])
+            if fail_fast and checking_failed(checkings[id]):
+                return ids[index+1:]
+        return []
+    # One checking provisions system users and groups, the others reuse them.
+    provisioned = [ checking.system for checking in checkings.values() if checking.system.users ]
+    if not provisioned:
+        first = checkings[ids[0]]
+        judge_checking(judge, first)
+        if fail_fast and checking_failed(first):
+            return ids[1:]
+        provisioned = [ first.system ]
+        ids = ids[1:]
+    if not ids:
+        return []
+    for id in ids:
+        checkings[id].system.inherit_accounts(provisioned[0])
+    with worker_pool(judge, checkings, min(jobs, len(ids))) as executor:
+        futures = [ (id, executor.submit(_worker_execute, id)) for id in ids ]
+        for index, (id, future) in enumerate(futures):
+            checkings[id].result = future.result()
+            if fail_fast and checking_failed(checkings[id]):
+                skipped = list()
+                for other_id, other in futures[index+1:]:
+                    if other.cancel():
+                        skipped.append(other_id)
+                    else:
+                        checkings[other_id].result = other.result()
+                return skipped
+    return []
+
+def execute_checkings(judge, checkings, jobs=1, policy=config.POLICY_ALL, history=None):
+    from kolejka.judge.parse import parse_bool
+    ids = list(checkings.keys())
+    if history is not None:
+        ids = history.order(ids)
+    if policy == config.POLICY_SAMPLE_THEN_ALL:
+        samples = [ id for id in ids if parse_bool(checkings[id].test.get('sample', False)) ]
+        others = [ id for id in ids if id not in samples ]
+        run_checkings(judge, checkings, samples, jobs=jobs)
+        if any([ checking_failed(checkings[id]) for id in samples ]):
+            skipped = others
+        else:
+            skipped = run_checkings(judge, checkings, others, jobs=jobs)
+    else:
+        skipped = run_checkings(judge, checkings, ids, jobs=jobs, fail_fast=(policy == config.POLICY_FIRST_FAILURE))
+    for id in skipped:
+        skip_checking(checkings[id], policy)
+
+def execute_batch(judge, batch, jobs=1):
+    ids = list(batch.keys())
+    if not ids:
+        return
+    first = batch[ids[0]]
+    execute_checkings(judge, first.checkings, policy=first.policy, history=first.history)
+    finalize_checkings(first)
+    systems = [ checking.system for checking in first.checkings.values() if checking.system.users ][:1]
+    for id in ids[1:]:
+        for checking in batch[id].checkings.values():
+            for system in systems:
+                checking.system.inherit_accounts(system)
+    ids = ids[1:]
+    jobs = min(jobs, len(ids))
+    if jobs <= 1:
+        for id in ids:
+            execute_checkings(judge, batch[id].checkings, policy=batch[id].policy, history=batch[id].history)
+            finalize_checkings(batch[id])
+        return
+    with worker_pool(judge, batch, jobs) as executor:
+        futures = [ executor.submit(_worker_execute_batch, id) for id in ids ]
+        for future in futures:
+            future.result()
+
+def finalize_checkings(args):
+    from kolejka.judge.satori import satori_result
+    from kolejka.judge.result import ResultDict
+    results = ResultDict()
+    for id, checking in args.checkings.items():
+        if checking.result is not None:
+            results.set(id, checking.result)
+            satori_result(checking.test, results[id], args.result / id )
+        else:
+            r = ResultDict()
+            r.set_status('INT')
+            r.set('message', 'Checking did not set result.')
+            results.set(id, r)
+    result_file = args.result / args.results
+    result_file.parent.mkdir(parents=True, exist_ok=True)
+    result_dir = args.result.resolve()
+    def path_filter(v):
+        if isinstance(v, list):
+            return [ e for e in [ path_filter(e) for e in v ] if e is not None ]
+        if isinstance(v, dict):
+            return dict([ (k,e) for k,e in [ (path_filter(k),path_filter(e)) for k,e in v.items() ] if k is not None and e is not None ])
+        if isinstance(v, pathlib.Path):
+            try:
+                v.relative_to(result_dir)
+            except ValueError:
+                return None
+        return v
+    ctxyaml_dump(path_filter(results.yaml), result_file)
+
 def config_parser_update(parser, judge_path=None):
     if judge_path is None:
         parser.add_argument('judge', action=ExistingFileAction, help='Judge script')
@@ -189,9 +391,10 @@ def config_parser_client(parser, judge_path=None):
     parser.set_defaults(execute=execute)
 
 def known_systems():
-    from kolejka.judge.systems import LocalSystem, ObserverSystem
+    from kolejka.judge.systems import LocalSystem, AsyncLocalSystem, ObserverSystem
     known_systems = {
         'local': LocalSystem,
+        'async': AsyncLocalSystem,
         'observer': ObserverSystem,
     }
     return known_systems
@@ -209,6 +412,16 @@ def config_parser_execute(parser, judge_path=None):
     parser.add_argument('result', type=pathlib.Path, help='Output result directory')
     parser.add_argument('--overwrite', action='store_true', default=False, help='Overwrite output result directory')
     parser.add_argument('--results', default='results.yaml', action=RelativePathAction, help='Results filename in output result directory')
+    parser.add_argument('--jobs', type=parse_jobs, default=1, help='Number of checkings run in parallel (number or \'auto\')')
+    parser.add_argument('--cache', dest='cache_directory', type=pathlib.Path, help='Build cache directory (temporary for this execution by default)')
+    parser.add_argument('--policy', choices=config.POLICIES, default=config.POLICY_ALL, help='Which checkings to run once the verdict is settled')
+    parser.add_argument('--order', choices=config.ORDERS, default=config.ORDER_ORIGINAL, help='Order of checkings (history runs most often failing tests first, kept in the cache directory)')
+    parser.add_argument('--profile', action='store_true', default=False, help='Record judge overhead of every step in results')
+    parser.add_argument('--memory-enforcement', choices=config.MEMORY_ENFORCEMENTS, default=config.MEMORY_ENFORCEMENT_MONITOR, help='How memory limits are enforced (kernel uses cgroup memory.max or RLIMIT_AS)')
+    parser.add_argument('--subprocess-commands', action='store_true', default=False, help='Run filesystem setup commands as external programs instead of in-process')
+    parser.add_argument('--log-format', choices=config.LOG_FORMATS, default=config.LOG_FORMAT_FILES, help='Write command logs as separate files or as one JSON lines stream per checking')
+    parser.add_argument('--fork-server', action='store_true', default=config.FORK_SERVER, help='Start commands run as other users from a fork server kept per checking instead of spawning each one from the judge')
+    parser.add_argument('--cgroup-delegated', action='store_true', default=config.CGROUP_DELEGATED, help='Treat the judge\'s own cgroup as delegated even without systemd\'s delegate attribute or ownership')
     systems = known_systems()
     system = default_system()
     if system not in systems:
@@ -229,49 +442,341 @@ def config_parser_execute(parser, judge_path=None):
         collect_input_paths(parser, args)
         collect_solution_path(parser, args)
         setattr(args, 'system', systems[args.system])
+        create_cache(parser, args)
+        create_history(parser, args)
         create_checkings(parser, args)
     parser.set_defaults(initialize=initialize)
 
-    def finalize(args):
-        from kolejka.judge.satori import satori_result
-        from kolejka.judge.result import ResultDict
-        results = ResultDict()
-        for id, checking in args.checkings.items():
-            if checking.result is not None:
-                results.set(id, checking.result)
-                satori_result(checking.test, results[id], args.result / id )
-            else:
-                r = ResultDict()
-                r.set_status('INT')
-                r.set('message', 'Checking did not set result.')
-                results.set(id, r)
-        result_file = args.result / args.results
-        result_file.parent.mkdir(parents=True, exist_ok=True)
-        result_dir = args.result.resolve()
-        def path_filter(v):
-            if isinstance(v, list):
-                return [ e for e in [ path_filter(e) for e in v ] if e is not None ]
-            if isinstance(v, dict):
-                return dict([ (k,e) for k,e in [ (path_filter(k),path_filter(e)) for k,e in v.items() ] if k is not None and e is not None ])
-            if isinstance(v, pathlib.Path):
-                try:
-                    v.relative_to(result_dir)
-                except ValueError:
-                    return None
-            return v
-        ctxyaml_dump(path_filter(results.yaml), result_file)
-    parser.set_defaults(finalize=finalize)
+    parser.set_defaults(finalize=finalize_checkings)
     
     def execute(args):
         args.initialize(args)
-        from importlib.util import module_from_spec
-        from importlib.machinery import SourceFileLoader, ModuleSpec
-        spec = ModuleSpec('judge', SourceFileLoader('judge', str(args.judge.resolve())))
-        judge = module_from_spec(spec)
-        spec.loader.exec_module(judge)
-        for checking in args.checkings.values():
-            judge.judge(checking)
-        args.finalize(args)
+        try:
+            judge = load_judge(args.judge)
+            execute_checkings(judge, args.checkings, jobs=args.jobs, policy=args.policy, history=args.history)
+            args.finalize(args)
+        finally:
+            if args.cache_directory is None:
+                shutil.rmtree(args.cache.directory, ignore_errors=True)
+    parser.set_defaults(execute=execute)
+
+def collect_solutions(parser, args):
+    solutions = list()
+    for path in args.solutions:
+        if not path.exists():
+            parser.error('Solution \'{}\' does not exist.'.format(path))
+        if path.is_dir():
+            solutions += sorted([ entry for entry in path.iterdir() if entry.is_file() ])
+        else:
+            solutions.append(path)
+    names = set()
+    for solution in solutions:
+        if solution.name in names:
+            parser.error('Solution name \'{}\' is not unique.'.format(solution.name))
+        names.add(solution.name)
+    setattr(args, 'solutions', solutions)
+
+def create_batch(parser, args):
+    batch = dict()
+    for solution in args.solutions:
+        batch_args = argparse.Namespace(
+                tests=args.tests,
+                input_paths=deepcopy(args.input_paths),
+                solution=solution,
+                result=args.result / solution.name,
+                results=args.results,
+                system=args.system,
+                cache=args.cache,
+                policy=args.policy,
+                history=args.history,
+                profile=args.profile,
+                memory_enforcement=args.memory_enforcement,
+                subprocess_commands=args.subprocess_commands,
+                log_format=args.log_format,
+                fork_server=args.fork_server,
+                cgroup_delegated=args.cgroup_delegated,
+                )
+        if batch_args.result.exists():
+            if args.overwrite:
+                if batch_args.result.is_symlink():
+                    batch_args.result.unlink()
+                else:
+                    shutil.rmtree(batch_args.result)
+            else:
+                parser.error('Result \'{}\' already exists.'.format(batch_args.result))
+        collect_solution_path(parser, batch_args)
+        create_checkings(parser, batch_args)
+        batch[solution.name] = batch_args
+    setattr(args, 'batch', batch)
+
+def config_parser_execute_batch(parser, judge_path=None):
+    if judge_path is None:
+        parser.add_argument('judge', action=ExistingFileAction, help='Judge script')
+    else:
+        parser.set_defaults(judge=pathlib.Path(judge_path))
+    parser.add_argument('tests', action=TestsFileAction, help='Tests specification')
+    parser.add_argument('--test', action='append', help='Test to run')
+    parser.add_argument('solutions', type=pathlib.Path, nargs='+', help='Solutions (files or directories of files)')
+    parser.add_argument('result', type=pathlib.Path, help='Output directory for result directories of solutions')
+    parser.add_argument('--overwrite', action='store_true', default=False, help='Overwrite output result directories')
+    parser.add_argument('--results', default='results.yaml', action=RelativePathAction, help='Results filename in output result directories')
+    parser.add_argument('--jobs', type=parse_jobs, default=1, help='Number of solutions judged in parallel (number or \'auto\')')
+    parser.add_argument('--cache', dest='cache_directory', type=pathlib.Path, help='Build cache directory (temporary for this execution by default)')
+    parser.add_argument('--policy', choices=config.POLICIES, default=config.POLICY_ALL, help='Which checkings to run once the verdict is settled')
+    parser.add_argument('--order', choices=config.ORDERS, default=config.ORDER_ORIGINAL, help='Order of checkings (history runs most often failing tests first, kept in the cache directory)')
+    parser.add_argument('--profile', action='store_true', default=False, help='Record judge overhead of every step in results')
+    parser.add_argument('--memory-enforcement', choices=config.MEMORY_ENFORCEMENTS, default=config.MEMORY_ENFORCEMENT_MONITOR, help='How memory limits are enforced (kernel uses cgroup memory.max or RLIMIT_AS)')
+    parser.add_argument('--subprocess-commands', action='store_true', default=False, help='Run filesystem setup commands as external programs instead of in-process')
+    parser.add_argument('--log-format', choices=config.LOG_FORMATS, default=config.LOG_FORMAT_FILES, help='Write command logs as separate files or as one JSON lines stream per checking')
+    parser.add_argument('--fork-server', action='store_true', default=config.FORK_SERVER, help='Start commands run as other users from a fork server kept per checking instead of spawning each one from the judge')
+    parser.add_argument('--cgroup-delegated', action='store_true', default=config.CGROUP_DELEGATED, help='Treat the judge\'s own cgroup as delegated even without systemd\'s delegate attribute or ownership')
+    systems = known_systems()
+    system = default_system()
+    if system not in systems:
+        parser.error('Default system \'{}\' is not available.'.format(system))
+    for system_id, System in systems.items():
+        parser.add_argument('--{}'.format(system_id), dest='system', action='store_const', const=system_id, default=system, help='Use {} execution environment'.format(system_id.title()))
+
+    def initialize(args):
+        collect_solutions(parser, args)
+        filter_tests(parser, args)
+        collect_input_paths(parser, args)
+        setattr(args, 'system', systems[args.system])
+        create_cache(parser, args)
+        create_history(parser, args)
+        create_batch(parser, args)
+    parser.set_defaults(initialize=initialize)
+
+    def execute(args):
+        args.initialize(args)
+        try:
+            judge = load_judge(args.judge)
+            execute_batch(judge, args.batch, jobs=args.jobs)
+        finally:
+            if args.cache_directory is None:
+                shutil.rmtree(args.cache.directory, ignore_errors=True)
+    parser.set_defaults(execute=execute)
+
+def peer_credentials(connection):
+    import socket
+    import struct
+    pid, uid, gid = struct.unpack('3i', connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+    return uid, gid
+
+def peer_allowed(uid, gid, users, group):
+    import pwd
+    if uid in users:
+        return True
+    if group is None:
+        return False
+    try:
+        entry = pwd.getpwuid(uid)
+    except KeyError:
+        return False
+    return group in os.getgrouplist(entry.pw_name, gid)
+
+def nearest_existing(path):
+    path = pathlib.Path(path)
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+def peer_access(uid, gid, paths):
+    import pwd
+    if uid == os.getuid():
+        return all([ os.access(path, mode) for path, mode in paths ])
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.setgroups(os.getgrouplist(pwd.getpwuid(uid).pw_name, gid))
+            os.setgid(gid)
+            os.setuid(uid)
+            code = 0 if all([ os.access(path, mode) for path, mode in paths ]) else 1
+        finally:
+            os._exit(code)
+    return os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 0
+
+def config_parser_serve(parser, judge_path=None):
+    if judge_path is None:
+        parser.add_argument('judge', action=ExistingFileAction, help='Judge script')
+    else:
+        parser.set_defaults(judge=pathlib.Path(judge_path))
+    parser.add_argument('socket', type=pathlib.Path, help='UNIX socket to listen on')
+    parser.add_argument('--socket-group', help='Group allowed to connect to the socket (only the server user and root by default)')
+    parser.add_argument('--allow-user', action='append', default=[], help='User allowed to connect to the socket (checked with the peer credentials)')
+    parser.add_argument('--jobs', type=parse_jobs, default=1, help='Number of checkings run in parallel (number or \'auto\')')
+    parser.add_argument('--cache', dest='cache_directory', type=pathlib.Path, help='Build cache directory (temporary for this server by default)')
+    parser.add_argument('--memory-enforcement', choices=config.MEMORY_ENFORCEMENTS, default=config.MEMORY_ENFORCEMENT_MONITOR, help='How memory limits are enforced (kernel uses cgroup memory.max or RLIMIT_AS)')
+    parser.add_argument('--subprocess-commands', action='store_true', default=False, help='Run filesystem setup commands as external programs instead of in-process')
+    parser.add_argument('--log-format', choices=config.LOG_FORMATS, default=config.LOG_FORMAT_FILES, help='Write command logs as separate files or as one JSON lines stream per checking')
+    parser.add_argument('--fork-server', action='store_true', default=config.FORK_SERVER, help='Start commands run as other users from a fork server kept per checking instead of spawning each one from the judge')
+    parser.add_argument('--cgroup-delegated', action='store_true', default=config.CGROUP_DELEGATED, help='Treat the judge\'s own cgroup as delegated even without systemd\'s delegate attribute or ownership')
+    systems = known_systems()
+    system = default_system()
+    for system_id, System in systems.items():
+        parser.add_argument('--{}'.format(system_id), dest='system', action='store_const', const=system_id, default=system, help='Use {} execution environment'.format(system_id.title()))
+
+    def execute(args):
+        import json
+        import signal
+        import socketserver
+        import sys
+        judge = load_judge(args.judge)
+        request_parser = RequestArgumentParser(prog='serve')
+        config_parser_execute(request_parser, judge_path=args.judge)
+        import grp
+        import pwd
+        cache_directory = args.cache_directory or pathlib.Path(tempfile.mkdtemp(prefix='kolejka-judge-cache-'))
+        accounts = list()
+        users = set([ 0, os.getuid(), ])
+        for user in args.allow_user:
+            try:
+                users.add(pwd.getpwnam(user).pw_uid)
+            except KeyError:
+                parser.error('Unknown user \'{}\'.'.format(user))
+        group = None
+        if args.socket_group is not None:
+            try:
+                group = grp.getgrnam(args.socket_group).gr_gid
+            except KeyError:
+                parser.error('Unknown group \'{}\'.'.format(args.socket_group))
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    uid, gid = peer_credentials(self.request)
+                    if not peer_allowed(uid, gid, users, group):
+                        raise PermissionError('User {} is not allowed to use this server'.format(uid))
+                    request = json.loads(str(self.rfile.readline(), 'utf8'))
+                    arguments = [ str(request['tests']), str(request['solution']), str(request['result']) ]
+                    result_path = pathlib.Path(request['result'])
+                    paths = [ (request['tests'], os.R_OK), (request['solution'], os.R_OK), (nearest_existing(result_path.parent), os.W_OK | os.X_OK) ]
+                    if result_path.exists():
+                        paths.append((result_path, os.W_OK | os.X_OK))
+                    if not peer_access(uid, gid, paths):
+                        raise PermissionError('User {} cannot access the requested paths'.format(uid))
+                    for test in request.get('test') or []:
+                        arguments += [ '--test', str(test) ]
+                    if request.get('overwrite'):
+                        arguments += [ '--overwrite' ]
+                    if request.get('results'):
+                        arguments += [ '--results', str(request['results']) ]
+                    if request.get('policy'):
+                        arguments += [ '--policy', str(request['policy']) ]
+                    if request.get('order'):
+                        arguments += [ '--order', str(request['order']) ]
+                    if request.get('profile'):
+                        arguments += [ '--profile' ]
+                    arguments += [ '--jobs', str(args.jobs), '--cache', str(cache_directory), '--memory-enforcement', args.memory_enforcement, '--{}'.format(args.system) ]
+                    if args.subprocess_commands:
+                        arguments += [ '--subprocess-commands' ]
+                    arguments += [ '--log-format', args.log_format ]
+                    if args.fork_server:
+                        arguments += [ '--fork-server' ]
+                    if args.cgroup_delegated:
+                        arguments += [ '--cgroup-delegated' ]
+                    request_args = request_parser.parse_args(arguments)
+                    request_args.initialize(request_args)
+                    if not peer_access(uid, gid, [ (path, os.R_OK) for paths in request_args.input_paths.values() for path in paths ]):
+                        raise PermissionError('User {} cannot read the test inputs'.format(uid))
+                    if accounts:
+                        for checking in request_args.checkings.values():
+                            checking.system.inherit_accounts(accounts[0])
+                    execute_checkings(judge, request_args.checkings, jobs=request_args.jobs, policy=request_args.policy, history=request_args.history)
+                    request_args.finalize(request_args)
+                    if not accounts:
+                        accounts.extend([ checking.system for checking in request_args.checkings.values() if checking.system.users ][:1])
+                    result_file = request_args.result / request_args.results
+                    logging.info('Served request for \'{}\'.'.format(request_args.result))
+                except Exception as e:
+                    logging.exception('Failed to serve request.')
+                    self.wfile.write(bytes(json.dumps({ 'error' : str(e) }) + '\n', 'utf8'))
+                    return
+                self.wfile.write(bytes(json.dumps({ 'result' : str(result_file) }) + '\n', 'utf8'))
+                with result_file.open('rb') as result:
+                    shutil.copyfileobj(result, self.wfile)
+
+        if args.socket.is_socket():
+            args.socket.unlink()
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            umask = os.umask(0o177)
+            try:
+                server = socketserver.UnixStreamServer(str(args.socket), RequestHandler)
+            finally:
+                os.umask(umask)
+            if group is not None:
+                os.chown(args.socket, -1, group)
+            if args.allow_user:
+                os.chmod(args.socket, 0o666)
+            elif group is not None:
+                os.chmod(args.socket, 0o660)
+            with server:
+                logging.warning('Kolejka Judge serving on \'{}\'.'.format(args.socket))
+                server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if args.socket.is_socket():
+                args.socket.unlink()
+            if args.cache_directory is None:
+                shutil.rmtree(cache_directory, ignore_errors=True)
+    parser.set_defaults(execute=execute)
+
+def serve_request(socket_path, tests, solution, result, test=None, overwrite=False, results=None, policy=None, order=None, profile=False):
+    import json
+    import socket
+    request = {
+        'tests' : str(pathlib.Path(tests).resolve()),
+        'solution' : str(pathlib.Path(solution).resolve()),
+        'result' : str(pathlib.Path(result).resolve()),
+        'test' : test,
+        'overwrite' : overwrite,
+        'results' : results and str(results),
+        'policy' : policy,
+        'order' : order,
+        'profile' : profile,
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(str(socket_path))
+        with connection.makefile('rwb') as stream:
+            stream.write(bytes(json.dumps(request) + '\n', 'utf8'))
+            stream.flush()
+            response = json.loads(str(stream.readline(), 'utf8') or '{}')
+            if 'result' not in response:
+                raise RuntimeError(response.get('error', 'No response from server.'))
+            return stream.read()
+
+def config_parser_request(parser):
+    parser.add_argument('socket', type=pathlib.Path, help='UNIX socket of a running judge server')
+    parser.add_argument('tests', action=ExistingFileAction, help='Tests specification')
+    parser.add_argument('--test', action='append', help='Test to run')
+    parser.add_argument('solution', action=ExistingFileAction, help='Solution')
+    parser.add_argument('result', type=pathlib.Path, help='Output result directory')
+    parser.add_argument('--overwrite', action='store_true', default=False, help='Overwrite output result directory')
+    parser.add_argument('--results', default='results.yaml', action=RelativePathAction, help='Results filename in output result directory')
+    parser.add_argument('--policy', choices=config.POLICIES, help='Which checkings to run once the verdict is settled')
+    parser.add_argument('--order', choices=config.ORDERS, help='Order of checkings')
+    parser.add_argument('--profile', action='store_true', default=False, help='Record judge overhead of every step in results')
+    def execute(args):
+        import sys
+        try:
+            results = serve_request(args.socket, args.tests, args.solution, args.result, test=args.test, overwrite=args.overwrite, results=args.results, policy=args.policy, order=args.order, profile=args.profile)
+        except (OSError, RuntimeError) as e:
+            parser.error(str(e))
+        sys.stdout.buffer.write(results)
+    parser.set_defaults(execute=execute)
+
+
+def config_parser_convert_log(parser):
+    parser.add_argument('log', type=pathlib.Path, help='Log directory with a JSON lines command log')
+    parser.add_argument('target', type=pathlib.Path, nargs='?', help='Output directory for the legacy log layout (defaults to the log directory)')
+    def execute(args):
+        from kolejka.judge.commandlog import convert_command_log
+        if not (args.log / config.COMMAND_LOG).is_file():
+            parser.error('No command log in \'{}\''.format(args.log))
+        convert_command_log(args.log, args.target)
     parser.set_defaults(execute=execute)
 
 
@@ -286,3 +791,11 @@ def config_parser(parser, judge_path=None):
     config_parser_client(subparser, judge_path=judge_path)
     subparser = subparsers.add_parser('execute')
     config_parser_execute(subparser, judge_path=judge_path)
+    subparser = subparsers.add_parser('execute-batch')
+    config_parser_execute_batch(subparser, judge_path=judge_path)
+    subparser = subparsers.add_parser('serve')
+    config_parser_serve(subparser, judge_path=judge_path)
+    subparser = subparsers.add_parser('request')
+    config_parser_request(subparser)
+    subparser = subparsers.add_parser('convert-log')
+    config_parser_convert_log(subparser)
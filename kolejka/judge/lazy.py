@@ -0,0 +1,21 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import importlib
+
+
+__all__ = [ 'lazy_getattr', ]
+def __dir__():
+    return __all__
+
+
+def lazy_getattr(package, submodules, namespace):
+    attributes = dict([ (name, module) for module, names in submodules.items() for name in names ])
+    def __getattr__(name):
+        module = attributes.get(name)
+        if module is None:
+            raise AttributeError('module \'{}\' has no attribute \'{}\''.format(package, name))
+        value = getattr(importlib.import_module('{}.{}'.format(package, module)), name)
+        namespace[name] = value
+        return value
+    return __getattr__
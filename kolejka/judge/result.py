@@ -19,7 +19,7 @@ def __dir__():
 
 class Result(AbstractResult):
 
-    def __init__(self, args=None, returncode=None, cpu_time=None, real_time=None, memory=None, gpu_time=None, gpu_memory=None, work_directory=None, environment=None, user=None, group=None, limits=None, stdin=None, stdout=None, stderr=None, status=None,):
+    def __init__(self, args=None, returncode=None, cpu_time=None, real_time=None, memory=None, gpu_time=None, gpu_memory=None, work_directory=None, environment=None, user=None, group=None, limits=None, stdin=None, stdout=None, stderr=None, status=None, sources=None,):
         self._args = args and [str(a) for a in args] or []
         self._returncode = returncode and int(returncode) or 0
         self._cpu_time = None
@@ -41,6 +41,8 @@ class Result(AbstractResult):
         self._stdout = stdout and pathlib.Path(stdout)
         self._stderr = stderr and pathlib.Path(stderr)
         self._status = status
+        self._sources = dict(sources or {})
+        self._monitor = None
 
     def __repr__(self):
         repr_dict = dict()
@@ -82,6 +84,8 @@ class Result(AbstractResult):
         yaml['memory'] = unparse_memory(self.memory)
         yaml['gpu_time'] = unparse_time(self.gpu_time)
         yaml['gpu_memory'] = unparse_memory(self.gpu_memory)
+        yaml['sources'] = self.sources or None
+        yaml['monitor'] = self.monitor
         return OrderedDict(yaml)
 
     @property
@@ -151,8 +155,10 @@ class Result(AbstractResult):
         return self._cpu_time
     def set_cpu_time(self, cpu_time):
         self._cpu_time = parse_time(cpu_time or '0s')
-    def update_cpu_time(self, cpu_time):
-        self._cpu_time = max(self._cpu_time, parse_time(cpu_time or '0s'))
+    def update_cpu_time(self, cpu_time, source=None):
+        cpu_time = parse_time(cpu_time or '0s')
+        self.update_source('cpu_time', cpu_time >= self._cpu_time, source)
+        self._cpu_time = max(self._cpu_time, cpu_time)
 
     @property
     def real_time(self):
@@ -161,8 +167,10 @@ class Result(AbstractResult):
         return self._real_time
     def set_real_time(self, real_time):
         self._real_time = parse_time(real_time or '0s')
-    def update_real_time(self, real_time):
-        self._real_time = max(self._real_time, parse_time(real_time or '0s'))
+    def update_real_time(self, real_time, source=None):
+        real_time = parse_time(real_time or '0s')
+        self.update_source('real_time', real_time >= self._real_time, source)
+        self._real_time = max(self._real_time, real_time)
 
     @property
     def memory(self):
@@ -171,8 +179,10 @@ class Result(AbstractResult):
         return self._memory
     def set_memory(self, memory):
         self._memory = parse_memory(memory or '0b')
-    def update_memory(self, memory):
-        self._memory = max(self._memory, parse_memory(memory or '0b'))
+    def update_memory(self, memory, source=None):
+        memory = parse_memory(memory or '0b')
+        self.update_source('memory', memory >= self._memory, source)
+        self._memory = max(self._memory, memory)
 
     @property
     def gpu_time(self):
@@ -181,8 +191,10 @@ class Result(AbstractResult):
         return self._gpu_time
     def set_gpu_time(self, gpu_time):
         self._gpu_time = parse_time(gpu_time or '0s')
-    def update_gpu_time(self, gpu_time):
-        self._gpu_time = max(self._gpu_time, parse_time(gpu_time or '0s'))
+    def update_gpu_time(self, gpu_time, source=None):
+        gpu_time = parse_time(gpu_time or '0s')
+        self.update_source('gpu_time', gpu_time >= self._gpu_time, source)
+        self._gpu_time = max(self._gpu_time, gpu_time)
 
     @property
     def gpu_memory(self):
@@ -191,8 +203,27 @@ class Result(AbstractResult):
         return self._gpu_memory
     def set_gpu_memory(self, gpu_memory):
         self._gpu_memory = parse_memory(gpu_memory or '0b')
-    def update_gpu_memory(self, gpu_memory):
-        self._gpu_memory = max(self._gpu_memory, parse_memory(gpu_memory or '0b'))
+    def update_gpu_memory(self, gpu_memory, source=None):
+        gpu_memory = parse_memory(gpu_memory or '0b')
+        self.update_source('gpu_memory', gpu_memory >= self._gpu_memory, source)
+        self._gpu_memory = max(self._gpu_memory, gpu_memory)
+
+    @property
+    def sources(self):
+        return self.get_sources()
+    def get_sources(self):
+        return self._sources
+    def update_source(self, key, improved, source):
+        if source is not None and improved:
+            self._sources[key] = source
+
+    @property
+    def monitor(self):
+        return self.get_monitor()
+    def get_monitor(self):
+        return self._monitor
+    def set_monitor(self, monitor):
+        self._monitor = monitor
 
     @property
     def status(self):
@@ -212,6 +243,8 @@ class ResultDict:
         return f'{self.__class__.__name__}: {self._status} {self._dict}'
 
     def __getattr__(self, key):
+        if key.startswith('_'):
+            raise AttributeError(key)
         return self._dict[key]
     def __getitem__(self, key):
         return self._dict[key]
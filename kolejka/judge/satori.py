@@ -37,8 +37,12 @@ def str_operator(v):
     if isinstance(v, list):
         v = ' '.join([e for e in [str_operator(e) for e in v] if e])
     if isinstance(v, pathlib.Path):
-        with v.open('rb') as vf:
-            v = vf.read(config.SATORI_STRING_LENGTH)
+        if v.exists():
+            with v.open('rb') as vf:
+                v = vf.read(config.SATORI_STRING_LENGTH)
+        else:
+            from kolejka.judge.commandlog import read_command_output
+            v = read_command_output(v, config.SATORI_STRING_LENGTH)
     if isinstance(v, bytes):
         try:
             v = str(v, 'utf8')
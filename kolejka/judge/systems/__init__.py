@@ -2,5 +2,15 @@
 
 
 from kolejka.judge import config
-from kolejka.judge.systems.local import LocalSystem
-from kolejka.judge.systems.observer import ObserverSystem
+from kolejka.judge.lazy import lazy_getattr
+
+
+_submodules = {
+    'local' : [ 'LocalSystem', ],
+    'asynclocal' : [ 'AsyncLocalSystem', ],
+    'observer' : [ 'ObserverSystem', ],
+}
+__all__ = [ 'config', ] + [ name for names in _submodules.values() for name in names ]
+__getattr__ = lazy_getattr(__name__, _submodules, globals())
+def __dir__():
+    return __all__
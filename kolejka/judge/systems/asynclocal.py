@@ -0,0 +1,282 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import asyncio
+import datetime
+import io
+import logging
+import os
+import pathlib
+import signal
+import threading
+import time
+
+
+from kolejka.judge import config
+from kolejka.judge.parse import *
+from kolejka.judge.result import Result
+from kolejka.judge.systems.base import output_pipe, pipe_copy
+from kolejka.judge.systems.local import LocalSystem, ProcessTree, monitor_elapsed, proc_info, proc_state, process_wait4
+
+
+__all__ = [ 'AsyncLocalSystem', 'event_loop', ]
+def __dir__():
+    return __all__
+
+
+_event_loop = None
+_event_loop_pid = None
+_event_loop_lock = threading.Lock()
+def event_loop():
+    global _event_loop, _event_loop_pid
+    with _event_loop_lock:
+        if _event_loop is None or _event_loop_pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, daemon=True).start()
+            _event_loop = loop
+            _event_loop_pid = os.getpid()
+        return _event_loop
+
+
+class CommandSupervisor:
+    def __init__(self, system, loop, process, cgroup, limits, result):
+        self._system = system
+        self._loop = loop
+        self._process = process
+        self._cgroup = cgroup
+        self._limits = limits
+        self._result = result
+        self._tree = ProcessTree(process.pid)
+        self._real_time = dict()
+        self._cpu_time = dict()
+        self._interval = None
+        self._samples = 0
+        self._monitor_time = 0.0
+        self._killing = False
+        self._timer = None
+        self._pidfd = None
+        self.exited = loop.create_future()
+        try:
+            self._pidfd = os.pidfd_open(process.pid)
+            loop.add_reader(self._pidfd, self.reap)
+        except (AttributeError, OSError):
+            self._pidfd = None
+        self.sample()
+
+    def measure(self):
+        process = self._process
+        result = self._result
+        if self._cgroup is not None:
+            try:
+                result.update_memory(self._cgroup.memory)
+                result.update_cpu_time(self._cgroup.cpu_time)
+            except OSError:
+                pass
+            result.update_real_time(monitor_elapsed(process))
+            return
+        info = proc_info(process.pid)
+        if info is None:
+            return
+        memory = info['rss']
+        self._real_time[process.pid] = info['real_time']
+        self._cpu_time[process.pid] = info['cpu_user'] + info['cpu_sys']
+        for pid in self._tree.descendants():
+            info = proc_info(pid)
+            if info is None:
+                continue
+            memory += info['rss']
+            self._real_time[pid] = max(self._real_time.get(pid,0), info['real_time'])
+            self._cpu_time[pid] = max(self._cpu_time.get(pid,0), info['cpu_user'] + info['cpu_sys'])
+        result.update_memory(memory)
+        result.update_real_time(sum(self._real_time.values()))
+        result.update_real_time(monitor_elapsed(process))
+        result.update_cpu_time(sum(self._cpu_time.values()))
+
+    def enforce(self):
+        limits = self._limits
+        result = self._result
+        if limits.cpu_time and result.cpu_time > limits.cpu_time:
+            self.kill()
+        if limits.real_time and result.real_time >= limits.real_time:
+            self.kill()
+        if limits.memory and result.memory > limits.memory:
+            self.kill()
+
+    def sample(self):
+        start = time.thread_time()
+        self._timer = None
+        if not self.exited.done():
+            self.measure()
+            self.enforce()
+            self._samples += 1
+            if self._pidfd is None:
+                self.reap()
+        if not self.exited.done():
+            self._interval, delay = self._system.monitor_schedule.delay(self._process, self._limits, self._result, self._interval)
+            self._timer = self._loop.call_later(max(delay, 0), self.sample)
+        self._monitor_time += time.thread_time() - start
+
+    def reap(self):
+        if self.exited.done():
+            return
+        self.measure()
+        try:
+            pid, status, rusage = process_wait4(self._process, os.WNOHANG)
+        except ChildProcessError:
+            pid, status, rusage = self._process.pid, None, None
+        if pid == 0:
+            return
+        real_time = monitor_elapsed(self._process)
+        if status is not None:
+            self._process.process.returncode = os.waitstatus_to_exitcode(status)
+        if self._pidfd is not None:
+            self._loop.remove_reader(self._pidfd)
+            os.close(self._pidfd)
+            self._pidfd = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.exited.set_result((self._process.process.returncode, real_time, rusage))
+
+    def kill(self):
+        if self._killing:
+            return
+        self._killing = True
+        if self._cgroup is not None:
+            self._cgroup.kill()
+            return
+        try:
+            self._process.terminate()
+        except:
+            pass
+        self._loop.call_later(0.1, self.kill_descendants)
+
+    def kill_descendants(self):
+        pids = [ pid for pid in self._tree.descendants() if proc_state(pid) not in [ None, 'Z', 'X' ] ]
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except:
+                pass
+        if pids:
+            self._loop.call_later(0.01, self.kill_descendants)
+
+    def report(self):
+        self._system.add_overhead('monitor', self._monitor_time)
+        if self._system.profile:
+            self._result.set_monitor({
+                'schedule' : self._system.monitor_schedule.yaml,
+                'samples' : self._samples,
+                'cpu_time' : unparse_time(datetime.timedelta(seconds=self._monitor_time)),
+            })
+
+
+class BackgroundCommand:
+    def __init__(self, future):
+        self._future = future
+
+    def join(self):
+        try:
+            self._future.result()
+        except Exception:
+            logging.exception('Background command failed.')
+
+
+class AsyncLocalSystem(LocalSystem):
+    """
+    Supervises commands on one shared event loop instead of per-command threads.
+
+    Process exits, output pipes and limit samples are handled by the loop
+    thread. Tasks stay synchronous: start_command and wait_command block the
+    calling thread until the loop has finished the operation.
+    """
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, event_loop()).result()
+
+    def async_file_writer(self, loop, path, append =False, work_directory =None, max_bytes =None):
+        if not isinstance(path, pathlib.Path):
+            path = self.resolve_path(path, work_directory)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        mode = 'ab' if append else 'wb'
+        if max_bytes is None:
+            return (path.open(mode, buffering=0), None)
+        output = path.open(mode, buffering=0)
+        fd_read, fd_write = output_pipe()
+        os.set_blocking(fd_read, False)
+        writer = loop.create_future()
+        bytes = 0
+        def readable():
+            nonlocal bytes
+            try:
+                if bytes < max_bytes:
+                    count = pipe_copy(fd_read, output.fileno(), max_bytes-bytes)
+                    bytes += count
+                else:
+                    count = len(os.read(fd_read, config.PIPE_SIZE))
+            except BlockingIOError:
+                return
+            if count:
+                return
+            loop.remove_reader(fd_read)
+            os.close(fd_read)
+            output.close()
+            writer.set_result(bytes)
+        loop.add_reader(fd_read, readable)
+        return (io.FileIO(fd_write, mode='wb', closefd=True), writer)
+
+    async def run_steps_in_thread(self, steps):
+        """
+        Runs the synchronous run_steps on a worker thread so a coroutine can await it.
+        """
+        return await asyncio.to_thread(self.run_steps, steps)
+
+    async def async_start_command(self, command, stdin_path, stdout_path, stdout_append, stdout_max_bytes, stderr_path, stderr_append, stderr_max_bytes, environment, work_path, user, group, limits):
+        loop = asyncio.get_running_loop()
+        stdin_file = self.read_file(stdin_path)
+        stdout_file, stdout_writer = self.async_file_writer(loop, stdout_path, stdout_append, max_bytes=stdout_max_bytes)
+        stderr_file, stderr_writer = self.async_file_writer(loop, stderr_path, stderr_append, max_bytes=stderr_max_bytes)
+        writers = (stdout_writer, stderr_writer)
+        process, cgroup = await asyncio.to_thread(self.spawn_command, command, stdin_file, stdout_file, stderr_file, environment, work_path, user, group, limits)
+        result = Result()
+        supervisor = CommandSupervisor(self, loop, process, cgroup, limits, result)
+        gpu_sampler = self.start_gpu_sampler(limits, result, lambda: loop.call_soon_threadsafe(supervisor.kill))
+        return (process, supervisor, result, writers, cgroup, gpu_sampler)
+
+    async def async_terminate_command(self, process):
+        process, supervisor, monitor_result, writers, cgroup, gpu_sampler = process
+        if gpu_sampler is not None:
+            await asyncio.to_thread(gpu_sampler.stop)
+        if cgroup is not None:
+            cgroup.kill()
+        else:
+            process.terminate()
+        await asyncio.gather(*[ writer for writer in writers if writer is not None ])
+        self.release_gpu_memory()
+
+    async def async_wait_command(self, process, result):
+        process, supervisor, monitor_result, writers, cgroup, gpu_sampler = process
+        returncode, real_time, rusage = await supervisor.exited
+        if gpu_sampler is not None:
+            await asyncio.to_thread(gpu_sampler.stop)
+        supervisor.report()
+        sources = await asyncio.to_thread(self.release_cgroup, cgroup, monitor_result, result.limits)
+        await asyncio.gather(*[ writer for writer in writers if writer is not None ])
+        self.update_result(result, monitor_result, sources, gpu_sampler, returncode, real_time, rusage)
+
+    def start_command(self, *args):
+        return self.call(self.async_start_command(*args))
+
+    def terminate_command(self, process):
+        return self.call(self.async_terminate_command(process))
+
+    def wait_command(self, process, result):
+        return self.call(self.async_wait_command(process, result))
+
+    def execute_safe_command(self, *args):
+        return self.execute_command(*args)
+
+    def start_background(self, process, result, finalize):
+        async def background():
+            await self.async_wait_command(process, result)
+            finalize()
+        return BackgroundCommand(asyncio.run_coroutine_threadsafe(background(), event_loop()))
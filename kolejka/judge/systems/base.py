@@ -3,6 +3,8 @@
 
 from copy import deepcopy
 import datetime
+import errno
+import fcntl
 import io
 import json
 import logging
@@ -16,9 +18,12 @@ import time
 
 
 from kolejka.judge import config
+from kolejka.judge.commandlog import CommandLog, command_log_text
 from kolejka.judge.exceptions import *
+from kolejka.judge.parse import unparse_time
 from kolejka.judge.paths import *
 from kolejka.judge.result import *
+from kolejka.judge.systems import native
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
 
@@ -28,8 +33,30 @@ def __dir__():
     return __all__
 
 
+def output_pipe():
+    fd_read, fd_write = os.pipe()
+    try:
+        fcntl.fcntl(fd_write, fcntl.F_SETPIPE_SZ, config.PIPE_SIZE)
+    except (AttributeError, OSError):
+        pass
+    return fd_read, fd_write
+
+def pipe_copy(fd_read, fd_write, count):
+    if hasattr(os, 'splice'):
+        try:
+            return os.splice(fd_read, fd_write, count)
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+    data = os.read(fd_read, min(count, config.PIPE_SIZE))
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd_write, view):]
+    return len(data)
+
+
 class SystemBase(AbstractSystem):
-    def __init__(self, output_directory=None, environment=None, paths=None):
+    def __init__(self, output_directory=None, environment=None, paths=None, cache=None, profile=False, native=True, log_format=config.LOG_FORMAT_FILES):
         self._output_directory = pathlib.Path(output_directory or '.').resolve()
         self._environment = dict(environment or {})
         self._users = set()
@@ -38,6 +65,16 @@ class SystemBase(AbstractSystem):
         self._paths = set(paths or [])
         self.validators = self.Validators(self)
         self._background = dict()
+        self._pipes = dict()
+        self._sequence_id = 0
+        self._cache = cache
+        self._profile = profile
+        self._native = native
+        self._native_directories = set()
+        self._log_format = log_format
+        self._command_log = None
+        self._overhead = None
+        self._overhead_lock = threading.Lock()
 
     @property
     def output_directory(self):
@@ -45,6 +82,50 @@ class SystemBase(AbstractSystem):
     def get_output_directory(self):
         return self._output_directory
 
+    @property
+    def cache(self):
+        return self.get_cache()
+    def get_cache(self):
+        return self._cache
+
+    @property
+    def profile(self):
+        return self.get_profile()
+    def get_profile(self):
+        return self._profile
+
+    @property
+    def native(self):
+        return self.get_native()
+    def get_native(self):
+        return self._native
+
+    @property
+    def log_format(self):
+        return self.get_log_format()
+    def get_log_format(self):
+        return self._log_format
+
+    @property
+    def command_log(self):
+        return self.get_command_log()
+    def get_command_log(self):
+        if self._command_log is None:
+            self._command_log = CommandLog(self.resolve_path(self.log_directory))
+        return self._command_log
+
+    def add_overhead(self, kind, seconds):
+        with self._overhead_lock:
+            if self._overhead is not None:
+                self._overhead[kind] = self._overhead.get(kind, 0.0) + seconds
+
+    def overhead_result(self, overhead, total):
+        result = ResultDict()
+        python = total - sum([ overhead.get(kind, 0.0) for kind in [ 'spawn', 'log', 'child' ] ])
+        for kind, seconds in [ ('total', total), ('python', max(python, 0.0)) ] + [ (kind, overhead.get(kind, 0.0)) for kind in [ 'spawn', 'monitor', 'log', 'child' ] ]:
+            result.set(kind, unparse_time(datetime.timedelta(seconds=seconds)))
+        return result
+
     @property
     def program_path(self):
         return self.get_program_path()
@@ -112,6 +193,18 @@ class SystemBase(AbstractSystem):
     def add_group(self, group):
         self._groups.add(group)
 
+    def inherit_accounts(self, system):
+        for group in system.groups:
+            self.add_group(group)
+        for user in system.users:
+            home = system.get_home(user)
+            if home:
+                try:
+                    home = str(self.output_directory / pathlib.Path(home).relative_to(system.output_directory))
+                except ValueError:
+                    pass
+            self.add_user(user, home)
+
     @property
     def paths(self):
         return self.get_paths()
@@ -120,6 +213,10 @@ class SystemBase(AbstractSystem):
     def add_path(self, path):
         self._paths.add(str(get_input_path(path).path))
 
+    def next_sequence_id(self):
+        self._sequence_id += 1
+        return self._sequence_id
+
     @property
     def log_directory(self):
         return self.get_log_directory()
@@ -198,16 +295,35 @@ class SystemBase(AbstractSystem):
                 return None
         raise RuntimeError('Step is neither Command nor Task')
 
+    def run_profiled_step(self, name, step, overhead):
+        start = time.perf_counter()
+        with self._overhead_lock:
+            parent, self._overhead = self._overhead, dict()
+        try:
+            return self.run_step(name, step)
+        finally:
+            with self._overhead_lock:
+                step_overhead, self._overhead = self._overhead, parent
+            overhead.set(name, self.overhead_result(step_overhead, time.perf_counter() - start))
+            for kind, seconds in step_overhead.items():
+                self.add_overhead(kind, seconds)
+
     def run_steps(self, steps):
         result = ResultDict()
+        overhead = ResultDict() if self.profile else None
         for name, step in steps.items():
             if result.status is None or step.obligatory:
-                step_result = self.run_step(name, step)
+                if overhead is not None:
+                    step_result = self.run_profiled_step(name, step, overhead)
+                else:
+                    step_result = self.run_step(name, step)
                 result.set(name, step_result)
                 if result.status is None and step_result and step_result.status is not None:
                     result.set_status(step_result.status)
         if result.status is None:
             result.set_status('OK')
+        if overhead is not None:
+            result.set(config.OVERHEAD, overhead)
         return result
 
     def terminate_background(self, background):
@@ -221,6 +337,33 @@ class SystemBase(AbstractSystem):
             del self._background[background]
             thread.join()
 
+    def start_background(self, process, result, finalize):
+        def background():
+            self.wait_command(process, result)
+            finalize()
+        thread = threading.Thread(target=background)
+        thread.start()
+        return thread
+
+    def add_pipe(self, path, work_directory =None):
+        path = self.resolve_path(path, work_directory)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        os.mkfifo(path, 0o600)
+        descriptor = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        try:
+            fcntl.fcntl(descriptor, fcntl.F_SETPIPE_SZ, config.PIPE_SIZE)
+        except (AttributeError, OSError):
+            pass
+        self._pipes[path] = descriptor
+        return path
+
+    def release_pipe(self, path, work_directory =None):
+        path = self.resolve_path(path, work_directory)
+        descriptor = self._pipes.pop(path, None)
+        if descriptor is not None:
+            os.close(descriptor)
+            path.unlink()
+
     def clear_background(self):
         backgrounds = list(self._background.keys())
         for background in backgrounds:
@@ -239,42 +382,22 @@ class SystemBase(AbstractSystem):
 
         command.verify_prerequirements()
         command_line = command.resolved_command
-        if command_line:
-            command_file = self.write_file(command.get_log_path('cmd'), text=True)
+        operation = command.native if command_line and self.native and not command.background and self.native_permitted(command) else None
+        if operation is not None:
+            result = self.run_native_command(command, command_line, operation)
+            command.set_result(result)
+            exit_status = command.verify_postconditions()
+            result.set_status(exit_status)
+        elif command_line:
+            log_start = time.perf_counter()
+            sections, debug_line = self.command_log_sections(command, command_line)
+            logging.info(debug_line)
+            command_file = None
+            if self.log_format == config.LOG_FORMAT_FILES:
+                command_file = self.write_file(command.get_log_path('cmd'), text=True)
             try:
-                command_file.write('Command:\n')
-                command_file.write(repr(command)+'\n')
-                command_file.write('\n\nCommand line:\n')
-                command_file.write(repr(command.command))
-                if command.stdin:
-                    command_file.write(' < '+repr(command.stdin))
-                if command.stdout:
-                    command_file.write(' >'+('>' if command.stdout_append else ''))
-                    command_file.write(' '+repr(command.stdout))
-                    if command.stdout_max_bytes is not None:
-                        command_file.write(' ['+str(command.stdout_max_bytes)+']')
-                if command.stderr:
-                    command_file.write(' 2>'+('>' if command.stderr_append else ''))
-                    command_file.write(' '+repr(command.stderr))
-                    if command.stderr_max_bytes is not None:
-                        command_file.write(' ['+str(command.stderr_max_bytes)+']')
-                command_file.write('\n')
-                debug_line = repr(command_line)
-                if command.stdin:
-                    debug_line += ' < '+str(command.stdin_path)
-                if command.stdout:
-                    debug_line += ' > '+str(command.stdout_path)
-                if command.stderr:
-                    debug_line += ' 2> '+str(command.stderr_path)
-                logging.info(debug_line)
-                command_file.write('\n\nResolved command line:\n')
-                command_file.write(debug_line+'\n')
-                command_file.write('\n\nPrerequirements:\n')
-                for prerequirement in command.prerequirements:
-                    command_file.write(str(prerequirement)+'\n')
-                command_file.write('\n\nPostconditions:\n')
-                for postcondition in command.postconditions:
-                    command_file.write(str(postcondition)+'\n')
+                if command_file is not None:
+                    command_file.write(command_log_text(sections))
                 limits = self.update_limits(command.limits)
                 environment = command.update_environment(self.environment)
                 result = Result(
@@ -288,7 +411,9 @@ class SystemBase(AbstractSystem):
                         stdout = command.stdout_path,
                         stderr = command.stderr_path,
                     )
-                command_file.flush()
+                if command_file is not None:
+                    command_file.flush()
+                self.add_overhead('log', time.perf_counter() - log_start)
                 if command.safe and not command.background:
                     self.execute_safe_command(
                         command_line,
@@ -307,6 +432,7 @@ class SystemBase(AbstractSystem):
                         result,
                     )
                 else:
+                    spawn_start = time.perf_counter()
                     process = self.start_command(
                         command_line,
                         command.stdin_path,
@@ -322,30 +448,131 @@ class SystemBase(AbstractSystem):
                         command.group,
                         limits,
                     )
+                    self.add_overhead('spawn', time.perf_counter() - spawn_start)
                     if command.background:
                         def finalize():
-                            self.wait_command(process, result)
-                            command_file.write('\n\nResult:\n')
-                            command_file.write(repr(result)+'\n')
-                            command_file.close()
-                        thread = threading.Thread(target=finalize)
-                        thread.start()
-                        self._background[command.name] = thread, process
+                            command.set_result(result)
+                            result.set_status(command.verify_postconditions())
+                            if command_file is not None:
+                                command_file.write('\n\nResult:\n')
+                                command_file.write(repr(result)+'\n')
+                                command_file.close()
+                            else:
+                                self.record_command(command, sections, result)
+                        self._background[command.name] = self.start_background(process, result, finalize), process
                         return result
+                    child_start = time.perf_counter()
                     self.wait_command(process, result)
-                command_file.write('\n\nResult:\n')
-                command_file.write(repr(result)+'\n')
+                    self.add_overhead('child', time.perf_counter() - child_start)
+                log_start = time.perf_counter()
+                if command_file is not None:
+                    command_file.write('\n\nResult:\n')
+                    command_file.write(repr(result)+'\n')
             finally:
                 if not command.background:
-                    command_file.close()
+                    if command_file is not None:
+                        command_file.close()
+                    self.add_overhead('log', time.perf_counter() - log_start)
 
             command.set_result(result)
             exit_status = command.verify_postconditions()
             result.set_status(exit_status)
+            if command_file is None:
+                log_start = time.perf_counter()
+                self.record_command(command, sections, result)
+                self.add_overhead('log', time.perf_counter() - log_start)
 
         self.validators.set_work_directory(None)
         return result
 
+    def command_log_sections(self, command, command_line):
+        line = repr(command.command)
+        if command.stdin:
+            line += ' < '+repr(command.stdin)
+        if command.stdout:
+            line += ' >'+('>' if command.stdout_append else '')
+            line += ' '+repr(command.stdout)
+            if command.stdout_max_bytes is not None:
+                line += ' ['+str(command.stdout_max_bytes)+']'
+        if command.stderr:
+            line += ' 2>'+('>' if command.stderr_append else '')
+            line += ' '+repr(command.stderr)
+            if command.stderr_max_bytes is not None:
+                line += ' ['+str(command.stderr_max_bytes)+']'
+        debug_line = repr(command_line)
+        if command.stdin:
+            debug_line += ' < '+str(command.stdin_path)
+        if command.stdout:
+            debug_line += ' > '+str(command.stdout_path)
+        if command.stderr:
+            debug_line += ' 2> '+str(command.stderr_path)
+        sections = [
+            ('Command', repr(command)+'\n'),
+            ('Command line', line+'\n'),
+            ('Resolved command line', debug_line+'\n'),
+            ('Prerequirements', ''.join([ str(prerequirement)+'\n' for prerequirement in command.prerequirements ])),
+            ('Postconditions', ''.join([ str(postcondition)+'\n' for postcondition in command.postconditions ])),
+        ]
+        return sections, debug_line
+
+    def record_command(self, command, sections, result):
+        log_path = command.get_log_path('cmd')
+        if log_path is None:
+            return
+        self.command_log.record({
+            'sequence_id' : command.sequence_id,
+            'name' : command.name,
+            'cmd' : self.command_log.relative(self.resolve_path(log_path)),
+            'args' : result.args,
+            'result' : result.yaml,
+            'sections' : sections + [ ('Result', repr(result)+'\n') ],
+        }, command.log_outputs)
+
+    def native_permitted(self, command):
+        import grp
+        if command.user is not None and str(command.user) != self.current_user:
+            return False
+        if command.group is not None and str(command.group) != grp.getgrgid(os.getgid()).gr_name:
+            return False
+        return True
+
+    def run_native_command(self, command, command_line, operation):
+        sections, debug_line = self.command_log_sections(command, command_line)
+        logging.info(debug_line)
+        result = Result(
+                args = command_line,
+                work_directory = command.work_path,
+                user = command.user,
+                group = command.group,
+                limits = self.update_limits(command.limits),
+            )
+        child_start = time.perf_counter()
+        error = ''
+        try:
+            operation()
+            result.set_returncode(0)
+        except (OSError, KeyError) as e:
+            result.set_returncode(1)
+            error = '{}: {}\n'.format(command.name, e)
+            logging.warning(error.strip())
+        child_time = time.perf_counter() - child_start
+        result.update_real_time(datetime.timedelta(seconds=child_time))
+        self.add_overhead('child', child_time)
+        log_start = time.perf_counter()
+        for path, text in [ (command.stdout_path, ''), (command.stderr_path, error) ]:
+            if path is not None:
+                with self.write_file(path, text=True) as output_file:
+                    output_file.write(text)
+        if self.log_format == config.LOG_FORMAT_FILES:
+            log_path = command.get_log_path('cmd')
+            if log_path is not None:
+                with self.write_file(log_path, text=True) as command_file:
+                    command_file.write(command_log_text(sections + [ ('Result', repr(result)+'\n') ]))
+        else:
+            self.record_command(command, sections, result)
+        self.add_overhead('log', time.perf_counter() - log_start)
+        return result
+
     def execute_safe_command(self, command, stdin_path, stdout_path, stdout_append, stdout_max_bytes, stderr_path, stderr_append, stderr_max_bytes, environment, work_path, user, group, limits, result):
         return self.execute_command(command, stdin_path, stdout_path, stdout_append, stdout_max_bytes, stderr_path, stderr_append, stderr_max_bytes, environment, work_path, user, group, limits, result)
 
@@ -390,29 +617,31 @@ class SystemBase(AbstractSystem):
         if not isinstance(path, pathlib.Path):
             path = self.resolve_path(path, work_directory)
         path.parent.mkdir(exist_ok=True, parents=True)
-        mode = 'wb'
-        if append:
-            mode += 'a'
-        fd_read, fd_write = os.pipe()
+        mode = 'ab' if append else 'wb'
+        if max_bytes is None:
+            return (path.open(mode, buffering=0), None)
+        fd_read, fd_write = output_pipe()
         def writer():
             bytes = 0
-            with path.open(mode) as output:
-                while True:
-                    data = os.read(fd_read, 65536)
-                    if not data:
+            with path.open(mode, buffering=0) as output:
+                while bytes < max_bytes:
+                    count = pipe_copy(fd_read, output.fileno(), max_bytes-bytes)
+                    if not count:
                         break
-                    if max_bytes is not None:
-                        if bytes < max_bytes:
-                            data = data[0:max_bytes-bytes]
-                        else:
-                            data = b''
-                    bytes += len(data)
-                    output.write(data)
+                    bytes += count
+            with open(os.devnull, 'wb', buffering=0) as null:
+                while pipe_copy(fd_read, null.fileno(), config.PIPE_SIZE):
+                    pass
             os.close(fd_read)
         w = threading.Thread(target=writer)
         w.start()
         return (io.FileIO(fd_write, mode='wb', closefd=True), w)
 
+    def join_writers(self, writers):
+        for writer in writers:
+            if writer is not None:
+                writer.join()
+
     def get_user_group_groups(self, user=None, group=None):
         import pwd
         import grp
@@ -445,6 +674,37 @@ class SystemBase(AbstractSystem):
                 pass
         return (uid, gid, groups)
 
+    def get_owner(self, user=None, group=None):
+        import pwd
+        import grp
+        if not self.superuser:
+            return -1, -1
+        uid = pwd.getpwnam(str(user)).pw_uid if user else -1
+        gid = grp.getgrnam(str(group)).gr_gid if group else -1
+        return uid, gid
+
+    def make_directory(self, path, user=None, group=None, mode=None):
+        uid, gid = self.get_owner(user, group)
+        key = (str(path), uid, gid, mode)
+        if key in self._native_directories and os.path.isdir(path):
+            return
+        native.make_directory(path, uid, gid, mode)
+        self._native_directories.add(key)
+
+    def install_file(self, source, target, user=None, group=None, mode=None, parents=False):
+        uid, gid = self.get_owner(user, group)
+        self._native_directories.clear()
+        native.install_file(source, target, uid, gid, mode, parents)
+
+    def change_owner(self, path, user=None, group=None, recursive=False):
+        uid, gid = self.get_owner(user, group)
+        self._native_directories.clear()
+        native.change_owner(path, uid, gid, recursive)
+
+    def change_mode(self, path, mode, file_type=None):
+        self._native_directories.clear()
+        native.change_mode(path, mode, file_type)
+
     def get_home(self, user=None):
         if user is None:
             return None
@@ -485,7 +745,7 @@ class SystemBase(AbstractSystem):
             if isinstance(path, InputPath):
                 return self.system_path_exists(path)
             path = self.resolve_path(path)
-            return path.is_file() or path == pathlib.Path('/dev/null')
+            return path.is_file() or path.is_fifo() or path == pathlib.Path('/dev/null')
 
         def directory_exists(self, path):
             return self.resolve_path(path).is_dir()
@@ -0,0 +1,391 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import atexit
+import datetime
+import errno
+import itertools
+import logging
+import math
+import os
+import pathlib
+import select
+import signal
+import threading
+import time
+
+
+import kolejka.common.subprocess
+
+from kolejka.judge import config
+
+
+__all__ = [ 'Cgroup', 'CgroupPool', 'CgroupStarter', 'ProcessCgroup', 'cgroup_pool', 'cgroup_root', ]
+def __dir__():
+    return __all__
+
+
+def cgroup_mount():
+    with open('/proc/self/mountinfo') as mountinfo_file:
+        for line in mountinfo_file:
+            fields = line.split()
+            separator = fields.index('-')
+            if fields[separator+1] == 'cgroup2':
+                return pathlib.Path(fields[4])
+
+def cgroup_mounts():
+    mounts = dict()
+    with open('/proc/self/mountinfo') as mountinfo_file:
+        for line in mountinfo_file:
+            fields = line.split()
+            separator = fields.index('-')
+            if fields[separator+1] == 'cgroup2':
+                mounts.setdefault('', (fields[3], fields[4]))
+            elif fields[separator+1] == 'cgroup':
+                for option in fields[separator+3].split(','):
+                    mounts.setdefault(option, (fields[3], fields[4]))
+    return mounts
+
+def cgroup_own():
+    with open('/proc/self/cgroup') as cgroup_file:
+        for line in cgroup_file:
+            hierarchy, controllers, path = line.strip().split(':', 2)
+            if hierarchy == '0':
+                return path
+
+def cgroup_enable(root, controllers):
+    control = ' '.join([ '+'+controller for controller in controllers ])
+    try:
+        (root / 'cgroup.subtree_control').write_text(control)
+        return
+    except OSError as e:
+        if e.errno != errno.EBUSY:
+            raise
+    if [ pid for pid in (root / 'cgroup.procs').read_text().split() if int(pid) != os.getpid() ]:
+        raise OSError('Cgroup \'{}\' holds processes other than the judge'.format(root))
+    leaf = root / config.CGROUP_LEAF
+    leaf.mkdir(exist_ok=True)
+    (leaf / 'cgroup.procs').write_text(str(os.getpid()))
+    (root / 'cgroup.subtree_control').write_text(control)
+
+def cgroup_delegated(root):
+    for name in [ 'trusted.delegate', 'user.delegate' ]:
+        try:
+            if os.getxattr(root, name).strip() == b'1':
+                return True
+        except (AttributeError, OSError):
+            pass
+    return os.geteuid() != 0 and os.stat(root).st_uid == os.geteuid()
+
+def cgroup_detect(delegated=False):
+    mount = cgroup_mount()
+    path = cgroup_own()
+    if mount is None or path is None:
+        raise OSError('No cgroup v2 hierarchy mounted')
+    root = mount / path.lstrip('/')
+    if not os.access(root, os.W_OK):
+        raise OSError('Cgroup \'{}\' is not writable'.format(root))
+    if not delegated and not cgroup_delegated(root):
+        raise OSError('Cgroup \'{}\' is not delegated to the judge'.format(root))
+    available = (root / 'cgroup.controllers').read_text().split()
+    enabled = (root / 'cgroup.subtree_control').read_text().split()
+    missing = [ controller for controller in config.CGROUP_CONTROLLERS if controller not in enabled ]
+    unavailable = [ controller for controller in missing if controller not in available ]
+    if unavailable:
+        raise OSError('Cgroup \'{}\' does not delegate controllers: {}'.format(root, ' '.join(unavailable)))
+    if missing:
+        cgroup_enable(root, missing)
+    return root
+
+_cgroup_roots = dict()
+_cgroup_roots_lock = threading.Lock()
+def cgroup_root(delegated=False):
+    with _cgroup_roots_lock:
+        if delegated not in _cgroup_roots:
+            try:
+                _cgroup_roots[delegated] = cgroup_detect(delegated)
+            except (OSError, ValueError) as e:
+                logging.warning('Cgroup accounting disabled, falling back to process monitoring: {}'.format(e))
+                _cgroup_roots[delegated] = None
+        return _cgroup_roots[delegated]
+
+
+class Cgroup:
+    _counter = itertools.count(1)
+
+    def __init__(self, root):
+        self._path = pathlib.Path(root) / 'kolejka-judge-{}-{}'.format(os.getpid(), next(self._counter))
+        self._path.mkdir()
+        self._cpu_base = datetime.timedelta()
+        self._oom_base = 0
+        self._peak = None
+        self._reused = False
+        self._memory_limited = False
+
+    @property
+    def path(self):
+        return self.get_path()
+    def get_path(self):
+        return self._path
+
+    def read(self, name):
+        return (self.path / name).read_text()
+
+    def read_keys(self, name):
+        return dict([ (key, int(value)) for key, value in [ line.split() for line in self.read(name).strip().split('\n') if line ] ])
+
+    @property
+    def memory(self):
+        return self.read_keys('memory.stat')['anon']
+
+    @property
+    def memory_limited(self):
+        return self._memory_limited
+
+    @property
+    def memory_peak(self):
+        try:
+            if self._peak is not None:
+                self._peak.seek(0)
+                return int(self._peak.read())
+            if self._reused:
+                return None
+            return int(self.read('memory.peak'))
+        except OSError:
+            return None
+
+    @property
+    def cpu_usage(self):
+        return datetime.timedelta(microseconds=self.read_keys('cpu.stat')['usage_usec'])
+
+    @property
+    def cpu_time(self):
+        return self.cpu_usage - self._cpu_base
+
+    @property
+    def pids(self):
+        return int(self.read('pids.current'))
+
+    @property
+    def oom_kills(self):
+        try:
+            return self.read_keys('memory.events').get('oom_kill', 0)
+        except OSError:
+            return 0
+
+    @property
+    def oom_killed(self):
+        return self.oom_kills > self._oom_base
+
+    def set_memory_limit(self, memory):
+        (self.path / 'memory.max').write_text(str(int(memory)))
+        (self.path / 'memory.oom.group').write_text('1')
+        self._memory_limited = True
+        try:
+            (self.path / 'memory.swap.max').write_text('0')
+        except OSError:
+            pass
+
+    def reclaim(self):
+        current = int(self.read('memory.current'))
+        if current:
+            try:
+                (self.path / 'memory.reclaim').write_text(str(current))
+            except OSError:
+                pass
+            current = int(self.read('memory.current'))
+        if current:
+            raise OSError('Cgroup \'{}\' still holds {} bytes after reclaim'.format(self.path, current))
+
+    @property
+    def populated(self):
+        return bool(self.read_keys('cgroup.events').get('populated'))
+
+    def wait_empty(self, timeout=None):
+        deadline = timeout is not None and time.monotonic() + timeout
+        with (self.path / 'cgroup.events').open() as events:
+            poll = select.poll()
+            poll.register(events, select.POLLPRI)
+            while True:
+                events.seek(0)
+                if dict([ line.split() for line in events.read().strip().split('\n') if line ]).get('populated') != '1':
+                    return True
+                remaining = None
+                if deadline:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                poll.poll(None if remaining is None else int(math.ceil(remaining * 1000)))
+
+    def kill(self):
+        try:
+            (self.path / 'cgroup.kill').write_text('1')
+            return
+        except OSError:
+            pass
+        while self.pids:
+            for pid in self.read('cgroup.procs').split():
+                try:
+                    os.kill(int(pid), signal.SIGKILL)
+                except OSError:
+                    pass
+            self.wait_empty(0.01)
+
+    def empty(self):
+        if self.populated:
+            self.kill()
+            self.wait_empty()
+
+    def reset(self):
+        self.empty()
+        self.reclaim()
+        for name, value in [ ('memory.max', 'max'), ('memory.swap.max', 'max'), ('memory.oom.group', '0') ]:
+            try:
+                (self.path / name).write_text(value)
+            except OSError:
+                pass
+        self._memory_limited = False
+        self._cpu_base = self.cpu_usage
+        self._oom_base = self.oom_kills
+        if self._peak is not None:
+            self._peak.close()
+            self._peak = None
+        try:
+            peak = (self.path / 'memory.peak').open('r+')
+            try:
+                peak.write('reset\n')
+                peak.flush()
+                self._peak = peak
+            except OSError:
+                peak.close()
+        except OSError:
+            pass
+        self._reused = True
+
+    def remove(self):
+        if self._peak is not None:
+            self._peak.close()
+            self._peak = None
+        try:
+            self.empty()
+            self.path.rmdir()
+        except OSError:
+            pass
+
+
+class CgroupPool:
+    def __init__(self, root, size=config.CGROUP_POOL_SIZE):
+        self._root = root
+        self._size = size
+        self._free = list()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        return Cgroup(self._root)
+
+    def release(self, cgroup):
+        try:
+            cgroup.reset()
+        except (OSError, KeyError):
+            cgroup.remove()
+            return
+        with self._lock:
+            if len(self._free) < self._size:
+                self._free.append(cgroup)
+                return
+        cgroup.remove()
+
+    def clear(self):
+        if os.getpid() != self._pid:
+            return
+        with self._lock:
+            free, self._free = self._free, list()
+        for cgroup in free:
+            cgroup.remove()
+
+_cgroup_pools = dict()
+_cgroup_pools_lock = threading.Lock()
+def cgroup_pool(root):
+    key = (os.getpid(), str(root))
+    with _cgroup_pools_lock:
+        pool = _cgroup_pools.get(key)
+        if pool is None:
+            pool = _cgroup_pools[key] = CgroupPool(root)
+            atexit.register(pool.clear)
+        return pool
+
+
+def memory_stat(path):
+    return dict([ (key, int(value)) for key, value in [ line.split() for line in (path / 'memory.stat').read_text().strip().split('\n') if line ] ])
+
+
+class ProcessCgroup:
+    def __init__(self, pid):
+        mounts = cgroup_mounts()
+        unified = None
+        legacy = dict()
+        with open('/proc/{}/cgroup'.format(pid)) as cgroup_file:
+            for line in cgroup_file:
+                hierarchy, controllers, path = line.strip().split(':', 2)
+                for controller in (controllers.split(',') if controllers else [ '' ]):
+                    if controller in mounts:
+                        root, mount = mounts[controller]
+                        path = pathlib.Path(mount) / os.path.relpath(path, root)
+                        if controller:
+                            legacy[controller] = path
+                        elif hierarchy == '0':
+                            unified = path
+        self._cpu = legacy.get('cpuacct')
+        self._memory = legacy.get('memory')
+        self._unified = unified
+        if self._cpu is None and self._unified is None:
+            raise OSError('No cgroup CPU accounting for process {}'.format(pid))
+
+    @property
+    def path(self):
+        return self.get_path()
+    def get_path(self):
+        return self._cpu or self._unified
+
+    @property
+    def memory(self):
+        try:
+            if self._memory is not None:
+                return memory_stat(self._memory)['total_rss']
+            return memory_stat(self._unified)['anon']
+        except (OSError, TypeError, KeyError):
+            return 0
+
+    @property
+    def cpu_time(self):
+        if self._cpu is not None:
+            return datetime.timedelta(microseconds=int((self._cpu / 'cpuacct.usage').read_text()) // 1000)
+        stat = dict([ line.split() for line in (self._unified / 'cpu.stat').read_text().strip().split('\n') if line ])
+        return datetime.timedelta(microseconds=int(stat['usage_usec']))
+
+    def kill(self):
+        try:
+            pids = (self.path / 'cgroup.procs').read_text().split()
+        except OSError:
+            return
+        for pid in pids:
+            try:
+                os.kill(int(pid), signal.SIGKILL)
+            except OSError:
+                pass
+
+
+class CgroupStarter(kolejka.common.subprocess.Starter):
+    def __init__(self, *args, cgroup=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cgroup = cgroup
+
+    def get_commands(self):
+        commands = super().get_commands()
+        if self.cgroup is not None:
+            commands.insert(0, f'open({self.represent(self.cgroup.path / "cgroup.procs")},\'w\').write(str(os.getpid()))')
+        return commands
@@ -0,0 +1,318 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import json
+import math
+import os
+import queue
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import threading
+import time
+import types
+
+
+from kolejka.judge import config
+from kolejka.judge.systems.spawn import SpawnedProcess
+
+
+__all__ = [ 'ForkServer', 'ForkedProcess', 'fork_server_python', ]
+def __dir__():
+    return __all__
+
+
+FORK_SERVER_SOURCE = r'''
+import json, os, resource, selectors, signal, socket, sys, traceback
+control = socket.socket(fileno=0)
+wakeup_read, wakeup_write = os.pipe()
+os.set_blocking(wakeup_read, False)
+os.set_blocking(wakeup_write, False)
+signal.set_wakeup_fd(wakeup_write)
+signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+selector = selectors.DefaultSelector()
+selector.register(control, selectors.EVENT_READ)
+selector.register(wakeup_read, selectors.EVENT_READ)
+running = set()
+def send(message):
+    control.sendall(json.dumps(message).encode('utf-8'))
+def run(request, fds):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            signal.set_wakeup_fd(-1)
+            for signum in [ signal.SIGCHLD, signal.SIGPIPE, signal.SIGXFSZ ]:
+                signal.signal(signum, signal.SIG_DFL)
+            os.setsid()
+            gate = fds.pop()
+            for target, fd in enumerate(fds):
+                os.dup2(fd, target)
+            for fd in fds:
+                if fd > 2:
+                    os.close(fd)
+            os.chdir(request['cwd'])
+            if request['group'] is not None:
+                os.setgid(request['group'])
+            if request['groups'] is not None:
+                os.setgroups(request['groups'])
+            for limit, soft, hard in request['resources']:
+                resource.setrlimit(limit, (soft, hard))
+            if request['user'] is not None:
+                os.setuid(request['user'])
+            if os.read(gate, 1) != b'1':
+                os._exit(127)
+            os.close(gate)
+            os.execvpe(request['args'][0], request['args'], request['env'])
+        except BaseException:
+            os.write(2, traceback.format_exc().encode('utf-8'))
+        os._exit(127)
+    for fd in fds:
+        os.close(fd)
+    running.add(pid)
+    send({ 'pid' : pid })
+def report():
+    for pid in list(running):
+        info = os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+        if info is None:
+            continue
+        running.discard(pid)
+        send({ 'exit' : pid, 'code' : info.si_status if info.si_code == os.CLD_EXITED else -info.si_status })
+send({ 'ready' : os.getpid() })
+while True:
+    for key, events in selector.select():
+        if key.fileobj is control:
+            message, fds, flags, address = socket.recv_fds(control, 1 << 20, 4)
+            if not message:
+                sys.exit(0)
+            request = json.loads(message)
+            if 'reap' in request:
+                os.waitpid(request['reap'], 0)
+            else:
+                run(request, fds)
+        else:
+            while True:
+                try:
+                    if not os.read(wakeup_read, 4096):
+                        break
+                except BlockingIOError:
+                    break
+            report()
+'''
+
+
+_fork_server_python = False
+def fork_server_python():
+    global _fork_server_python
+    if _fork_server_python is False:
+        _fork_server_python = shutil.which('python3', path='/usr/bin:/bin:/usr/local/bin')
+    return _fork_server_python
+
+
+def zombie_rusage(pid):
+    try:
+        with open('/proc/'+str(pid)+'/stat') as stat_file:
+            stat = stat_file.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    clock_ticks = os.sysconf('SC_CLK_TCK')
+    return types.SimpleNamespace(ru_utime=(int(stat[11]) + int(stat[13])) / clock_ticks, ru_stime=(int(stat[12]) + int(stat[14])) / clock_ticks)
+
+def process_terminated(pid):
+    try:
+        with open('/proc/'+str(pid)+'/stat') as stat_file:
+            return stat_file.read().rsplit(')', 1)[1].split()[0] in [ 'Z', 'X' ]
+    except OSError:
+        return True
+
+
+class ForkedProcess(SpawnedProcess):
+    def __init__(self, server, pid, start_time):
+        super().__init__(None, pid, start_time)
+        self.status = None
+        self.rusage = None
+        self._server = server
+        self._exited = threading.Event()
+        try:
+            self._pidfd = os.pidfd_open(pid)
+        except (AttributeError, OSError):
+            self._pidfd = None
+
+    def exit(self, status, rusage=None):
+        if self._exited.is_set():
+            return
+        self.status = status
+        self.rusage = rusage
+        self.returncode = os.waitstatus_to_exitcode(status)
+        self._exited.set()
+
+    def terminated(self, timeout=None):
+        pidfd = self._pidfd
+        if self._exited.is_set():
+            return True
+        if pidfd is not None:
+            poll = select.poll()
+            poll.register(pidfd, select.POLLIN)
+            try:
+                return bool(poll.poll(None if timeout is None else int(math.ceil(max(timeout, 0) * 1000))))
+            except OSError:
+                return self._exited.is_set()
+        deadline = timeout is not None and time.perf_counter() + timeout
+        while not process_terminated(self.pid):
+            if deadline and time.perf_counter() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def collect(self):
+        if not self._exited.wait(config.FORK_SERVER_TIMEOUT):
+            self._server.kill()
+            self._exited.wait()
+        if self._pidfd is not None:
+            os.close(self._pidfd)
+            self._pidfd = None
+
+    def poll(self):
+        if self.returncode is None and self.terminated(0):
+            self.collect()
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self.terminated(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        self.collect()
+        return self.returncode
+
+    def wait4(self, options=0):
+        if not self.terminated(0 if options & os.WNOHANG else None):
+            return 0, 0, None
+        self.collect()
+        return self.pid, self.status, self.rusage
+
+
+class ForkServer:
+    def __init__(self, process, control):
+        self._process = process
+        self._control = control
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._replies = queue.Queue()
+        self._processes = dict()
+        self._processes_lock = threading.Lock()
+        self._alive = True
+        self._reader = threading.Thread(target=self.read, daemon=True)
+        self._reader.start()
+        if not isinstance(self.reply(), dict):
+            self.stop()
+            raise OSError('Fork server did not start')
+
+    @property
+    def alive(self):
+        return self._alive
+
+    def read(self):
+        while True:
+            try:
+                message = self._control.recv(1 << 16)
+                if message:
+                    message = json.loads(message)
+            except (OSError, ValueError):
+                message = None
+            if not message:
+                break
+            if 'pid' in message:
+                process = ForkedProcess(self, int(message['pid']), time.perf_counter())
+                with self._processes_lock:
+                    self._processes[process.pid] = process
+                self._replies.put(process)
+            elif 'exit' in message:
+                with self._processes_lock:
+                    process = self._processes.pop(message['exit'], None)
+                if process is None:
+                    continue
+                if not process_terminated(process.pid):
+                    break
+                code = int(message['code'])
+                process.exit(code << 8 if code >= 0 else -code, zombie_rusage(process.pid))
+                try:
+                    self.send({ 'reap' : process.pid })
+                except OSError:
+                    pass
+            else:
+                self._replies.put(message)
+        self._alive = False
+        self._replies.put(None)
+        self.kill()
+        with self._processes_lock:
+            processes, self._processes = self._processes, dict()
+        for process in processes.values():
+            if not process_terminated(process.pid):
+                process.kill()
+            process.exit(signal.SIGKILL, zombie_rusage(process.pid))
+
+    def reply(self):
+        try:
+            return self._replies.get(timeout=config.FORK_SERVER_TIMEOUT)
+        except queue.Empty:
+            self.kill()
+            return None
+
+    def send(self, message, fds=()):
+        with self._send_lock:
+            socket.send_fds(self._control, [ json.dumps(message).encode('utf-8') ], list(fds))
+
+    def run(self, args, stdin, stdout, stderr, env, cwd, user=None, group=None, groups=None, resources=None, cgroup=None):
+        args = [ str(arg) for arg in args ]
+        request = {
+            'args' : args,
+            'env' : dict([ (str(key), str(value)) for key, value in (env or {}).items() ]),
+            'cwd' : str(cwd),
+            'user' : None if user is None else int(user),
+            'group' : None if group is None else int(group),
+            'groups' : None if groups is None else [ int(gid) for gid in groups ],
+            'resources' : [ [ int(limit), int(soft), int(hard) ] for limit, (soft, hard) in (resources or {}).items() ],
+        }
+        gate_read, gate_write = os.pipe()
+        try:
+            with self._lock:
+                if not self._alive:
+                    return None
+                try:
+                    self.send(request, [ stream.fileno() for stream in [ stdin, stdout, stderr ] ] + [ gate_read ])
+                except OSError:
+                    self.kill()
+                    return None
+                finally:
+                    os.close(gate_read)
+                process = self.reply()
+                if not isinstance(process, ForkedProcess):
+                    return None
+            process.args = args
+            if cgroup is not None:
+                (cgroup.path / 'cgroup.procs').write_text(str(process.pid))
+            os.write(gate_write, b'1')
+            process.start_time = time.perf_counter()
+            return process
+        finally:
+            os.close(gate_write)
+
+    def kill(self):
+        self._alive = False
+        try:
+            self._process.process.kill()
+        except OSError:
+            pass
+
+    def stop(self):
+        try:
+            self._control.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._reader.join()
+        self._control.close()
+        try:
+            self._process.process.wait(timeout=config.FORK_SERVER_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self._process.process.kill()
+            self._process.process.wait()
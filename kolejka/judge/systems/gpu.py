@@ -0,0 +1,161 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import datetime
+import threading
+import time
+
+
+from kolejka.judge import config
+
+
+__all__ = [ 'GPUBackend', 'NvidiaSMIBackend', 'NVMLBackend', 'FakeGPUBackend', 'GPUSampler', 'default_gpu_backend', ]
+def __dir__():
+    return __all__
+
+
+class GPUBackend:
+    def __init__(self):
+        self._devices = None
+
+    @property
+    def devices(self):
+        return self.get_devices()
+    def get_devices(self):
+        if self._devices is None:
+            self._devices = self.load_devices()
+        return self._devices
+
+    def load_devices(self):
+        raise NotImplementedError
+
+    def memory(self):
+        raise NotImplementedError
+
+    def utilization(self):
+        raise NotImplementedError
+
+
+class NvidiaSMIBackend(GPUBackend):
+    def load_devices(self):
+        from kolejka.common.gpu import gpu_stats
+        return list(gpu_stats().gpus.keys())
+
+    def memory(self):
+        from kolejka.common.gpu import gpu_stats
+        if not self.devices:
+            return dict()
+        return dict([ (gpu, (stats.memory_usage, stats.memory_total)) for gpu, stats in gpu_stats(self.devices).gpus.items() ])
+
+    def utilization(self):
+        from kolejka.common.gpu import gpu_stats
+        if not self.devices:
+            return dict()
+        return dict([ (gpu, stats.utilization or 0) for gpu, stats in gpu_stats(self.devices).gpus.items() ])
+
+
+class NVMLBackend(GPUBackend):
+    def __init__(self):
+        super().__init__()
+        import pynvml
+        pynvml.nvmlInit()
+        self._nvml = pynvml
+
+    def load_devices(self):
+        return [ self._nvml.nvmlDeviceGetHandleByIndex(index) for index in range(self._nvml.nvmlDeviceGetCount()) ]
+
+    def memory(self):
+        memory = dict()
+        for index, handle in enumerate(self.devices):
+            info = self._nvml.nvmlDeviceGetMemoryInfo(handle)
+            memory[index] = (info.used, info.total)
+        return memory
+
+    def utilization(self):
+        return dict([ (index, self._nvml.nvmlDeviceGetUtilizationRates(handle).gpu) for index, handle in enumerate(self.devices) ])
+
+
+class FakeGPUBackend(GPUBackend):
+    def __init__(self, memory_total, memory_usage=None, utilization=None):
+        super().__init__()
+        self._memory_total = dict(memory_total)
+        self._memory_usage = dict([ (gpu, 0) for gpu in self._memory_total.keys() ])
+        self._memory_usage.update(memory_usage or {})
+        self._utilization = dict([ (gpu, 0) for gpu in self._memory_total.keys() ])
+        self._utilization.update(utilization or {})
+
+    def load_devices(self):
+        return list(self._memory_total.keys())
+
+    def set_memory_usage(self, gpu, usage):
+        self._memory_usage[gpu] = usage
+
+    def set_utilization(self, gpu, utilization):
+        self._utilization[gpu] = utilization
+
+    def memory(self):
+        return dict([ (gpu, (self._memory_usage[gpu], self._memory_total[gpu])) for gpu in self.devices ])
+
+    def utilization(self):
+        return dict([ (gpu, self._utilization[gpu]) for gpu in self.devices ])
+
+
+_default_gpu_backend = None
+def default_gpu_backend():
+    global _default_gpu_backend
+    if _default_gpu_backend is None:
+        try:
+            _default_gpu_backend = NVMLBackend()
+        except Exception:
+            _default_gpu_backend = NvidiaSMIBackend()
+    return _default_gpu_backend
+
+
+class GPUSampler:
+    def __init__(self, backend, limits, result, on_limit, interval=config.GPU_MONITOR_INTERVAL):
+        self._backend = backend
+        self._limits = limits
+        self._result = result
+        self._on_limit = on_limit
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._gpu_time = 0.0
+        self._sample_time = None
+
+    def sample(self):
+        sample_time = time.perf_counter()
+        gpu_memory = 0
+        for gpu, (usage, total) in self._backend.memory().items():
+            if self._limits.gpu_memory:
+                gpu_memory = max(gpu_memory, self._limits.gpu_memory - (total - usage))
+            else:
+                gpu_memory = max(gpu_memory, usage)
+        self._result.update_gpu_memory(gpu_memory)
+        utilization = self._backend.utilization()
+        if utilization and self._sample_time is not None:
+            self._gpu_time += (sample_time - self._sample_time) * max(utilization.values()) / 100
+            self._result.update_gpu_time(datetime.timedelta(seconds=self._gpu_time))
+        self._sample_time = sample_time
+        if self._limits.gpu_memory and self._result.gpu_memory > self._limits.gpu_memory:
+            self._on_limit()
+            return False
+        if self._limits.gpu_time and self._result.gpu_time > self._limits.gpu_time:
+            self._on_limit()
+            return False
+        return True
+
+    def run(self):
+        while self.sample() and not self._stop.wait(self._interval):
+            pass
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
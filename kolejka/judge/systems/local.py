@@ -5,6 +5,7 @@ import datetime
 import math
 import os
 import pathlib
+import select
 import signal
 import tempfile
 import time
@@ -13,12 +14,14 @@ import traceback
 
 
 import kolejka.common.subprocess
-from kolejka.common.gpu import gpu_stats
 
 from kolejka.judge import config
 from kolejka.judge.result import Result
 from kolejka.judge.systems.base import *
+from kolejka.judge.systems.forkserver import ForkedProcess
+from kolejka.judge.systems.spawn import spawn_process
 from kolejka.judge.parse import *
+from kolejka.judge.typing import *
 
 
 __all__ = [ 'LocalSystem' ]
@@ -92,97 +95,386 @@ def proc_descendants(pid):
             new_descendants += children.get(p,[])
     return all_descendants
 
-def monitor_safe_process(process, limits, result):
-    while True:
-        info = proc_info(process.pid)
-        if info is None:
-            break
-        result.update_memory(info['rss'])
-        result.update_real_time(info['real_time'])
-        result.update_cpu_time(info['cpu_user'] + info['cpu_sys'])
-        if limits.cpu_time and result.cpu_time > limits.cpu_time:
-            process.kill()
-        if limits.real_time and result.real_time > limits.real_time:
-            process.kill()
-        if limits.memory and result.memory > limits.memory:
-            process.kill()
-        time.sleep(0.05)
-
-def end_process(process):
+def proc_stat(pid):
     try:
-        pids = proc_descendants(process.pid)
+        with open('/proc/'+str(pid)+'/stat') as stat_file:
+            return stat_file.read().rsplit(')', 1)[1].split()
+    except:
+        return None
+
+def proc_state(pid):
+    stat = proc_stat(pid)
+    return stat and stat[0]
+
+def proc_task_children(pid):
+    children = list()
+    task = '/proc/'+str(pid)+'/task'
+    for tid in os.listdir(task):
+        with open(task+'/'+tid+'/children') as children_file:
+            children += [ int(child) for child in children_file.read().split() ]
+    return children
+
+class ProcessTree:
+    def __init__(self, pid):
+        self._pid = pid
+        self._tree = dict()
+        self._foreign = set()
+        self._children = os.path.exists('/proc/self/task/'+str(os.getpid())+'/children')
+        stat = proc_stat(pid)
+        if stat is not None:
+            self._tree[pid] = stat[19]
+
+    def update_children(self):
+        tree = dict()
+        active = list(self._tree.items())
+        while active:
+            pid, start = active.pop()
+            if pid in tree:
+                continue
+            stat = proc_stat(pid)
+            if stat is None or start not in [ None, stat[19] ]:
+                continue
+            try:
+                children = proc_task_children(pid)
+            except OSError:
+                continue
+            tree[pid] = stat[19]
+            active += [ (child, None) for child in children ]
+        self._tree = tree
+
+    def update_pids(self):
+        current = set([ int(name) for name in os.listdir('/proc') if name.isdigit() ])
+        tree = dict()
+        for pid, start in self._tree.items():
+            stat = pid in current and proc_stat(pid)
+            if stat and stat[19] == start:
+                tree[pid] = start
+        self._tree = tree
+        self._foreign &= current
+        stats = dict()
+        for pid in current - set(self._tree.keys()) - self._foreign:
+            stat = proc_stat(pid)
+            if stat is not None:
+                stats[pid] = stat
+        attached = True
+        while attached:
+            attached = [ pid for pid, stat in stats.items() if int(stat[1]) in self._tree ]
+            for pid in attached:
+                self._tree[pid] = stats.pop(pid)[19]
+        self._foreign |= set(stats.keys())
+
+    def descendants(self):
+        if self._children:
+            self.update_children()
+        else:
+            self.update_pids()
+        return sorted([ pid for pid in self._tree.keys() if pid != self._pid ])
+
+class ProcessWaiter:
+    def __init__(self, pid):
+        self._fd = None
+        self._poll = None
+        try:
+            self._fd = os.pidfd_open(pid)
+            self._poll = select.poll()
+            self._poll.register(self._fd, select.POLLIN)
+        except (AttributeError, OSError):
+            self.close()
+
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, value, traceback):
+        self.close()
+
+    def wait(self, timeout):
+        timeout = max(timeout, 0)
+        if self._poll is None:
+            time.sleep(timeout)
+            return False
+        return bool(self._poll.poll(int(math.ceil(timeout * 1000))))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+        self._poll = None
+
+def monitor_elapsed(process):
+    return datetime.timedelta(seconds=time.perf_counter() - process.start_time)
+
+class MonitorSchedule:
+    DEFAULT_MIN_INTERVAL = config.MONITOR_MIN_INTERVAL
+    DEFAULT_MAX_INTERVAL = config.MONITOR_MAX_INTERVAL
+    DEFAULT_BACKOFF = config.MONITOR_BACKOFF
+    DEFAULT_WARMUP = config.MONITOR_WARMUP
+    DEFAULT_MARGIN = config.MONITOR_MARGIN
+    @default_kwargs
+    def __init__(self, min_interval=None, max_interval=None, backoff=None, warmup=None, margin=None):
+        self.min_interval = float(min_interval)
+        self.max_interval = max(float(max_interval), self.min_interval)
+        self.backoff = float(backoff)
+        self.warmup = float(warmup)
+        self.margin = float(margin)
+
+    @property
+    def yaml(self):
+        return dict([ (key, getattr(self, key)) for key in [ 'min_interval', 'max_interval', 'backoff', 'warmup', 'margin' ] ])
+
+    def next_interval(self, interval, elapsed, limits, result):
+        if interval is None or elapsed.total_seconds() < self.warmup:
+            interval = self.min_interval
+        else:
+            interval = min(self.max_interval, interval * self.backoff)
+        if limits.memory and result.memory >= self.margin * limits.memory:
+            interval = self.min_interval
+        if limits.cpu_time:
+            if result.cpu_time >= self.margin * limits.cpu_time:
+                interval = self.min_interval
+            interval = min(interval, max((limits.cpu_time - result.cpu_time).total_seconds(), self.min_interval))
+        return interval
+
+    def delay(self, process, limits, result, interval=None):
+        elapsed = monitor_elapsed(process)
+        interval = self.next_interval(interval, elapsed, limits, result)
+        if limits.real_time:
+            return interval, min(interval, (limits.real_time - elapsed).total_seconds())
+        return interval, interval
+
+def monitor_safe_process(process, limits, result, schedule):
+    exited = False
+    interval = None
+    samples = 1
+    with ProcessWaiter(process.pid) as waiter:
+        while True:
+            info = proc_info(process.pid)
+            if info is None:
+                break
+            result.update_memory(info['rss'], source='monitor')
+            result.update_real_time(info['real_time'], source='monitor')
+            result.update_real_time(monitor_elapsed(process), source='monitor')
+            result.update_cpu_time(info['cpu_user'] + info['cpu_sys'], source='monitor')
+            if limits.cpu_time and result.cpu_time > limits.cpu_time:
+                process.kill()
+            if limits.real_time and result.real_time >= limits.real_time:
+                process.kill()
+            if limits.memory and result.memory > limits.memory:
+                process.kill()
+            if exited:
+                break
+            interval, delay = schedule.delay(process, limits, result, interval)
+            exited = waiter.wait(delay)
+            samples += 1
+    return samples
+
+def process_wait4(process, options=0):
+    if isinstance(process, ForkedProcess):
+        return process.wait4(options)
+    return os.wait4(process.pid, options)
+
+def wait_process(process):
+    try:
+        pid, status, rusage = process_wait4(process)
+    except ChildProcessError:
+        completed = kolejka.common.subprocess.wait(process)
+        return completed.returncode, completed.time, None
+    real_time = monitor_elapsed(process)
+    process.process.returncode = os.waitstatus_to_exitcode(status)
+    return process.process.returncode, real_time, rusage
+
+def update_rusage(result, rusage):
+    if rusage is not None:
+        result.update_cpu_time(datetime.timedelta(seconds=rusage.ru_utime + rusage.ru_stime), source='rusage')
+
+def end_process(process, tree=None):
+    tree = tree or ProcessTree(process.pid)
+    try:
+        pids = tree.descendants()
         try:
             process.terminate()
             time.sleep(0.1)
         except:
             pass
-        for pid in pids:
-            try:
-                os.kill(pid)
-            except:
-                pass
         while True:
-            pids = proc_descendants(process.pid)
-            if pids:
-                for pid in pids:
-                    try:
-                        os.kill(pid)
-                    except:
-                        pass
-            else:
+            pids = [ pid for pid in pids if proc_state(pid) not in [ None, 'Z', 'X' ] ]
+            if not pids:
                 break
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except:
+                    pass
+            time.sleep(0.01)
+            pids = tree.descendants()
     except:
         pass
 
-def monitor_process(process, limits, result):
-    real_time = dict()
-    cpu_time = dict()
-    while True:
-        info = proc_info(process.pid)
-        if info is None:
-            break
-        memory = info['rss']
-        real_time[process.pid] = info['real_time']
-        cpu_time[process.pid] = info['cpu_user'] + info['cpu_sys']
-
-        infos = dict([ (pid, proc_info(pid)) for pid in proc_descendants(process.pid) ])
-        for pid, info in infos.items():
+def monitor_process(process, limits, result, schedule):
+    tree = ProcessTree(process.pid)
+    with ProcessWaiter(process.pid) as waiter:
+        real_time = dict()
+        cpu_time = dict()
+        exited = False
+        interval = None
+        samples = 1
+        while True:
+            info = proc_info(process.pid)
             if info is None:
-                continue
-            memory += info['rss']
-            real_time[pid] = max(real_time.get(pid,0), info['real_time'])
-            cpu_time[pid] = max(cpu_time.get(pid,0), info['cpu_user'] + info['cpu_sys'])
-
-        result.update_memory(memory)
-        result.update_real_time(sum(real_time.values()))
-        result.update_cpu_time(sum(cpu_time.values()))
-
-        gpu_memory = 0
-        for gpu, stats in gpu_stats().gpus.items():
-            usage = stats.memory_usage
-            if limits.gpu_memory:
-                total = stats.memory_total
-                gpu_memory = max(gpu_memory, limits.gpu_memory - (total - usage))
-            else:
-                gpu_memory = max(gpu_memory, usage)
-
-        result.update_gpu_memory(gpu_memory)
-
-        if limits.cpu_time and result.cpu_time > limits.cpu_time:
-            end_process(process)
-        if limits.real_time and result.real_time > limits.real_time:
-            end_process(process)
-        if limits.memory and result.memory > limits.memory:
-            end_process(process)
-        if limits.gpu_memory and result.gpu_memory > limits.gpu_memory:
-            end_process(process)
-        time.sleep(0.05)
+                break
+            memory = info['rss']
+            real_time[process.pid] = info['real_time']
+            cpu_time[process.pid] = info['cpu_user'] + info['cpu_sys']
+
+            infos = dict([ (pid, proc_info(pid)) for pid in tree.descendants() ])
+            for pid, info in infos.items():
+                if info is None:
+                    continue
+                memory += info['rss']
+                real_time[pid] = max(real_time.get(pid,0), info['real_time'])
+                cpu_time[pid] = max(cpu_time.get(pid,0), info['cpu_user'] + info['cpu_sys'])
+
+            result.update_memory(memory)
+            result.update_real_time(sum(real_time.values()))
+            result.update_real_time(monitor_elapsed(process))
+            result.update_cpu_time(sum(cpu_time.values()))
+
+            if limits.cpu_time and result.cpu_time > limits.cpu_time:
+                end_process(process, tree)
+            if limits.real_time and result.real_time >= limits.real_time:
+                end_process(process, tree)
+            if limits.memory and result.memory > limits.memory:
+                end_process(process, tree)
+            if exited:
+                break
+            interval, delay = schedule.delay(process, limits, result, interval)
+            exited = waiter.wait(delay)
+            samples += 1
+    return samples
+
+def monitor_cgroup_process(process, cgroup, limits, result, schedule):
+    with ProcessWaiter(process.pid) as waiter:
+        proc = pathlib.Path('/proc/'+str(process.pid))
+        exited = False
+        interval = None
+        samples = 1
+        while proc.exists():
+            try:
+                result.update_memory(cgroup.memory)
+                result.update_cpu_time(cgroup.cpu_time)
+            except OSError:
+                break
+            result.update_real_time(monitor_elapsed(process))
+
+            if limits.cpu_time and result.cpu_time > limits.cpu_time:
+                cgroup.kill()
+            if limits.real_time and result.real_time >= limits.real_time:
+                cgroup.kill()
+            if limits.memory and result.memory > limits.memory:
+                cgroup.kill()
+            if exited:
+                break
+            interval, delay = schedule.delay(process, limits, result, interval)
+            exited = waiter.wait(delay)
+            samples += 1
+    return samples
 
 class LocalSystem(SystemBase):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, monitor_schedule=None, gpu_backend=None, memory_enforcement=config.MEMORY_ENFORCEMENT_MONITOR, memory_headroom=config.MEMORY_ADDRESS_SPACE_HEADROOM, fast_spawn=config.FAST_SPAWN, fork_server=config.FORK_SERVER, cgroup_delegated=config.CGROUP_DELEGATED, **kwargs):
         super().__init__(*args, **kwargs)
         self.output_directory.mkdir(parents=True, exist_ok=True)
         self.preserved_gpu_memory = {}
+        self._monitor_schedule = monitor_schedule or MonitorSchedule()
+        self._gpu_backend = gpu_backend
+        self._memory_enforcement = memory_enforcement
+        self._memory_headroom = parse_memory(memory_headroom)
+        self._fast_spawn = fast_spawn
+        self._fork_server = fork_server
+        self._cgroup_delegated = cgroup_delegated
+        self._fork_server_process = False
+        self._fork_server_lock = threading.Lock()
+
+    @property
+    def memory_enforcement(self):
+        return self.get_memory_enforcement()
+    def get_memory_enforcement(self):
+        return self._memory_enforcement
+
+    @property
+    def fast_spawn(self):
+        return self.get_fast_spawn()
+    def get_fast_spawn(self):
+        return self._fast_spawn
+
+    @property
+    def fork_server(self):
+        return self.get_fork_server()
+    def get_fork_server(self):
+        return self._fork_server
+
+    @property
+    def cgroup_delegated(self):
+        return self.get_cgroup_delegated()
+    def get_cgroup_delegated(self):
+        return self._cgroup_delegated
+
+    @property
+    def memory_headroom(self):
+        return self.get_memory_headroom()
+    def get_memory_headroom(self):
+        return self._memory_headroom
+
+    @property
+    def gpu_backend(self):
+        return self.get_gpu_backend()
+    def get_gpu_backend(self):
+        if self._gpu_backend is None:
+            from kolejka.judge.systems.gpu import default_gpu_backend
+            self._gpu_backend = default_gpu_backend()
+        return self._gpu_backend
+
+    def start_gpu_sampler(self, limits, result, on_limit):
+        if not limits.gpu_memory and not limits.gpu_time:
+            return None
+        from kolejka.judge.systems.gpu import GPUSampler
+        return GPUSampler(self.gpu_backend, limits, result, on_limit).start()
+
+    @property
+    def monitor_schedule(self):
+        return self.get_monitor_schedule()
+    def get_monitor_schedule(self):
+        return self._monitor_schedule
+
+    def start_monitor(self, target, *args):
+        result = args[-1]
+        def monitor():
+            start = time.thread_time()
+            samples = target(*args, self.monitor_schedule)
+            cpu_time = time.thread_time() - start
+            self.add_overhead('monitor', cpu_time)
+            if self.profile:
+                result.set_monitor({
+                    'schedule' : self.monitor_schedule.yaml,
+                    'samples' : samples,
+                    'cpu_time' : unparse_time(datetime.timedelta(seconds=cpu_time)),
+                })
+        thread = threading.Thread(target=monitor)
+        thread.start()
+        return thread
+
+    @property
+    def cgroup_root(self):
+        return self.get_cgroup_root()
+    def get_cgroup_root(self):
+        from kolejka.judge.systems.cgroup import cgroup_root
+        return cgroup_root(self.cgroup_delegated)
+
+    @property
+    def cgroup_pool(self):
+        return self.get_cgroup_pool()
+    def get_cgroup_pool(self):
+        if self.cgroup_root is None:
+            return None
+        from kolejka.judge.systems.cgroup import cgroup_pool
+        return cgroup_pool(self.cgroup_root)
 
     def get_superuser(self):
         return os.getuid() == 0
@@ -191,7 +483,7 @@ class LocalSystem(SystemBase):
         import pwd
         return pwd.getpwuid(os.getuid()).pw_name
 
-    def get_resources(self, limits):
+    def get_resources(self, limits, address_space=False):
         import resource
         resources = dict()
         for limit in [
@@ -225,6 +517,9 @@ class LocalSystem(SystemBase):
         if limits.stack_memory:
             resources[resource.RLIMIT_STACK] = (limits.stack_memory, limits.stack_memory)
 
+        if address_space and limits.memory:
+            resources[resource.RLIMIT_AS] = (limits.memory + self.memory_headroom, limits.memory + self.memory_headroom)
+
         if not self.superuser:
             for res, (soft, hard) in resources.items():
                 usr_soft, usr_hard = resource.getrlimit(res)
@@ -290,48 +585,39 @@ class LocalSystem(SystemBase):
         resources = self.get_resources(limits)
         #resources[resource.RLIMIT_NPROC] = (1,1) #This is a very bad idea, read notes in man execv on EAGAIN
 
-        process = kolejka.common.subprocess.start(
-            command,
-            user=change_user,
-            group=change_group,
-            groups=change_groups,
-            resources=resources,
-            stdin=stdin_file,
-            stdout=stdout_file,
-            stderr=stderr_file,
-            env=environment,
-            cwd=work_path,
-        )
+        spawn_start = time.perf_counter()
+        process = self.start_process(command, stdin_file, stdout_file, stderr_file, environment, work_path, change_user, change_group, change_groups, resources)
+        child_start = time.perf_counter()
+        self.add_overhead('spawn', child_start - spawn_start)
         stdin_file.close()
         stdout_file.close()
         stderr_file.close()
-        monitoring_thread = threading.Thread(target=monitor_safe_process, args=(process, limits, result))
-        monitoring_thread.start()
-        returncode = process.wait()
+        monitoring_thread = self.start_monitor(monitor_safe_process, process, limits, result)
+        returncode, real_time, rusage = wait_process(process)
+        self.add_overhead('child', time.perf_counter() - child_start)
         monitoring_thread.join()
-        for writer in writers:
-            writer.join()
+        self.join_writers(writers)
+        result.update_real_time(real_time, source='wait')
+        update_rusage(result, rusage)
         result.set_returncode(returncode)
 
 
-    def start_command(self, command, stdin_path, stdout_path, stdout_append, stdout_max_bytes, stderr_path, stderr_append, stderr_max_bytes, environment, work_path, user, group, limits):
-        stdin_file = self.read_file(stdin_path)
-        stdout_file, stdout_writer = self.file_writer(stdout_path, stdout_append, max_bytes=stdout_max_bytes)
-        stderr_file, stderr_writer = self.file_writer(stderr_path, stderr_append, max_bytes=stderr_max_bytes)
-        writers = (stdout_writer, stderr_writer)
-        
-        change_user, change_group, change_groups = self.get_user_group_groups(user, group)
-
-        resources = self.get_resources(limits)
-
-        if limits.gpu_memory:
-            self.preserve_gpu_memory(limits.gpu_memory)
-
-        process = kolejka.common.subprocess.start(
+    def start_process(self, command, stdin_file, stdout_file, stderr_file, environment, work_path, user, group, groups, resources, cgroup=None):
+        if self.fast_spawn:
+            process = spawn_process(command, stdin_file, stdout_file, stderr_file, environment, work_path, user=user, group=group, groups=groups, resources=resources, cgroup=cgroup)
+            if process is not None:
+                return process
+        starter = kolejka.common.subprocess.Starter
+        if cgroup is not None:
+            import functools
+            from kolejka.judge.systems.cgroup import CgroupStarter
+            starter = functools.partial(CgroupStarter, cgroup=cgroup)
+        return kolejka.common.subprocess.start(
             command,
-            user=change_user,
-            group=change_group,
-            groups=change_groups,
+            _Starter=starter,
+            user=user,
+            group=group,
+            groups=groups,
             resources=resources,
             stdin=stdin_file,
             stdout=stdout_file,
@@ -339,31 +625,142 @@ class LocalSystem(SystemBase):
             env=environment,
             cwd=work_path,
         )
+
+    def start_fork_server(self, environment):
+        import socket
+        from kolejka.judge.systems.forkserver import ForkServer, FORK_SERVER_SOURCE, fork_server_python
+        python = fork_server_python()
+        if python is None:
+            return None
+        control, server_control = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            with open(os.devnull, 'wb') as devnull:
+                process = self.start_process([ python, '-I', '-S', '-c', FORK_SERVER_SOURCE ], server_control, devnull, devnull, environment, '/', None, None, None, None)
+        except OSError:
+            control.close()
+            return None
+        finally:
+            server_control.close()
+        try:
+            return ForkServer(process, control)
+        except OSError:
+            return None
+
+    def forked_process(self, command, stdin_file, stdout_file, stderr_file, environment, work_path, user, group, groups, resources, cgroup=None):
+        if os.getuid() != 0 or user is None:
+            return None
+        with self._fork_server_lock:
+            server = self._fork_server_process
+            if server is not None and not (server and server.alive):
+                if server:
+                    server.stop()
+                server = self._fork_server_process = self.start_fork_server(environment)
+        if server is None:
+            return None
+        return server.run(command, stdin_file, stdout_file, stderr_file, environment, work_path, user=user, group=group, groups=groups, resources=resources, cgroup=cgroup)
+
+    def stop_fork_server(self):
+        with self._fork_server_lock:
+            server, self._fork_server_process = self._fork_server_process, False
+        if server:
+            server.stop()
+
+    def run_steps(self, steps):
+        try:
+            return super().run_steps(steps)
+        finally:
+            self.stop_fork_server()
+
+    def spawn_command(self, command, stdin_file, stdout_file, stderr_file, environment, work_path, user, group, limits):
+        change_user, change_group, change_groups = self.get_user_group_groups(user, group)
+
+        if limits.gpu_memory:
+            self.preserve_gpu_memory(limits.gpu_memory)
+
+        kernel_memory = self.memory_enforcement == config.MEMORY_ENFORCEMENT_KERNEL and limits.memory
+        cgroup = None
+        if self.cgroup_pool is not None:
+            try:
+                cgroup = self.cgroup_pool.acquire()
+                if kernel_memory:
+                    cgroup.set_memory_limit(limits.memory)
+            except OSError:
+                if cgroup is not None:
+                    self.cgroup_pool.release(cgroup)
+                cgroup = None
+
+        resources = self.get_resources(limits, address_space=kernel_memory and cgroup is None)
+
+        process = None
+        if self.fork_server:
+            process = self.forked_process(command, stdin_file, stdout_file, stderr_file, environment, work_path, change_user, change_group, change_groups, resources, cgroup=cgroup)
+        if process is None:
+            process = self.start_process(command, stdin_file, stdout_file, stderr_file, environment, work_path, change_user, change_group, change_groups, resources, cgroup=cgroup)
         stdin_file.close()
         stdout_file.close()
         stderr_file.close()
+        return process, cgroup
+
+    def start_command(self, command, stdin_path, stdout_path, stdout_append, stdout_max_bytes, stderr_path, stderr_append, stderr_max_bytes, environment, work_path, user, group, limits):
+        stdin_file = self.read_file(stdin_path)
+        stdout_file, stdout_writer = self.file_writer(stdout_path, stdout_append, max_bytes=stdout_max_bytes)
+        stderr_file, stderr_writer = self.file_writer(stderr_path, stderr_append, max_bytes=stderr_max_bytes)
+        writers = (stdout_writer, stderr_writer)
+        process, cgroup = self.spawn_command(command, stdin_file, stdout_file, stderr_file, environment, work_path, user, group, limits)
         result = Result()
-        monitoring_thread = threading.Thread(target=monitor_process, args=(process, limits, result))
-        monitoring_thread.start()
-        return (process, monitoring_thread, result, writers)
+        if cgroup is not None:
+            monitoring_thread = self.start_monitor(monitor_cgroup_process, process, cgroup, limits, result)
+        else:
+            monitoring_thread = self.start_monitor(monitor_process, process, limits, result)
+        gpu_sampler = self.start_gpu_sampler(limits, result, cgroup.kill if cgroup is not None else lambda: end_process(process))
+        return (process, monitoring_thread, result, writers, cgroup, gpu_sampler)
 
     def terminate_command(self, process):
-        process, monitoring_thread, monitor_result, writers = process
-        process.terminate()
-        for writer in writers:
-            writer.join()
+        process, monitoring_thread, monitor_result, writers, cgroup, gpu_sampler = process
+        if gpu_sampler is not None:
+            gpu_sampler.stop()
+        if cgroup is not None:
+            cgroup.kill()
+        else:
+            process.terminate()
+        self.join_writers(writers)
+        self.release_gpu_memory()
+
+    def release_cgroup(self, cgroup, monitor_result, limits):
+        if cgroup is None:
+            return 'monitor', 'monitor'
+        memory_source = 'cgroup'
+        try:
+            if cgroup.memory_limited:
+                monitor_result.update_memory(cgroup.memory_peak)
+            monitor_result.update_cpu_time(cgroup.cpu_time)
+        except OSError:
+            pass
+        if cgroup.oom_killed and limits.memory:
+            monitor_result.update_memory(limits.memory)
+            memory_source = 'oom'
+        self.cgroup_pool.release(cgroup)
+        return 'cgroup', memory_source
+
+    def update_result(self, result, monitor_result, sources, gpu_sampler, returncode, real_time, rusage):
+        source, memory_source = sources
+        result.update_memory(monitor_result.memory, source=memory_source)
+        result.update_real_time(monitor_result.real_time, source=source)
+        result.update_cpu_time(monitor_result.cpu_time, source=source)
+        result.update_gpu_time(monitor_result.gpu_time, source=gpu_sampler and 'gpu')
+        result.update_gpu_memory(monitor_result.gpu_memory, source=gpu_sampler and 'gpu')
+        result.set_monitor(monitor_result.monitor)
+        result.update_real_time(real_time, source='wait')
+        update_rusage(result, rusage)
+        result.set_returncode(returncode)
         self.release_gpu_memory()
 
     def wait_command(self, process, result):
-        process, monitoring_thread, monitor_result, writers = process
-        completed = kolejka.common.subprocess.wait(process)
+        process, monitoring_thread, monitor_result, writers, cgroup, gpu_sampler = process
+        returncode, real_time, rusage = wait_process(process)
+        if gpu_sampler is not None:
+            gpu_sampler.stop()
         monitoring_thread.join()
-        for writer in writers:
-            writer.join()
-        result.update_memory(monitor_result.memory)
-        result.update_real_time(monitor_result.real_time)
-        result.update_cpu_time(monitor_result.cpu_time)
-        result.update_gpu_memory(monitor_result.gpu_memory)
-        result.update_real_time(completed.time)
-        result.set_returncode(completed.returncode)
-        self.release_gpu_memory()
+        sources = self.release_cgroup(cgroup, monitor_result, result.limits)
+        self.join_writers(writers)
+        self.update_result(result, monitor_result, sources, gpu_sampler, returncode, real_time, rusage)
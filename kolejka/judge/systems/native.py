@@ -0,0 +1,109 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import os
+import re
+import shutil
+import stat
+
+
+__all__ = [ 'parse_mode', 'walk_tree', 'make_directory', 'install_file', 'change_owner', 'change_mode', ]
+def __dir__():
+    return __all__
+
+
+WHO_BITS = { 'u' : 0o4700, 'g' : 0o2070, 'o' : 0o1007, }
+PERMISSION_BITS = { 'r' : 0o444, 'w' : 0o222, 'x' : 0o111, 's' : 0o6000, 't' : 0o1000, }
+DIRECTORY_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+
+
+def parse_mode(mode, current=0, directory=False):
+    if mode is None or isinstance(mode, int):
+        return mode
+    mode = str(mode)
+    if mode.isdigit():
+        if directory and len(mode) < 5:
+            return int(mode, 8) | (current & 0o6000)
+        return int(mode, 8)
+    result = stat.S_IMODE(current)
+    for clause in mode.split(','):
+        match = re.fullmatch(r'([ugoa]*)((?:[-+=][rwxXst]*)+)', clause)
+        if match is None:
+            raise ValueError('Invalid mode \'{}\''.format(mode))
+        who = match.group(1).replace('a', '') or 'ugo'
+        mask = 0
+        for w in who:
+            mask |= WHO_BITS[w]
+        for op, permissions in re.findall(r'([-+=])([rwxXst]*)', match.group(2)):
+            bits = 0
+            for permission in permissions:
+                if permission == 'X':
+                    if directory or result & 0o111:
+                        bits |= 0o111
+                else:
+                    bits |= PERMISSION_BITS[permission]
+            bits &= mask
+            if op == '+':
+                result |= bits
+            elif op == '-':
+                result &= ~bits
+            else:
+                result = (result & ~(mask & ~0o6000 if directory else mask)) | bits
+    return result
+
+def walk_tree(path):
+    path = os.fspath(path)
+    yield None, path, os.stat(path, follow_symlinks=False)
+    stack = [ path ]
+    while stack:
+        directory = stack.pop()
+        try:
+            descriptor = os.open(directory, DIRECTORY_FLAGS)
+        except NotADirectoryError:
+            continue
+        try:
+            with os.scandir(descriptor) as scanner:
+                entries = [ (entry.name, entry.stat(follow_symlinks=False)) for entry in scanner ]
+            for name, status in entries:
+                yield descriptor, name, status
+                if stat.S_ISDIR(status.st_mode):
+                    stack.append(os.path.join(directory, name))
+        finally:
+            os.close(descriptor)
+
+def make_directory(path, uid=-1, gid=-1, mode=None):
+    os.makedirs(path, exist_ok=True)
+    os.chmod(path, parse_mode(0o755 if mode is None else mode, os.stat(path).st_mode, directory=True))
+    if uid != -1 or gid != -1:
+        os.chown(path, uid, gid)
+
+def install_file(source, target, uid=-1, gid=-1, mode=None, parents=False):
+    if parents:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.isdir(target) and not os.path.islink(target):
+        raise IsADirectoryError('Cannot overwrite directory \'{}\''.format(target))
+    if os.path.lexists(target):
+        os.unlink(target)
+    shutil.copyfile(source, target)
+    os.chmod(target, parse_mode(0o755 if mode is None else mode, os.stat(target).st_mode))
+    if uid != -1 or gid != -1:
+        os.chown(target, uid, gid)
+
+def change_owner(path, uid=-1, gid=-1, recursive=False):
+    if not recursive:
+        os.chown(path, uid, gid)
+        return
+    for descriptor, name, status in walk_tree(path):
+        if status.st_uid != uid and uid != -1 or status.st_gid != gid and gid != -1:
+            os.chown(name, uid, gid, dir_fd=descriptor, follow_symlinks=False)
+
+def change_mode(path, mode, file_type=None):
+    for descriptor, name, status in walk_tree(path):
+        directory = stat.S_ISDIR(status.st_mode)
+        if stat.S_ISLNK(status.st_mode):
+            continue
+        if file_type == 'd' and not directory or file_type == 'f' and not stat.S_ISREG(status.st_mode):
+            continue
+        new_mode = parse_mode(mode, status.st_mode, directory=directory)
+        if new_mode != stat.S_IMODE(status.st_mode):
+            os.chmod(name, new_mode, dir_fd=descriptor)
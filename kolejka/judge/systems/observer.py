@@ -1,8 +1,14 @@
 # vim:ts=4:sts=4:sw=4:expandtab
 
 
+import datetime
+import os
+import signal
+
+
 from kolejka.judge import config
-from kolejka.judge.systems.local import LocalSystem
+from kolejka.judge.result import Result
+from kolejka.judge.systems.local import LocalSystem, monitor_cgroup_process
 from kolejka.judge.parse import *
 
 
@@ -11,23 +17,76 @@ def __dir__():
     return __all__
 
 
+class SessionCgroup:
+    def __init__(self, pid):
+        from kolejka.judge.systems.cgroup import ProcessCgroup
+        self._pid = pid
+        self._own = ProcessCgroup(os.getpid()).path
+        self._cgroup = None
+
+    @property
+    def cgroup(self):
+        return self.get_cgroup()
+    def get_cgroup(self):
+        if self._cgroup is None:
+            from kolejka.judge.systems.cgroup import ProcessCgroup
+            try:
+                cgroup = ProcessCgroup(self._pid)
+            except ValueError as e:
+                raise OSError(str(e))
+            if cgroup.path != self._own:
+                self._cgroup = cgroup
+        return self._cgroup
+
+    @property
+    def memory(self):
+        cgroup = self.cgroup
+        return cgroup.memory if cgroup is not None else 0
+
+    @property
+    def cpu_time(self):
+        cgroup = self.cgroup
+        return cgroup.cpu_time if cgroup is not None else datetime.timedelta()
+
+    def kill(self):
+        cgroup = self.cgroup
+        if cgroup is not None:
+            cgroup.kill()
+        else:
+            try:
+                os.kill(self._pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+class ObservedCommand:
+    def __init__(self, process, writers, monitoring_thread=None, monitor_result=None):
+        self.process = process
+        self.writers = writers
+        self.monitoring_thread = monitoring_thread
+        self.monitor_result = monitor_result
+
+
 class ObserverSystem(LocalSystem):
+    def observed(self, limits):
+        return any([ limits.cores, limits.memory, limits.pids, limits.real_time, limits.cpu_time, limits.gpu_memory ])
 
     def start_command(self, command, stdin_path, stdout_path, stdout_append, stdout_max_bytes, stderr_path, stderr_append, stderr_max_bytes, environment, work_path, user, group, limits):
+        if not self.observed(limits):
+            return super().start_command(command, stdin_path, stdout_path, stdout_append, stdout_max_bytes, stderr_path, stderr_append, stderr_max_bytes, environment, work_path, user, group, limits)
         import kolejka.observer.runner
         from kolejka.common import KolejkaLimits
 
         change_user, change_group, change_groups = self.get_user_group_groups(user, group)
 
         resources = self.get_resources(limits)
-        limits=KolejkaLimits(
+        observer_limits = KolejkaLimits(
                     cpus=limits.cores,
                     memory=limits.memory,
                     swap=0,
                     pids=limits.pids,
                     time=limits.real_time,
                 )
-        #TODO: cpu_time !!!!!
 
         stdin_file = self.read_file(stdin_path)
         stdout_file, stdout_writer = self.file_writer(stdout_path, stdout_append, max_bytes=stdout_max_bytes)
@@ -35,7 +94,7 @@ class ObserverSystem(LocalSystem):
         writers = (stdout_writer, stderr_writer)
         process = kolejka.observer.runner.start(
             command,
-            limits=limits,
+            limits=observer_limits,
             user=change_user,
             group=change_group,
             groups=change_groups,
@@ -49,20 +108,33 @@ class ObserverSystem(LocalSystem):
         stdin_file.close()
         stdout_file.close()
         stderr_file.close()
-        return (process, writers)
+        observed = ObservedCommand(process, writers)
+        if limits.cpu_time:
+            try:
+                cgroup = SessionCgroup(process.pid)
+            except (OSError, ValueError):
+                cgroup = None
+            if cgroup is not None:
+                observed.monitor_result = Result()
+                observed.monitoring_thread = self.start_monitor(monitor_cgroup_process, process, cgroup, limits, observed.monitor_result)
+        return observed
 
     def terminate_command(self, process):
-        process, writers = process
-        process.terminate()
-        for writer in writers:
-            writer.join()
+        if not isinstance(process, ObservedCommand):
+            return super().terminate_command(process)
+        process.process.terminate()
+        self.join_writers(process.writers)
 
     def wait_command(self, process, result):
-        process, writers = process
+        if not isinstance(process, ObservedCommand):
+            return super().wait_command(process, result)
         import kolejka.observer.runner
-        completed = kolejka.observer.runner.wait(process)
-        for writer in writers:
-            writer.join()
+        completed = kolejka.observer.runner.wait(process.process)
+        if process.monitoring_thread is not None:
+            process.monitoring_thread.join()
+            result.update_cpu_time(process.monitor_result.cpu_time, source='cgroup')
+            result.set_monitor(process.monitor_result.monitor)
+        self.join_writers(process.writers)
         result.set_returncode(completed.returncode)
         result.update_memory(completed.stats.memory.max_usage)
         result.update_real_time(completed.stats.time)
@@ -0,0 +1,117 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import threading
+import time
+
+
+__all__ = [ 'SpawnedProcess', 'spawn_helpers', 'spawn_process', ]
+def __dir__():
+    return __all__
+
+
+RLIMIT_OPTIONS = dict([ (getattr(resource, 'RLIMIT_'+name.upper()), name) for name in [
+    'as', 'core', 'cpu', 'data', 'fsize', 'locks', 'memlock', 'msgqueue', 'nice', 'nofile', 'nproc', 'rss', 'rtprio', 'rttime', 'sigpending', 'stack',
+] if hasattr(resource, 'RLIMIT_'+name.upper()) ])
+
+
+_spawn_helpers = False
+_spawn_helpers_lock = threading.Lock()
+def spawn_helpers():
+    global _spawn_helpers
+    with _spawn_helpers_lock:
+        if _spawn_helpers is False:
+            helpers = dict([ (name, shutil.which(name, path='/usr/bin:/bin:/usr/sbin:/sbin')) for name in [ 'env', 'prlimit', 'setpriv', 'sh', ] ])
+            if None in helpers.values():
+                _spawn_helpers = None
+            else:
+                try:
+                    subprocess.run([ helpers['env'], '--chdir=/', 'true' ], check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    _spawn_helpers = helpers
+                except (OSError, subprocess.CalledProcessError):
+                    _spawn_helpers = None
+        return _spawn_helpers
+
+
+class SpawnedProcess:
+    def __init__(self, args, pid, start_time):
+        self.args = args
+        self.pid = pid
+        self.start_time = start_time
+        self.returncode = None
+        self.starter = self
+        self.process = self
+
+    def poll(self):
+        if self.returncode is None:
+            try:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+            except ChildProcessError:
+                return self.returncode
+            if pid:
+                self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = timeout is not None and time.perf_counter() + timeout
+        while self.poll() is None:
+            if deadline and time.perf_counter() > deadline:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            time.sleep(0.001)
+        return self.returncode
+
+    def communicate(self, input=None, timeout=None):
+        self.wait(timeout)
+        return None, None
+
+    def send_signal(self, signum):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+def rlimit_value(value):
+    return 'unlimited' if value == resource.RLIM_INFINITY else str(int(value))
+
+def spawn_process(args, stdin, stdout, stderr, env, cwd, user=None, group=None, groups=None, resources=None, cgroup=None):
+    helpers = spawn_helpers()
+    if helpers is None:
+        return None
+    if [ limit for limit in (resources or {}) if limit not in RLIMIT_OPTIONS ]:
+        return None
+    args = [ str(arg) for arg in args ]
+    chain = list()
+    if cgroup is not None:
+        chain += [ helpers['sh'], '-c', 'echo $$ > "$0" && exec "$@"', str(cgroup.path / 'cgroup.procs'), ]
+    chain += [ helpers['env'], '--chdir='+str(cwd), '--', ]
+    if resources:
+        chain += [ helpers['prlimit'], ] + [ '--{}={}:{}'.format(RLIMIT_OPTIONS[limit], rlimit_value(soft), rlimit_value(hard)) for limit, (soft, hard) in resources.items() ] + [ '--', ]
+    if user is not None or group is not None or groups is not None:
+        chain += [ helpers['setpriv'], ]
+        if group is not None:
+            chain += [ '--regid={}'.format(int(group)), ]
+        if groups is not None:
+            chain += [ '--groups={}'.format(','.join([ str(int(gid)) for gid in groups ])) if groups else '--clear-groups', ]
+        else:
+            chain += [ '--keep-groups', ]
+        if user is not None:
+            chain += [ '--reuid={}'.format(int(user)), ]
+        chain += [ '--', ]
+    elif not resources and '=' in args[0]:
+        return None
+    file_actions = [ (os.POSIX_SPAWN_DUP2, stream.fileno(), fd) for fd, stream in enumerate([ stdin, stdout, stderr ]) ]
+    pid = os.posix_spawn(chain[0], chain + args, env, file_actions=file_actions, setsid=True)
+    return SpawnedProcess(args, pid, time.perf_counter())
@@ -2,17 +2,46 @@
 
 
 from kolejka.judge import config
-from kolejka.judge.tasks.background import *
-from kolejka.judge.tasks.build import *
-from kolejka.judge.tasks.check import *
-from kolejka.judge.tasks.cuda import *
-from kolejka.judge.tasks.io import *
-from kolejka.judge.tasks.logs import *
-from kolejka.judge.tasks.prepare import *
-from kolejka.judge.tasks.postgres import *
-from kolejka.judge.tasks.rules import *
-from kolejka.judge.tasks.run import *
-from kolejka.judge.tasks.shared import *
-from kolejka.judge.tasks.system import *
-from kolejka.judge.tasks.tools import *
-from kolejka.judge.tasks.workspace import *
+from kolejka.judge.lazy import lazy_getattr
+
+
+_submodules = {
+    'background' : [ 'ClearBackgroundTask', ],
+    'build' : [
+        'BuildTask', 'SolutionBuildTask', 'ToolBuildTask', 'SolutionBuildMixin', 'ToolBuildMixin',
+        'BuildAutoTask', 'SolutionBuildAutoTask', 'ToolBuildAutoTask', 'BuildCMakeTask',
+        'SolutionBuildCMakeTask', 'ToolBuildCMakeTask', 'BuildMakeTask', 'SolutionBuildMakeTask',
+        'ToolBuildMakeTask', 'BuildCompilerTask', 'SolutionBuildCompilerTask',
+        'ToolBuildCompilerTask', 'BuildGCCTask', 'SolutionBuildGCCTask', 'ToolBuildGCCTask',
+        'BuildGXXTask', 'SolutionBuildGXXTask', 'ToolBuildGXXTask', 'BuildGHCTask',
+        'SolutionBuildGHCTask', 'ToolBuildGHCTask', 'BuildNVCCTask', 'SolutionBuildNVCCTask',
+        'ToolBuildNVCCTask', 'BuildRustTask', 'SolutionBuildRustTask', 'ToolBuildRustTask',
+        'BuildScriptTask', 'SolutionBuildScriptTask', 'ToolBuildScriptTask', 'BuildBashScriptTask',
+        'SolutionBuildBashScriptTask', 'ToolBuildBashScriptTask', 'BuildPython3ScriptTask',
+        'SolutionBuildPython3ScriptTask', 'ToolBuildPython3ScriptTask',
+        ],
+    'check' : [ 'AnswerHintDiffTask', 'AnswerHintTableDiffTask', ],
+    'cuda' : [ 'ExecutableCudaTask', 'SolutionExecutableCudaTask', 'SingleIOCudaTask', ],
+    'io' : [ 'SingleIOTask', 'MultipleIOTask', 'InteractiveIOTask', ],
+    'logs' : [ 'CollectLogsTask', 'CollectDebugTask', ],
+    'prepare' : [ 'PrepareTask', 'SolutionPrepareTask', 'ToolPrepareTask', 'ExecPrepareTask', 'WheelUnzipTask', ],
+    'postgres' : [
+        'PostgresPrepareTask', 'PostgresResetTask', 'BuildPostgresTask',
+        'SolutionBuildPostgresTask', 'ToolBuildPostgresTask', 'ToolPostgresTask',
+        'GeneratorPostgresTask', 'HinterPostgresTask', 'CheckerPostgresTask',
+        'SingleBuildIOPostgresTask', 'MultipleBuildIOPostgresTask',
+        ],
+    'rules' : [ 'RulesTask', 'SolutionSourceRulesTask', 'SolutionBuildRulesTask', ],
+    'run' : [
+        'ExecutableTask', 'SolutionExecutableTask', 'ToolExecutableTask', 'ProgramTask',
+        'SolutionProgramTask', 'ToolProgramTask',
+        ],
+    'shared' : [ 'SharedInstallBinaryTask', 'SharedInstallLibraryTask', ],
+    'system' : [ 'SystemPrepareTask', 'DirectoryAddTask', ],
+    'tools' : [ 'ToolTask', 'GeneratorTask', 'VerifierTask', 'HinterTask', 'CheckerTask', 'InteractorTask', ],
+    'workspace' : [ 'WorkspacePrepareTask', ],
+}
+__all__ = [ 'config', ] + [ name for names in _submodules.values() for name in names ]
+__getattr__ = lazy_getattr(__name__, _submodules, globals())
+def __dir__():
+    return __all__
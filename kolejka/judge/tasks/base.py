@@ -267,16 +267,20 @@ class TaskBase(AbstractTask):
             ]
         return conditions
 
-    def run_command(self, name, Command, system=None, **kwargs):
+    def create_command(self, name, Command, **kwargs):
         cmd_name = '%s_%s'%(self.name, name)
-        system = self.system
         command_kwargs = self.command_kwargs
         command_kwargs.update(kwargs)
-        cmd = Command(name=cmd_name, system=system, **command_kwargs)
+        cmd = Command(name=cmd_name, system=self.system, **command_kwargs)
         for requirement in self.command_prerequirements:
             cmd.add_prerequirement(requirement)
         for condition in self.command_postconditions:
             cmd.add_postcondition(*condition)
+        return cmd
+
+    def run_command(self, name, Command, system=None, **kwargs):
+        cmd = self.create_command(name, Command, **kwargs)
+        cmd_name = cmd.name
         result = self.system.run_command(cmd, name=cmd_name)
         self.set_result(None, name, result)
         self.set_command(name, cmd)
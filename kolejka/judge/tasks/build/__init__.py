@@ -2,9 +2,30 @@
 
 
 from kolejka.judge import config
-from kolejka.judge.tasks.build.base import *
-from kolejka.judge.tasks.build.auto import *
-from kolejka.judge.tasks.build.make import *
-from kolejka.judge.tasks.build.compile import *
-from kolejka.judge.tasks.build.script import *
-from kolejka.judge.tasks.build.build_python import *
+from kolejka.judge.lazy import lazy_getattr
+
+
+_submodules = {
+    'base' : [ 'BuildTask', 'SolutionBuildTask', 'ToolBuildTask', 'SolutionBuildMixin', 'ToolBuildMixin', ],
+    'auto' : [ 'BuildAutoTask', 'SolutionBuildAutoTask', 'ToolBuildAutoTask', ],
+    'make' : [
+        'BuildCMakeTask', 'SolutionBuildCMakeTask', 'ToolBuildCMakeTask', 'BuildMakeTask',
+        'SolutionBuildMakeTask', 'ToolBuildMakeTask',
+        ],
+    'compile' : [
+        'BuildCompilerTask', 'SolutionBuildCompilerTask', 'ToolBuildCompilerTask', 'BuildGCCTask',
+        'SolutionBuildGCCTask', 'ToolBuildGCCTask', 'BuildGXXTask', 'SolutionBuildGXXTask',
+        'ToolBuildGXXTask', 'BuildGHCTask', 'SolutionBuildGHCTask', 'ToolBuildGHCTask',
+        'BuildNVCCTask', 'SolutionBuildNVCCTask', 'ToolBuildNVCCTask', 'BuildRustTask',
+        'SolutionBuildRustTask', 'ToolBuildRustTask',
+        ],
+    'script' : [
+        'BuildScriptTask', 'SolutionBuildScriptTask', 'ToolBuildScriptTask', 'BuildBashScriptTask',
+        'SolutionBuildBashScriptTask', 'ToolBuildBashScriptTask',
+        ],
+    'build_python' : [ 'BuildPython3ScriptTask', 'SolutionBuildPython3ScriptTask', 'ToolBuildPython3ScriptTask', ],
+}
+__all__ = [ 'config', ] + [ name for names in _submodules.values() for name in names ]
+__getattr__ = lazy_getattr(__name__, _submodules, globals())
+def __dir__():
+    return __all__
@@ -9,7 +9,6 @@ from kolejka.judge.tasks.build.base import *
 from kolejka.judge.paths import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
 from kolejka.judge.tasks.base import TaskBase
 
 
@@ -57,6 +56,12 @@ class BuildAutoTask(BuildTask):
     def ok(self):
         return self.build_task is not None and self.build_task.ok()
 
+    def cacheable(self):
+        return self.build_task is not None and self.build_task.cacheable()
+
+    def get_cache_key(self):
+        return super().get_cache_key() + [ task.get_cache_key() for task in self.build_tasks ]
+
     def get_execution_command(self):
         task = self.build_task
         if task:
@@ -5,10 +5,12 @@ import shlex
 
 
 from kolejka.judge import config
+from kolejka.judge.cache import *
 from kolejka.judge.paths import *
+from kolejka.judge.result import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
+from kolejka.judge.commands import ChownDirCommand, ChmodTreeCommand
 from kolejka.judge.tasks.base import TaskBase
 
 
@@ -103,11 +105,66 @@ class BuildTask(TaskBase):
     def get_execution_command(self):
         return [ self.find_binary(self.build_directory) ]
 
+    def cacheable(self):
+        return True
+
+    def get_cache_key(self):
+        return [
+            self.__class__.__name__,
+            self.source_directory, self.build_directory, self.execution_script,
+            self.build_options, self.build_target,
+            self.user, self.group, self.user_name, self.group_name,
+            self.limits,
+        ]
+
+    @property
+    def cache_key(self):
+        cache = self.system.cache
+        if cache is None or not self.cacheable():
+            return None
+        return cache.key(hash_tree(self.resolve_path(self.source_directory)), self.get_cache_key())
+
+    def store_build(self, cache_key, status, results):
+        if not result_cacheable(results):
+            return
+        paths = [ self.resolve_path(self.build_directory) ]
+        relocated = []
+        if self.execution_script:
+            paths.append(self.resolve_path(self.execution_script))
+            relocated.append(self.resolve_path(self.execution_script))
+        paths += result_files(results, self.system.output_directory)
+        self.system.cache.store('build', cache_key, self.system.output_directory, paths, (status, results), relocated=relocated)
+
+    def restore_build(self, cache_key):
+        restored = self.system.cache.restore('build', cache_key, self.system.output_directory)
+        if restored is None:
+            return False
+        status, results = restored
+        for name, result in results:
+            self.set_result(None, name, result)
+        self.set_result(status)
+        if self.user or self.group:
+            self.run_command('restore_chown', ChownDirCommand, target=self.build_directory, recursive=True, user_name=self.user, group_name=self.group, user=None, group=None)
+        return True
+
+    def execute_cached(self, cache_key):
+        if self.restore_build(cache_key):
+            return self.result.status or self.execute_permissions()
+        status = self.execute_build()
+        results = [ (name, result) for name, result in self.result.items() if name != 'status' ]
+        status = status or self.execute_post_build()
+        self.store_build(cache_key, status, results)
+        return status
+
     def execute(self):
         status = None
         if self.ok():
-            status = status or self.execute_build()
-            status = status or self.execute_post_build()
+            cache_key = self.cache_key
+            if cache_key:
+                with self.system.cache.lock('build', cache_key):
+                    status = self.execute_cached(cache_key)
+            else:
+                status = self.execute_build() or self.execute_post_build()
         else:
             status = self.result_on_unknown
         self.set_result(status)
@@ -118,10 +175,13 @@ class BuildTask(TaskBase):
 
     def execute_post_build(self):
         self.write_execution_script()
+        return self.execute_permissions()
+
+    def execute_permissions(self):
         if self.user_name or self.group_name:
             self.run_command('chown', ChownDirCommand, target=self.build_directory, recursive=True, user_name=self.user_name, group_name=self.group_name)
-            self.run_command('chmod_d', ProgramCommand, program='find', program_arguments=[self.build_directory, '-type', 'd', '-exec', 'chmod', 'o-rwx,g-w+rx,u+rwx', '{}', '+'])
-            self.run_command('chmod_f', ProgramCommand, program='find', program_arguments=[self.build_directory, '-type', 'f', '-exec', 'chmod', 'o-rwx,g-w+r,u+rw', '{}', '+'])
+            self.run_command('chmod_d', ChmodTreeCommand, target=self.build_directory, mode='o-rwx,g-w+rx,u+rwx', file_type='d')
+            self.run_command('chmod_f', ChmodTreeCommand, target=self.build_directory, mode='o-rwx,g-w+r,u+rw', file_type='f')
 
 class SolutionBuildTask(SolutionBuildMixin, BuildTask):
     pass
@@ -6,9 +6,9 @@ from kolejka.judge.tasks.build.base import *
 from kolejka.judge.paths import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
+from kolejka.judge.commands import CreateVenvCommand, InstallPackageIntoVenv
 from kolejka.judge.tasks.base import TaskBase
-from kolejka.judge.tasks.build import *
+from kolejka.judge.tasks.build.script import *
 
 __all__ = [
         'BuildPython3ScriptTask',
@@ -45,6 +45,10 @@ class BuildPython3ScriptTask(BuildScriptTask):
             return self.packages
         return []
 
+    def cacheable(self):
+        # Virtual environments are bound to the absolute path they were created in.
+        return not self.get_wheel_files() and not self.get_packages_to_download()
+
     def get_execution_commands(self):
         base_commands = super().get_execution_commands()
         
@@ -6,7 +6,9 @@ from kolejka.judge.tasks.build.base import *
 from kolejka.judge.paths import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
+from kolejka.judge.commands import (
+        CompileCommand, GCCCommand, GXXCommand, GHCCommand, CargoNewCommand, CopySourceCommand, CargoBuildCommand, MoveCommand, AddOfflineDependency,
+        )
 from kolejka.judge.tasks.base import TaskBase
 
 
@@ -43,6 +45,9 @@ class BuildCompilerTask(BuildTask):
     def ok(self):
         return len(self.get_source_files()) > 0
 
+    def get_cache_key(self):
+        return super().get_cache_key() + [ self.compiler.__name__, self.source_globs, self.compiler_kwargs ]
+
     @property
     def compiler_kwargs(self):
         return self.get_compiler_kwargs()
@@ -194,13 +199,13 @@ class BuildRustTask(BuildCompilerTask):
             return {}
 
 class BuildNVCCTask(BuildGCCTask):
-    DEFAULT_COMPILER = NVCCCommand
     DEFAULT_SOURCE_GLOBS = [
         '*.[Cc][Uu]',
         ]
     @default_kwargs
-    def __init__(self, architecture=None, **kwargs):
-        super().__init__(**kwargs)
+    def __init__(self, architecture=None, compiler=None, **kwargs):
+        from kolejka.judge.commands import NVCCCommand
+        super().__init__(compiler=compiler or NVCCCommand, **kwargs)
         self.architecture = architecture
     def get_compiler_kwargs(self):
         kwargs = super().get_compiler_kwargs()
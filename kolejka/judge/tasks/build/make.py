@@ -6,7 +6,7 @@ from kolejka.judge.tasks.build.base import *
 from kolejka.judge.paths import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
+from kolejka.judge.commands import ProgramCommand, MakeCommand, CMakeCommand
 from kolejka.judge.tasks.base import TaskBase
 
 
@@ -6,7 +6,7 @@ from kolejka.judge.tasks.build.base import *
 from kolejka.judge.paths import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
+from kolejka.judge.commands import InstallCommand
 from kolejka.judge.tasks.base import TaskBase
 
 __all__ = [
@@ -40,6 +40,9 @@ class BuildScriptTask(BuildTask):
     def ok(self):
         return len(self.get_source_files()) > 0
 
+    def get_cache_key(self):
+        return super().get_cache_key() + [ self.interpreter, self.source_globs, self.main_filename ]
+
     def execute_build(self):
         files = self.get_source_files()
 
@@ -1,11 +1,15 @@
 # vim:ts=4:sts=4:sw=4:expandtab
 
 
+import time
+
+
 from kolejka.judge import config
 from kolejka.judge.paths import *
+from kolejka.judge.result import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
+from kolejka.judge.commands import ProgramCommand, DirectoryAddCommand
 from kolejka.judge.tasks.base import *
 from kolejka.judge.tasks.check import *
 from kolejka.judge.tasks.prepare import *
@@ -13,7 +17,7 @@ from kolejka.judge.tasks.run import *
 from kolejka.judge.tasks.tools import *
 
 
-__all__ = [ 'SingleIOTask', 'MultipleIOTask' ]
+__all__ = [ 'SingleIOTask', 'MultipleIOTask', 'InteractiveIOTask' ]
 def __dir__():
     return __all__
 
@@ -137,9 +141,12 @@ class SingleIOTask(IOTask):
 
 
 class MultipleIOTask(IOTask):
+    DEFAULT_POLICY=config.POLICY_ALL
     @default_kwargs
-    def __init__(self, **kwargs):
+    def __init__(self, policy, history=None, **kwargs):
         super().__init__(**kwargs)
+        self.policy = policy
+        self.history = history
 
     def alter_input_path(self, sub, input_path):
         return get_output_path(re.sub(sub[0], sub[1], str(input_path)))
@@ -243,20 +250,161 @@ class MultipleIOTask(IOTask):
                     singles.append(self.create_single(path))
             singles = sorted(singles)
 
+            samples = list()
+            if self.policy == config.POLICY_SAMPLE_THEN_ALL:
+                samples = [ single for single in singles if re.match(config.MULTITEST_SAMPLE_NAME, single[0]) ]
+            others = [ single for single in singles if single not in samples ]
+            step_results = dict()
+            for phase in [ samples, others ]:
+                if self.history is not None:
+                    order = self.history.order([ step_name for step_name, step, step_score in phase ])
+                    phase = sorted(phase, key=lambda single: order.index(single[0]))
+                skip_phase = bool(status) and self.policy == config.POLICY_SAMPLE_THEN_ALL
+                for step_name, step, step_score in phase:
+                    if skip_phase or (status and self.policy == config.POLICY_FIRST_FAILURE):
+                        step_result = ResultDict()
+                        step_result.set_status(config.STATUS_SKIPPED)
+                    else:
+                        start = time.monotonic()
+                        step_result = step.execute()
+                        if self.history is not None:
+                            self.history.record(step_name, step_result.status, time.monotonic() - start)
+                        if step_result.status and not status:
+                            status = step_result.status
+                    step_results[step_name] = step_result
+            if self.history is not None:
+                self.history.save()
+
+            status = None
             score = 0.0
             max_score = 0.0
             for step_name, step, step_score in singles:
-                step_result = step.execute()
+                step_result = step_results[step_name]
+                if step_result.status not in [ None, config.STATUS_SKIPPED ] and not status:
+                    status = step_result.status
                 self.set_result(name='test_'+step_name, value=step_result)
                 if not step_result.status:
                     step_result.set_status('OK')
                     score += step_score
-                else:
-                    if not status:
-                        status = step_result.status
                 max_score += step_score
 
             self.set_result(name='score', value=score)
             self.set_result(name='max_score', value=max_score)
             self.set_result(status)
         return self.result
+
+
+class InteractiveIOTask(IOTask):
+    DEFAULT_INTERACTION_PATH=config.TEST_INTERACTION
+    DEFAULT_SOLUTION_PIPE=config.TEST_SOLUTION_PIPE
+    DEFAULT_INTERACTOR_PIPE=config.TEST_INTERACTOR_PIPE
+    DEFAULT_TRANSCRIPT=False
+    @default_kwargs
+    def __init__(self, interactor_source, interaction_path, solution_pipe, interactor_pipe, transcript, **kwargs):
+        super().__init__(**kwargs)
+        self.interactor_source = interactor_source
+        self.interaction_path = interaction_path
+        self.solution_pipe = solution_pipe
+        self.interactor_pipe = interactor_pipe
+        self.transcript = bool(transcript)
+
+        self.steps = []
+
+        input_path = self.input_path
+        if self.generator_source:
+            generator = GeneratorTask(source=self.generator_source, output_path=self.generator_output_path, override=self.tool_override, input_path=input_path, limit_real_time=self.tool_time, c_standard=self.tool_c_standard, cpp_standard=self.tool_cpp_standard, gcc_arguments=self.tool_gcc_arguments, libraries=self.tool_libraries)
+            input_path = generator.output_path
+            self.steps.append(('generator', generator))
+        if self.verifier_source:
+            verifier = VerifierTask(source=self.verifier_source, override=self.tool_override, input_path=input_path, limit_real_time=self.tool_time, c_standard=self.tool_c_standard, cpp_standard=self.tool_cpp_standard, gcc_arguments=self.tool_gcc_arguments, libraries=self.tool_libraries)
+            self.steps.append(('verifier', verifier))
+
+        self.pipes = [ self.solution_pipe, self.interactor_pipe ]
+        self.tees = []
+        solution_output = self.solution_pipe
+        interactor_output = self.interactor_pipe
+        if self.transcript:
+            solution_output = self.solution_pipe + '_tee'
+            interactor_output = self.interactor_pipe + '_tee'
+            self.pipes += [ solution_output, interactor_output ]
+            self.tees = [
+                ('solution_tee', solution_output, self.solution_pipe, self.answer_path),
+                ('interactor_tee', interactor_output, self.interactor_pipe, self.interaction_path),
+            ]
+
+        interactor_time = self.tool_time
+        if interactor_time and self.limit_real_time and interactor_time < self.limit_real_time:
+            interactor_time = self.limit_real_time
+        self.interactor = InteractorTask(source=self.interactor_source, override=self.tool_override, test_input_path=input_path or InputPath('/dev/null'), test_hint_path=self.hint_path or InputPath('/dev/null'), input_path=self.solution_pipe, output_path=interactor_output, limit_real_time=interactor_time, c_standard=self.tool_c_standard, cpp_standard=self.tool_cpp_standard, gcc_arguments=self.tool_gcc_arguments, libraries=self.tool_libraries)
+        executor_kwargs = dict()
+        if self.result_on_error:
+            executor_kwargs['result_on_error'] = self.result_on_error
+        if self.result_on_time:
+            executor_kwargs['result_on_time'] = self.result_on_time
+        if self.result_on_memory:
+            executor_kwargs['result_on_memory'] = self.result_on_memory
+        self.executor = self.solution_task_factory(executable=self.executable, executable_arguments=self.executable_arguments, input_path=self.interactor_pipe, answer_path=solution_output, limit_cores=self.limit_cores, limit_cpu_time=self.limit_cpu_time, limit_real_time=self.limit_real_time, limit_memory=self.limit_memory, limit_stack=self.limit_stack, limit_gpu_memory=self.limit_gpu_memory, stderr_max_bytes=self.limit_error_size, background=True, **executor_kwargs)
+
+    def solution_task_factory(self, **kwargs):
+        return SolutionExecutableTask(
+            **kwargs
+        )
+
+    def set_system(self, system):
+        super().set_system(system)
+        for name, step in self.steps:
+            step.set_system(system)
+        self.interactor.set_system(system)
+        self.executor.set_system(system)
+
+    def set_name(self, name):
+        super().set_name(name)
+        for step_name, step in self.steps:
+            step.set_name(name+'_'+step_name)
+        self.interactor.set_name(name+'_interactor')
+        self.executor.set_name(name+'_executor')
+
+    def interact(self):
+        for pipe in self.pipes:
+            self.system.add_pipe(get_output_path(pipe))
+        commands = []
+        try:
+            for name, source, target, copy in self.tees:
+                self.run_command(name, ProgramCommand, program='tee', program_arguments=[get_output_path(copy)], stdin=source, stdout=target, background=True)
+                commands.append(self.commands[name])
+            interactor_result = self.interactor.execute()
+            if interactor_result.status:
+                self.set_result(name='interactor', value=interactor_result)
+                return interactor_result.status
+            commands.append(self.interactor.execute_task.commands['run'])
+            self.executor.execute()
+            commands.append(self.executor.commands['run'])
+        finally:
+            for pipe in self.pipes:
+                self.system.release_pipe(get_output_path(pipe))
+            for command in commands:
+                self.system.wait_background(command.name)
+
+        interactor_status = self.interactor.execute_task.result['run'].status
+        self.interactor.execute_task.set_result(interactor_status)
+        self.interactor.set_result(interactor_status)
+        executor_status = self.executor.result['run'].status
+        self.executor.set_result(executor_status)
+        self.set_result(name='interactor', value=self.interactor.result)
+        self.set_result(name='executor', value=self.executor.result)
+        if executor_status and executor_status != self.executor.result_on_error:
+            return executor_status
+        return interactor_status or executor_status
+
+    def execute(self):
+        status = None
+        for name, step in self.steps:
+            step_result = step.execute()
+            self.set_result(name=name, value=step_result)
+            if step_result.status:
+                status = step_result.status
+                break
+        if not status:
+            status = self.interact()
+        self.set_result(status)
+        return self.result
@@ -8,7 +8,9 @@ from kolejka.judge import config
 from kolejka.judge.paths import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
+from kolejka.judge.commands import (
+        ProgramCommand, Un7zCommand, UnzipCommand, UnrarCommand, UntarCommand, InstallCommand, ChownDirCommand, ChmodTreeCommand,
+        )
 from kolejka.judge.tasks.base import *
 
 
@@ -51,8 +53,8 @@ class PrepareTask(TaskBase):
             status = status or self.prepare_source('override', self.override, None, True)
         if self.user_name or self.group_name:
             status = status or self.run_command('chown', ChownDirCommand, target=self.target, recursive=True, user_name=self.user_name, group_name=self.group_name)
-            status = status or self.run_command('chmod_d', ProgramCommand, program='find', program_arguments=[self.target, '-type', 'd', '-exec', 'chmod', 'o-rwx,g-w+rx,u+rwx', '{}', '+'])
-            status = status or self.run_command('chmod_f', ProgramCommand, program='find', program_arguments=[self.target, '-type', 'f', '-exec', 'chmod', 'o-rwx,g-w+r,u+rw', '{}', '+'])
+            status = status or self.run_command('chmod_d', ChmodTreeCommand, target=self.target, mode='o-rwx,g-w+rx,u+rwx', file_type='d')
+            status = status or self.run_command('chmod_f', ChmodTreeCommand, target=self.target, mode='o-rwx,g-w+r,u+rw', file_type='f')
 #            status = status or self.run_command('chmod', ProgramCommand, program='chmod', program_arguments=['o-rwx,g-w+rx,u+rwx', '-R', self.target], safe=True)
         self.set_result(status)
         return self.result
@@ -5,7 +5,7 @@ from kolejka.judge import config
 from kolejka.judge.paths import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
+from kolejka.judge.commands import ExecutableCommand, ProgramCommand
 from kolejka.judge.tasks.base import TaskBase
 
 
@@ -17,7 +17,7 @@ def __dir__():
 
 class RunTask(TaskBase):
     @default_kwargs
-    def __init__(self, stdin=None, stdout=None, stdout_append=None, stdout_max_bytes=None, stderr=None, stderr_append=None, stderr_max_bytes=None, **kwargs):
+    def __init__(self, stdin=None, stdout=None, stdout_append=None, stdout_max_bytes=None, stderr=None, stderr_append=None, stderr_max_bytes=None, background=None, **kwargs):
         super().__init__(**kwargs)
         self._stdin = stdin
         self._stdout = stdout
@@ -26,6 +26,7 @@ class RunTask(TaskBase):
         self._stderr = stderr
         self._stderr_append = stderr_append
         self._stderr_max_bytes = stderr_max_bytes
+        self._background = background
 
     @property
     def stdin(self):
@@ -69,6 +70,12 @@ class RunTask(TaskBase):
     def get_stderr_max_bytes(self):
         return self._stderr_max_bytes
 
+    @property
+    def background(self):
+        return self.get_background()
+    def get_background(self):
+        return self._background
+
     def get_command_kwargs(self):
         kwargs = super().get_command_kwargs()
         if self.stdin is not None:
@@ -85,6 +92,8 @@ class RunTask(TaskBase):
             kwargs['stderr_append'] = self.stderr_append
         if self.stderr_max_bytes is not None:
             kwargs['stderr_max_bytes'] = self.stderr_max_bytes
+        if self.background is not None:
+            kwargs['background'] = self.background
         return kwargs
 
 
@@ -5,7 +5,7 @@ from kolejka.judge import config
 from kolejka.judge.paths import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
+from kolejka.judge.commands import DirectoryAddCommand, InstallCommand
 from kolejka.judge.tasks.base import *
 
 
@@ -1,11 +1,16 @@
 # vim:ts=4:sts=4:sw=4:expandtab
 
 
+import pathlib
+
+
 from kolejka.judge import config
 from kolejka.judge.paths import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
-from kolejka.judge.commands import *
+from kolejka.judge.commands import (
+        GroupAddCommand, GroupDelCommand, UserAddCommand, UserDelCommand, UserModCommand, BatchCommand, DirectoryAddCommand,
+        )
 from kolejka.judge.tasks.base import *
 
 
@@ -22,6 +27,7 @@ class SystemPrepareTask(TaskBase):
         self.groups = dict()
         self.users = dict()
         self.directories = dict()
+        self.skipped = list()
         for group in (groups or []):
             self.add_group(group)
         for user in (users or []):
@@ -71,31 +77,102 @@ class SystemPrepareTask(TaskBase):
                 self.add_group(kwargs['group_name'])
             self.directories[path] = kwargs
 
+    def get_record_result(self):
+        return super().get_record_result() or bool(self.skipped)
+
+    def group_provisioned(self, group):
+        import grp
+        try:
+            entry = grp.getgrnam(group['group_name'])
+        except KeyError:
+            return False
+        return group.get('gid') is None or entry.gr_gid == int(group['gid'])
+
+    def user_provisioned(self, user):
+        import grp
+        import pwd
+        name = user['user_name']
+        try:
+            entry = pwd.getpwnam(name)
+            if entry.pw_gid != grp.getgrnam(name).gr_gid:
+                return False
+            if [ group for group in user['groups'] if name not in grp.getgrnam(group).gr_mem ]:
+                return False
+        except KeyError:
+            return False
+        if user.get('uid') is not None and entry.pw_uid != int(user['uid']):
+            return False
+        if user.get('shell') and entry.pw_shell != str(user['shell']):
+            return False
+        if entry.pw_gecos != (user.get('comment') or name):
+            return False
+        return True
+
+    def user_home(self, user):
+        home = user.get('home', None)
+        if home:
+            return str(self.resolve_path(get_output_path(home)))
+
     def execute(self):
-        for name in self.users.keys():
-            if not name in self.system.users:
-                self.run_command('usr_del_'+name, UserDelCommand, user_name=name)
-        for name in self.groups.keys():
-            if not name in self.system.groups:
-                self.run_command('grp_del_'+name, GroupDelCommand, group_name=name)
+        import grp
+        import pwd
+        self.skipped = list()
+        superuser = self.system.superuser
+        user_dels = list()
+        group_dels = list()
+        group_adds = list()
+        user_adds = list()
+        user_mods = list()
+        created_groups = set()
         for group in self.groups.values():
             name = group['group_name']
-            if not name in self.system.groups:
-                cmd_name = 'grp_'+name
-                self.run_command(cmd_name, GroupAddCommand, **group)
-                self.system.add_group(name)
+            if name in self.system.groups:
+                continue
+            if superuser and self.group_provisioned(group):
+                self.skipped.append('grp_'+name)
+                continue
+            created_groups.add(name)
+            try:
+                grp.getgrnam(name)
+                group_dels.append(self.create_command('grp_del_'+name, GroupDelCommand, group_name=name))
+            except KeyError:
+                pass
+            group_adds.append(self.create_command('grp_'+name, GroupAddCommand, **group))
+        for user in self.users.values():
+            name = user['user_name']
+            if name in self.system.users:
+                continue
+            if superuser and not created_groups.intersection(user['groups']) and self.user_provisioned(user):
+                home = self.user_home(user)
+                if home and pwd.getpwnam(name).pw_dir != home:
+                    user_mods.append(self.create_command('usr_mod_'+name, UserModCommand, user_name=name, home=user['home']))
+                else:
+                    self.skipped.append('usr_'+name)
+                continue
+            try:
+                pwd.getpwnam(name)
+                user_dels.append(self.create_command('usr_del_'+name, UserDelCommand, user_name=name))
+            except KeyError:
+                pass
+            user_adds.append(self.create_command('usr_'+name, UserAddCommand, **user))
+        commands = user_dels + group_dels + group_adds + user_adds + user_mods
+        if commands:
+            self.run_command('accounts', BatchCommand, commands=commands)
+        for group in self.groups.values():
+            self.system.add_group(group['group_name'])
         for user in self.users.values():
             name = user['user_name']
-            if not name in self.system.users:
-                cmd_name = 'usr_'+name
-                home = user.get('home', None)
-                if home:
-                    home = str(self.resolve_path(get_output_path(home)))
-                self.run_command(cmd_name, UserAddCommand, **user)
+            home = self.user_home(user)
+            if name not in self.system.users:
                 self.system.add_user(name, home)
+            if home and not pathlib.Path(home).is_dir():
+                cmd_name = 'home_'+name
+                self.run_command(cmd_name, DirectoryAddCommand, path=user['home'], user_name=name, group_name=name, mode=0o755)
         for directory in self.directories.values():
             cmd_name = 'dir_'+str(directory['path']).replace('/', '_')
             self.run_command(cmd_name, DirectoryAddCommand, **directory)
+        for name in self.skipped:
+            self.set_result(name=name, value='skipped')
         return self.result
 
 
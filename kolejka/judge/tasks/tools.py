@@ -3,7 +3,8 @@ from copy import deepcopy
 
 
 from kolejka.judge import config
-from kolejka.judge.commands import *
+from kolejka.judge.cache import *
+from kolejka.judge.commands import DirectoryAddCommand, ChownDirCommand
 from kolejka.judge.paths import *
 from kolejka.judge.typing import *
 from kolejka.judge.validators import *
@@ -15,7 +16,7 @@ from kolejka.judge.tasks.system import *
 from kolejka.judge.systems.base import SystemBase
 
 
-__all__ = [ 'ToolTask', 'GeneratorTask', 'VerifierTask', 'HinterTask', 'CheckerTask' ]
+__all__ = [ 'ToolTask', 'GeneratorTask', 'VerifierTask', 'HinterTask', 'CheckerTask', 'InteractorTask' ]
 def __dir__():
     return __all__
 
@@ -207,20 +208,87 @@ class ToolTask(TaskBase):
         self.build_task.set_name(name+'_build')
         self.execute_task.set_name(name+'_exec')
 
+    def cacheable(self):
+        return bool(self.source)
+
+    def get_cache_key(self):
+        key = [
+            self.__class__.__name__, self.tool_name,
+            self.prepare_task.basename, self.resolve_path(self.prepare_task.source).name,
+            self.prepare_task.override and self.resolve_path(self.prepare_task.override).name,
+            self.prepare_task.target, self.prepare_task.allow_extract,
+            self.user_name, self.group_name,
+            self.c_standard, self.cpp_standard, self.gcc_arguments, self.libraries, self.cuda_architecture,
+        ]
+        if isinstance(self.build_task, BuildTask):
+            key += self.build_task.get_cache_key()
+        return key
+
+    @property
+    def cache_key(self):
+        cache = self.system.cache
+        if cache is None or not self.cacheable():
+            return None
+        source_hash = hash_tree(self.resolve_path(self.prepare_task.source))
+        override_hash = self.prepare_task.override and hash_tree(self.resolve_path(self.prepare_task.override))
+        return cache.key(source_hash, override_hash, self.get_cache_key())
+
+    def store_tool(self, cache_key, status):
+        if isinstance(self.build_task, BuildTask) and not self.build_task.cacheable():
+            return
+        results = [ (name, result) for name, result in self.result.items() if name in [ 'prepare', 'build' ] ]
+        if not result_cacheable(results):
+            return
+        paths = [ self.resolve_path(self.build_task.build_directory) ]
+        relocated = []
+        if self.build_task.execution_script:
+            paths.append(self.resolve_path(self.build_task.execution_script))
+            relocated.append(self.resolve_path(self.build_task.execution_script))
+        paths += result_files(results, self.system.output_directory)
+        self.system.cache.store('tools', cache_key, self.system.output_directory, paths, (status, results), relocated=relocated)
+
+    def restore_tool(self, cache_key):
+        restored = self.system.cache.restore('tools', cache_key, self.system.output_directory)
+        if restored is None:
+            return False
+        status, results = restored
+        for name, result in results:
+            self.set_result(None, name, result)
+        self.set_result(status)
+        self.run_command('restore_chown', ChownDirCommand, target=self.build_task.build_directory, recursive=True, user_name=self.user_name, group_name=self.group_name, user=None, group=None)
+        return True
+
+    def execute_build(self):
+        status = None
+        self.run_command('dir_source', DirectoryAddCommand, path=self.prepare_task.target, user_name=self.user_name, group_name=self.group_name, mode=0o2750)
+        if not status:
+            result = self.prepare_task.execute()
+            status = result and result.status
+            self.set_result(status, 'prepare', result)
+        if not status:
+            result = self.build_task.execute()
+            status = result and result.status
+            self.set_result(status, 'build', result)
+        return status
+
+    def execute_cached(self, cache_key):
+        if self.restore_tool(cache_key):
+            return self.result.status
+        status = self.execute_build()
+        self.store_tool(cache_key, status)
+        return status
+
     def execute(self):
         status = None
         tool_exists = len(list(self.find_files(self.build_task.execution_script))) > 0
         if not tool_exists:
-            self.run_command('dir_source', DirectoryAddCommand, path=self.prepare_task.target, user_name=self.user_name, group_name=self.group_name, mode=0o2750)
             self.run_command('dir_build', DirectoryAddCommand, path=self.build_task.build_directory, user_name=self.user_name, group_name=self.group_name, mode=0o2750)
-            if not status:
-                result = self.prepare_task.execute()
-                status = result and result.status
-                self.set_result(status, 'prepare', result)
-            if not status:
-                result = self.build_task.execute()
-                status = result and result.status
-                self.set_result(status, 'build', result)
+            cache_key = self.cache_key
+            if cache_key:
+                with self.system.cache.lock('tools', cache_key):
+                    status = self.execute_cached(cache_key)
+            else:
+                status = self.execute_build()
         if not status:
             result = self.execute_task.execute()
             status = result and result.status
@@ -269,3 +337,24 @@ class CheckerTask(ToolTask):
             FileExistsPrerequirement(self.hint_path),
             FileExistsPrerequirement(self.answer_path),
         ]
+
+
+class InteractorTask(ToolTask):
+    DEFAULT_TOOL_NAME='interactor'
+    DEFAULT_RESULT_ON_ERROR='ANS'
+    @default_kwargs
+    def __init__(self, test_input_path, test_hint_path, **kwargs):
+        self.test_input_path = test_input_path and get_output_path(test_input_path)
+        self.test_hint_path = test_hint_path and get_output_path(test_hint_path)
+        super().__init__(arguments=[self.test_input_path, self.test_hint_path], **kwargs)
+
+    def get_execute_kwargs(self):
+        kwargs = super().get_execute_kwargs()
+        kwargs['background'] = True
+        return kwargs
+
+    def get_prerequirements(self):
+        return super().get_prerequirements() + [
+            FileExistsPrerequirement(self.test_input_path),
+            FileExistsPrerequirement(self.test_hint_path),
+        ]
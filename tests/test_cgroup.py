@@ -0,0 +1,131 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import datetime
+import errno
+import os
+import pathlib
+
+import pytest
+
+from kolejka.judge import config
+from kolejka.judge.systems import cgroup
+
+
+@pytest.fixture
+def delegated(tmp_path, monkeypatch):
+    mount = tmp_path / 'cgroup'
+    service = mount / 'system.slice' / 'judge.service'
+    service.mkdir(parents=True)
+    (service / 'cgroup.controllers').write_text('cpu memory pids\n')
+    (service / 'cgroup.subtree_control').write_text('\n')
+    (service / 'cgroup.procs').write_text('{}\n'.format(os.getpid()))
+    write_text = pathlib.Path.write_text
+    def kernel_write_text(path, data, *args, **kwargs):
+        if path.name == 'cgroup.subtree_control' and (path.parent / 'cgroup.procs').read_text().split():
+            raise OSError(errno.EBUSY, 'Device or resource busy')
+        if path.name == 'cgroup.procs' and path.parent != service:
+            procs = (service / 'cgroup.procs').read_text().split()
+            procs.remove(data)
+            write_text(service / 'cgroup.procs', ''.join([ pid+'\n' for pid in procs ]))
+            previous = path.read_text() if path.exists() else ''
+            return write_text(path, previous + data + '\n')
+        return write_text(path, data, *args, **kwargs)
+    monkeypatch.setattr(pathlib.Path, 'write_text', kernel_write_text)
+    monkeypatch.setattr(cgroup, 'cgroup_mount', lambda: mount)
+    monkeypatch.setattr(cgroup, 'cgroup_own', lambda: '/system.slice/judge.service')
+    monkeypatch.setattr(cgroup, 'cgroup_delegated', lambda root: root == service)
+    monkeypatch.setattr(cgroup, '_cgroup_roots', dict())
+    return service
+
+def test_delegated_cgroup_moves_judge_to_leaf(delegated):
+    assert cgroup.cgroup_detect() == delegated
+    assert (delegated / 'cgroup.procs').read_text().split() == []
+    assert (delegated / config.CGROUP_LEAF / 'cgroup.procs').read_text().split() == [ str(os.getpid()) ]
+    assert (delegated / 'cgroup.subtree_control').read_text() == ' '.join([ '+'+controller for controller in config.CGROUP_CONTROLLERS ])
+
+def test_cgroup_with_foreign_processes_is_left_alone(delegated, caplog):
+    (delegated / 'cgroup.procs').write_text('1\n{}\n'.format(os.getpid()))
+    assert cgroup.cgroup_root() is None
+    assert 'holds processes other than the judge' in caplog.text
+    assert not (delegated / config.CGROUP_LEAF).exists()
+    assert (delegated / 'cgroup.procs').read_text().split() == [ '1', str(os.getpid()) ]
+
+def test_undelegated_cgroup_needs_opt_in(delegated, monkeypatch, caplog):
+    monkeypatch.setattr(cgroup, 'cgroup_delegated', lambda root: False)
+    assert cgroup.cgroup_root() is None
+    assert 'is not delegated to the judge' in caplog.text
+    assert cgroup.cgroup_root(delegated=True) == delegated
+
+def test_delegate_attribute_marks_cgroup_delegated(tmp_path):
+    try:
+        os.setxattr(tmp_path, 'user.delegate', b'1')
+    except OSError:
+        pytest.skip('Extended attributes are not supported')
+    assert cgroup.cgroup_delegated(tmp_path)
+
+def test_undelegated_cgroup_warns(delegated, monkeypatch, caplog):
+    (delegated / 'cgroup.controllers').write_text('cpu\n')
+    assert cgroup.cgroup_root() is None
+    assert 'does not delegate controllers' in caplog.text
+
+def test_wait_empty_reads_populated(tmp_path):
+    group = cgroup.Cgroup(tmp_path)
+    (group.path / 'cgroup.events').write_text('populated 0\nfrozen 0\n')
+    assert group.wait_empty()
+    (group.path / 'cgroup.events').write_text('populated 1\nfrozen 0\n')
+    assert not group.wait_empty(0.05)
+
+def test_session_cgroup_resolves_after_attach(monkeypatch):
+    from kolejka.judge.systems.observer import SessionCgroup
+    paths = { os.getpid() : '/judge', 4242 : '/judge' }
+    class FakeProcessCgroup:
+        def __init__(self, pid):
+            self.path = paths[pid]
+            self.cpu_time = datetime.timedelta(seconds=2)
+            self.memory = 1024
+    monkeypatch.setattr(cgroup, 'ProcessCgroup', FakeProcessCgroup)
+    session = SessionCgroup(4242)
+    assert session.cgroup is None
+    assert session.cpu_time == datetime.timedelta()
+    assert session.memory == 0
+    paths[4242] = '/observer/session'
+    assert session.cgroup.path == '/observer/session'
+    assert session.cpu_time == datetime.timedelta(seconds=2)
+    assert session.memory == 1024
+
+@pytest.fixture
+def pooled(tmp_path, monkeypatch):
+    group = cgroup.Cgroup(tmp_path)
+    (group.path / 'cgroup.events').write_text('populated 0\n')
+    (group.path / 'cpu.stat').write_text('usage_usec 1000\n')
+    (group.path / 'memory.stat').write_text('anon 4096\nfile 1048576\n')
+    (group.path / 'memory.current').write_text('1052672\n')
+    write_text = pathlib.Path.write_text
+    def kernel_write_text(path, data, *args, **kwargs):
+        if path.name == 'memory.reclaim':
+            current = int((path.parent / 'memory.current').read_text())
+            write_text(path.parent / 'memory.current', str(max(current - int(data), group.unreclaimable)))
+            return
+        return write_text(path, data, *args, **kwargs)
+    group.unreclaimable = 0
+    monkeypatch.setattr(pathlib.Path, 'write_text', kernel_write_text)
+    return group
+
+def test_cgroup_memory_is_anonymous(pooled):
+    assert pooled.memory == 4096
+
+def test_pool_reclaims_released_cgroup(pooled, tmp_path):
+    pool = cgroup.CgroupPool(tmp_path)
+    pool.release(pooled)
+    assert (pooled.path / 'memory.current').read_text() == '0'
+    assert pool.acquire() is pooled
+
+def test_pool_drops_cgroup_holding_memory(pooled, tmp_path, monkeypatch):
+    pooled.unreclaimable = 8192
+    removed = list()
+    monkeypatch.setattr(pooled, 'remove', lambda: removed.append(True))
+    pool = cgroup.CgroupPool(tmp_path)
+    pool.release(pooled)
+    assert removed == [ True ]
+    assert pool.acquire() is not pooled
@@ -0,0 +1,155 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import datetime
+import os
+import sys
+import time
+import types
+
+import pytest
+
+from kolejka.judge.limits import Limits
+from kolejka.judge.result import Result
+from kolejka.judge.systems import gpu
+from kolejka.judge.validators import MemoryLimitPostcondition, TimeLimitPostcondition
+
+
+GiB = 1024**3
+
+
+class FakeNVML(types.ModuleType):
+    def __init__(self, devices):
+        super().__init__('pynvml')
+        self.devices = devices
+        self.handles = 0
+
+    def nvmlInit(self):
+        pass
+
+    def nvmlDeviceGetCount(self):
+        return len(self.devices)
+
+    def nvmlDeviceGetHandleByIndex(self, index):
+        self.handles += 1
+        return self.devices[index]
+
+    def nvmlDeviceGetMemoryInfo(self, handle):
+        return types.SimpleNamespace(used=handle['used'], total=handle['total'])
+
+    def nvmlDeviceGetUtilizationRates(self, handle):
+        return types.SimpleNamespace(gpu=handle['utilization'], memory=0)
+
+
+@pytest.fixture
+def nvml(monkeypatch):
+    module = FakeNVML([ dict(used=GiB, total=8*GiB, utilization=0), dict(used=2*GiB, total=8*GiB, utilization=0) ])
+    monkeypatch.setitem(sys.modules, 'pynvml', module)
+    return module
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [ 100.0 ]
+    monkeypatch.setattr(time, 'perf_counter', lambda: now[0])
+    return now
+
+def sampler(backend, limits, result=None):
+    calls = list()
+    return gpu.GPUSampler(backend, limits, result or Result(), lambda: calls.append(True)), calls
+
+
+def test_nvml_backend_caches_device_handles(nvml):
+    backend = gpu.NVMLBackend()
+    assert backend.memory() == { 0 : (GiB, 8*GiB), 1 : (2*GiB, 8*GiB) }
+    assert backend.utilization() == { 0 : 0, 1 : 0 }
+    assert backend.memory() == { 0 : (GiB, 8*GiB), 1 : (2*GiB, 8*GiB) }
+    assert nvml.handles == 2
+
+def test_gpu_memory_is_accounted_against_preserved_memory(nvml, clock):
+    limits = Limits(gpu_memory='2G')
+    result = Result()
+    gpu_sampler, calls = sampler(gpu.NVMLBackend(), limits, result)
+    nvml.devices[0]['used'] = 6*GiB
+    nvml.devices[1]['used'] = 6*GiB
+    assert gpu_sampler.sample()
+    assert result.gpu_memory == 0
+    nvml.devices[1]['used'] = 7*GiB
+    assert gpu_sampler.sample()
+    assert result.gpu_memory == GiB
+    nvml.devices[1]['used'] = 6*GiB
+    assert gpu_sampler.sample()
+    assert result.gpu_memory == GiB
+    assert calls == []
+
+def test_gpu_memory_usage_is_accounted_without_memory_limit(nvml, clock):
+    result = Result()
+    gpu_sampler, calls = sampler(gpu.NVMLBackend(), Limits(gpu_time='10s'), result)
+    assert gpu_sampler.sample()
+    assert result.gpu_memory == 2*GiB
+
+def test_gpu_time_is_accounted_from_utilization(nvml, clock):
+    result = Result()
+    gpu_sampler, calls = sampler(gpu.NVMLBackend(), Limits(gpu_time='10s'), result)
+    assert gpu_sampler.sample()
+    assert result.gpu_time == datetime.timedelta(0)
+    nvml.devices[0]['utilization'] = 50
+    nvml.devices[1]['utilization'] = 100
+    clock[0] += 2
+    assert gpu_sampler.sample()
+    assert result.gpu_time == datetime.timedelta(seconds=2)
+    nvml.devices[1]['utilization'] = 25
+    clock[0] += 2
+    assert gpu_sampler.sample()
+    assert result.gpu_time == datetime.timedelta(seconds=3)
+    assert calls == []
+
+def test_gpu_memory_limit_postcondition(clock):
+    backend = gpu.FakeGPUBackend({ 0 : 8*GiB }, memory_usage={ 0 : 7*GiB })
+    limits = Limits(gpu_memory='1G')
+    result = Result(limits=limits)
+    gpu_sampler, calls = sampler(backend, limits, result)
+    assert gpu_sampler.sample()
+    assert MemoryLimitPostcondition(gpu_memory=limits.gpu_memory)(None, result)
+    backend.set_memory_usage(0, 8*GiB)
+    assert gpu_sampler.sample()
+    assert result.gpu_memory == GiB
+    assert not MemoryLimitPostcondition(gpu_memory=limits.gpu_memory)(None, result)
+
+def test_gpu_memory_over_limit_stops_the_command(clock):
+    backend = gpu.FakeGPUBackend({ 0 : 8*GiB }, memory_usage={ 0 : 7*GiB })
+    limits = Limits(gpu_memory='1G')
+    result = Result(limits=limits)
+    gpu_sampler, calls = sampler(backend, limits, result)
+    backend.set_memory_usage(0, 9*GiB)
+    assert not gpu_sampler.sample()
+    assert calls == [ True ]
+    assert result.gpu_memory == 2*GiB
+
+def test_gpu_time_limit_stops_the_command(clock):
+    backend = gpu.FakeGPUBackend({ 0 : 8*GiB }, utilization={ 0 : 100 })
+    limits = Limits(gpu_time='1s')
+    result = Result(limits=limits)
+    gpu_sampler, calls = sampler(backend, limits, result)
+    assert gpu_sampler.sample()
+    clock[0] += 0.5
+    assert gpu_sampler.sample()
+    assert TimeLimitPostcondition(gpu_time=limits.gpu_time)(None, result)
+    clock[0] += 1
+    assert not gpu_sampler.sample()
+    assert calls == [ True ]
+    assert not TimeLimitPostcondition(gpu_time=limits.gpu_time)(None, result)
+
+def test_local_system_samples_only_commands_with_gpu_limits(tmp_path):
+    from kolejka.judge.systems.local import LocalSystem
+    backend = gpu.FakeGPUBackend({ 0 : 8*GiB }, utilization={ 0 : 100 })
+    system = LocalSystem(output_directory=tmp_path, gpu_backend=backend)
+    assert system.start_gpu_sampler(Limits(cpu_time='1s', memory='1G'), Result(), lambda: None) is None
+    limits = Limits(gpu_time='0.3s')
+    result = Result(limits=limits)
+    start_time = time.perf_counter()
+    process = system.start_command([ 'sleep', '10' ], os.devnull, tmp_path / 'stdout', False, None, tmp_path / 'stderr', False, None, dict(PATH='/usr/bin:/bin'), tmp_path, None, None, limits)
+    system.wait_command(process, result)
+    assert time.perf_counter() - start_time < 5
+    assert result.gpu_time > limits.gpu_time
+    assert result.sources.get('gpu_time') == 'gpu'
+    assert not TimeLimitPostcondition(gpu_time=limits.gpu_time)(system, result)
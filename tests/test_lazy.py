@@ -0,0 +1,73 @@
+# vim:ts=4:sts=4:sw=4:expandtab
+
+
+import importlib
+import json
+import pathlib
+import subprocess
+import sys
+import types
+
+import pytest
+
+
+EAGER_SUBMODULES = {
+    'kolejka.judge.tasks' : [ 'background', 'build', 'check', 'cuda', 'io', 'logs', 'prepare', 'postgres', 'rules', 'run', 'shared', 'system', 'tools', 'workspace', ],
+    'kolejka.judge.tasks.build' : [ 'base', 'auto', 'make', 'compile', 'script', 'build_python', ],
+    'kolejka.judge.commands' : [ 'base', 'compress', 'check', 'compile', 'extract', 'make', 'postgres', 'system', 'prepare_venv', ],
+    'kolejka.judge.commands.compile' : [ 'base', 'gcc', 'ghc', 'mono', 'nasm', 'nvcc', 'rust', ],
+    'kolejka.judge.systems' : [ 'local', 'observer', ],
+}
+
+ADDED_EXPORTS = {
+    'kolejka.judge.systems' : [ 'AsyncLocalSystem', ],
+}
+
+GENERIC_JUDGE = pathlib.Path(__file__).resolve().parent.parent / 'judges' / 'generic' / 'judge.py'
+GENERIC_JUDGE_MODULES = 48
+
+HEAVY_MODULES = [
+    'kolejka.judge.tasks.postgres',
+    'kolejka.judge.tasks.cuda',
+    'kolejka.judge.commands.postgres',
+    'kolejka.judge.commands.compile.nvcc',
+    'kolejka.judge.systems.local',
+    'kolejka.judge.systems.gpu',
+]
+
+
+def star_names(module):
+    names = getattr(module, '__all__', None)
+    if names is None:
+        names = [ name for name, value in vars(module).items() if not name.startswith('_') and not isinstance(value, types.ModuleType) ]
+    return set(names)
+
+def loaded_modules(code):
+    script = code + '\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))\n'
+    output = subprocess.run([ sys.executable, '-c', script ], check=True, capture_output=True, text=True).stdout
+    return set(json.loads(output))
+
+@pytest.mark.parametrize('package', sorted(EAGER_SUBMODULES))
+def test_exports_match_eager_imports(package):
+    module = importlib.import_module(package)
+    expected = set([ 'config', ] + ADDED_EXPORTS.get(package, []))
+    for submodule in EAGER_SUBMODULES[package]:
+        expected |= star_names(importlib.import_module(package+'.'+submodule))
+    assert set(module.__all__) == expected
+    assert dir(module) == sorted(module.__all__)
+    for name in module.__all__:
+        assert getattr(module, name) is not None
+
+def test_packages_import_without_heavy_submodules():
+    modules = loaded_modules('import kolejka.judge, kolejka.judge.tasks, kolejka.judge.commands, kolejka.judge.systems')
+    assert [ name for name in HEAVY_MODULES if name in modules ] == []
+
+def test_names_load_only_their_submodule():
+    modules = loaded_modules('from kolejka.judge.tasks import SingleIOTask')
+    assert 'kolejka.judge.tasks.io' in modules
+    assert 'kolejka.judge.tasks.postgres' not in modules
+
+def test_generic_judge_imports_within_budget():
+    modules = loaded_modules('import runpy\nrunpy.run_path({!r}, run_name=\'judge\')'.format(str(GENERIC_JUDGE)))
+    assert [ name for name in HEAVY_MODULES if name in modules ] == []
+    assert len([ name for name in modules if name.split('.')[0] == 'kolejka' ]) <= GENERIC_JUDGE_MODULES